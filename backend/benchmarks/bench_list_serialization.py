@@ -0,0 +1,98 @@
+"""
+Compares the latency of serving a large list of leads through the validated
+response_model path against the fast path (services.fast_json), per 10k rows.
+
+Each mode is served by a minimal app with the same route shape as GET /leads
+and measured end to end through the ASGI test client, so routing and HTTP
+framing costs are identical and the difference is validation plus encoding.
+
+Run from the backend directory:
+    python -m benchmarks.bench_list_serialization --rows 10000 --iterations 20
+"""
+import argparse
+import json
+import statistics
+import time
+from typing import Callable, Dict, List
+
+from benchmarks.fakes import FakeSupabaseClient
+from services import fast_json
+
+
+def build_app(rows: List[Dict], mode: str):
+    from fastapi import FastAPI
+    from fastapi.responses import Response
+
+    from router.leads import LeadResponse
+
+    app = FastAPI()
+    if mode == "validated":
+        @app.get("/leads", response_model=List[LeadResponse])
+        def get_leads():
+            return rows
+    elif mode == "fast (stdlib json)":
+        @app.get("/leads", response_model=List[LeadResponse])
+        def get_leads():
+            return Response(
+                json.dumps(fast_json.project_rows(rows, LeadResponse), default=str, separators=(",", ":")),
+                media_type="application/json",
+            )
+    else:
+        @app.get("/leads", response_model=List[LeadResponse])
+        def get_leads():
+            return fast_json.FastJSONResponse(fast_json.project_rows(rows, LeadResponse))
+    return app
+
+
+def time_requests(call: Callable[[], bytes], iterations: int) -> List[float]:
+    call()  # warm up
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        call()
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--iterations", type=int, default=20)
+    args = parser.parse_args()
+
+    import logging
+    logging.disable(logging.CRITICAL)
+    from fastapi.testclient import TestClient
+
+    db = FakeSupabaseClient()
+    rows = db.seed_leads(args.rows)
+    for row in rows:
+        row["custom_data"] = {"tags": ["saas", "emea"], "timezone": "Europe/Berlin"}
+        row["linkedin_url"] = f"https://linkedin.com/in/{row['id']}"
+
+    modes = ["validated", "fast (stdlib json)"]
+    if fast_json.orjson is not None:
+        modes.append("fast (orjson)")
+
+    results = {}
+    bodies = {}
+    for mode in modes:
+        client = TestClient(build_app(rows, mode))
+        samples = time_requests(lambda: client.get("/leads").content, args.iterations)
+        bodies[mode] = json.loads(client.get("/leads").content)
+        results[mode] = statistics.median(samples)
+
+    # The fast path must return exactly what the validated path does
+    for mode in modes[1:]:
+        assert bodies[mode] == bodies["validated"], f"{mode} response differs from the validated one"
+
+    scale = 10000 / args.rows
+    baseline = results["validated"]
+    print(f"{args.rows} rows, median of {args.iterations} requests")
+    print(f"{'mode':<22}{'ms/request':>12}{'ms/10k rows':>14}{'speedup':>10}")
+    for mode, ms in results.items():
+        print(f"{mode:<22}{ms:>12.1f}{ms * scale:>14.1f}{baseline / ms:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
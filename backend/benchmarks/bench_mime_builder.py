@@ -0,0 +1,79 @@
+"""
+Compares per-message encode time of the old MIME construction in
+GmailAPI.send_email against MimeMessageBuilder.
+
+Run from the backend directory:
+    python -m benchmarks.bench_mime_builder --messages 500 --attachment-mb 2
+"""
+import argparse
+import base64
+import os
+import tempfile
+import time
+from email import encoders
+from email.mime.base import MIMEBase
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from pathlib import Path
+
+from services.mime_builder import AttachmentCache, MimeMessageBuilder
+
+
+def legacy_build_raw(to, subject, body, body_type='plain', attachment_paths=None) -> str:
+    """The message construction GmailAPI.send_email used before MimeMessageBuilder"""
+    message = MIMEMultipart()
+    message['To'] = to
+    message['Subject'] = subject
+    message.attach(MIMEText(body, body_type))
+    for attachment_path in attachment_paths or []:
+        attachment_path = Path(attachment_path)
+        with open(attachment_path, "rb") as attachment:
+            part = MIMEBase("application", "octet-stream")
+            part.set_payload(attachment.read())
+        encoders.encode_base64(part)
+        part.add_header("Content-Disposition", f"attachment; filename={attachment_path.name}")
+        message.attach(part)
+    return base64.urlsafe_b64encode(message.as_bytes()).decode('utf-8')
+
+
+def time_per_message(build, messages: int) -> float:
+    started = time.perf_counter()
+    for i in range(messages):
+        build(i)
+    return (time.perf_counter() - started) / messages * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--attachment-mb", type=float, default=2.0)
+    args = parser.parse_args()
+
+    body = "Hi there,\n\nI noticed your team is hiring. " * 10
+    builder = MimeMessageBuilder(AttachmentCache())
+
+    with tempfile.TemporaryDirectory() as tmp:
+        attachment = Path(tmp) / "brochure.pdf"
+        attachment.write_bytes(os.urandom(int(args.attachment_mb * 1024 * 1024)))
+
+        cases = {
+            "plain body": (
+                lambda i: legacy_build_raw(f"lead{i}@example.com", "Hello", body),
+                lambda i: builder.build_raw(f"lead{i}@example.com", "Hello", body),
+            ),
+            f"{args.attachment_mb:g} MB attachment": (
+                lambda i: legacy_build_raw(f"lead{i}@example.com", "Hello", body, attachment_paths=[attachment]),
+                lambda i: builder.build_raw(f"lead{i}@example.com", "Hello", body, attachment_paths=[attachment]),
+            ),
+        }
+
+        print(f"{'case':<22}{'legacy ms/msg':>16}{'builder ms/msg':>16}{'speedup':>10}")
+        for name, (legacy, fast) in cases.items():
+            legacy_ms = time_per_message(legacy, args.messages)
+            fast_ms = time_per_message(fast, args.messages)
+            print(f"{name:<22}{legacy_ms:>16.3f}{fast_ms:>16.3f}{legacy_ms / fast_ms:>9.1f}x")
+        print(f"attachment cache: {builder.attachment_cache.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,411 @@
+"""
+In-process stand-ins for GmailAPI, LangChainAgent and SupabaseClient.
+
+Each fake exposes the methods the routers and scheduler call, keeps its data
+in memory and adds configurable latency and error rates so throughput can be
+measured without touching Gmail, Gemini or Supabase.
+"""
+import asyncio
+import itertools
+import random
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Union
+
+from services.gmail_api import GmailAPIError
+from services.supabase_client import SupabaseClientError
+
+
+@dataclass
+class FakeProfile:
+    """Latency in seconds (mean, with uniform +/- jitter) and the fraction of calls that fail."""
+    latency: float = 0.0
+    jitter: float = 0.0
+    error_rate: float = 0.0
+
+    def delay(self, rng: random.Random) -> float:
+        if not self.latency:
+            return 0.0
+        return max(0.0, self.latency + rng.uniform(-self.jitter, self.jitter))
+
+    def fails(self, rng: random.Random) -> bool:
+        return self.error_rate > 0 and rng.random() < self.error_rate
+
+
+class FakeSupabaseClient:
+    """Dictionary-backed SupabaseClient with per-call latency."""
+
+    def __init__(self, profile: Optional[FakeProfile] = None, seed: int = 0):
+        self.profile = profile or FakeProfile()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self.tables: Dict[str, Dict[int, Dict[str, Any]]] = {
+            "leads": {}, "campaigns": {}, "emails": {}, "templates": {}, "suppressions": {}, "outbox": {},
+            "send_slots": {},
+        }
+        self.calls = 0
+
+    def _call(self, name: str):
+        with self._lock:
+            self.calls += 1
+            delay = self.profile.delay(self._rng)
+            fails = self.profile.fails(self._rng)
+        if delay:
+            time.sleep(delay)
+        if fails:
+            raise SupabaseClientError(f"Injected failure in {name}")
+
+    def _insert(self, table: str, row: Dict[str, Any]) -> Dict[str, Any]:
+        with self._lock:
+            row = dict(row, id=next(self._ids))
+            row.setdefault("created_at", datetime.now(timezone.utc).isoformat())
+            row.setdefault("updated_at", row["created_at"])
+            self.tables[table][row["id"]] = row
+        return dict(row)
+
+    # --- Seeding helpers (no latency) ---
+
+    def seed_campaign(self, **fields) -> Dict[str, Any]:
+        campaign = {"name": "Benchmark", "objective": "Book a demo of our product", "tone": "professional",
+                    "status": "active"}
+        campaign.update(fields)
+        return self._insert("campaigns", campaign)
+
+    def seed_leads(self, count: int) -> List[Dict[str, Any]]:
+        positions = ["CTO", "VP Engineering", "Head of Sales", "Founder", "Data Lead"]
+        return [
+            self._insert("leads", {
+                "name": f"Lead {i}",
+                "email": f"lead{i}@company{i % 50}.example.com",
+                "company": f"Company {i % 50}",
+                "position": positions[i % len(positions)],
+                "status": "new",
+                "custom_data": {},
+            })
+            for i in range(count)
+        ]
+
+    # --- SupabaseClient interface ---
+
+    def get_lead(self, lead_id):
+        self._call("get_lead")
+        return self.tables["leads"].get(int(lead_id))
+
+    def get_leads_by_ids(self, lead_ids):
+        self._call("get_leads_by_ids")
+        return [self.tables["leads"][int(i)] for i in lead_ids if int(i) in self.tables["leads"]]
+
+    def get_campaign(self, campaign_id):
+        self._call("get_campaign")
+        return self.tables["campaigns"].get(int(campaign_id))
+
+    def get_email_template(self, template_id):
+        self._call("get_email_template")
+        return self.tables["templates"].get(int(template_id))
+
+    def log_email_activity(self, email_log):
+        self._call("log_email_activity")
+        return self._insert("emails", email_log)["id"]
+
+    def bulk_insert_email_logs(self, email_logs):
+        self._call("bulk_insert_email_logs")
+        return [self._insert("emails", row) for row in email_logs]
+
+    def update_email_status(self, email_id, update_data):
+        self._call("update_email_status")
+        with self._lock:
+            row = self.tables["emails"].get(int(email_id))
+            if row is None:
+                raise SupabaseClientError(f"Failed to update email log ID {email_id}, no data returned.")
+            row.update(update_data, updated_at=datetime.now(timezone.utc).isoformat())
+            return dict(row)
+
+    def bulk_update_email_status(self, email_ids, update_data):
+        self._call("bulk_update_email_status")
+        with self._lock:
+            updated = []
+            for row in filter(None, (self.tables["emails"].get(int(email_id)) for email_id in email_ids)):
+                row.update(update_data, updated_at=datetime.now(timezone.utc).isoformat())
+                updated.append(dict(row))
+            return updated
+
+    def get_email_status(self, email_id):
+        self._call("get_email_status")
+        return self.tables["emails"].get(int(email_id))
+
+    def get_campaign_emails(self, campaign_id, skip=0, limit=100):
+        self._call("get_campaign_emails")
+        rows = [r for r in self.tables["emails"].values() if str(r["campaign_id"]) == str(campaign_id)]
+        return rows[skip:skip + limit]
+
+    def get_campaign_emails_page(self, campaign_id, after_id=0, limit=1000):
+        self._call("get_campaign_emails_page")
+        rows = [r for _, r in sorted(self.tables["emails"].items())
+                if str(r["campaign_id"]) == str(campaign_id) and r["id"] > int(after_id)]
+        return rows[:limit]
+
+    def get_lead_emails(self, lead_id):
+        self._call("get_lead_emails")
+        return [r for r in self.tables["emails"].values() if str(r["lead_id"]) == str(lead_id)]
+
+    def get_latest_email_for_lead_campaign(self, lead_id, campaign_id):
+        self._call("get_latest_email_for_lead_campaign")
+        rows = [r for r in self.tables["emails"].values()
+                if str(r["lead_id"]) == str(lead_id) and str(r["campaign_id"]) == str(campaign_id)]
+        return max(rows, key=lambda r: (r["created_at"], r["id"])) if rows else None
+
+    def get_email_by_thread_id(self, thread_id):
+        self._call("get_email_by_thread_id")
+        rows = [r for r in self.tables["emails"].values() if r.get("gmail_thread_id") == thread_id]
+        return max(rows, key=lambda r: (r["created_at"], r["id"])) if rows else None
+
+    def get_all_leads(self):
+        self._call("get_all_leads")
+        return sorted(self.tables["leads"].values(), key=lambda r: r["created_at"], reverse=True)
+
+    def get_leads_page(self, after_id=0, limit=1000, status=None):
+        self._call("get_leads_page")
+        rows = [r for _, r in sorted(self.tables["leads"].items())
+                if r["id"] > int(after_id) and (not status or r.get("status") == status)]
+        return rows[:limit]
+
+    def get_leads_by_status(self, status):
+        self._call("get_leads_by_status")
+        return [r for r in self.get_all_leads() if r.get("status") == status]
+
+    def get_table_version(self, table, filters=None):
+        self._call("get_table_version")
+        rows = [r for r in self.tables[table].values()
+                if all(str(r.get(column)) == str(value) for column, value in (filters or {}).items())]
+        return f"{len(rows)}:{max((r['updated_at'] for r in rows), default=None)}"
+
+    def _selected(self, statuses, tags):
+        return [
+            lead_id for lead_id, row in sorted(self.tables["leads"].items())
+            if (not statuses or row.get("status") in statuses)
+            and all(tag in ((row.get("custom_data") or {}).get("tags") or []) for tag in tags or ())
+        ]
+
+    def _contacted(self, campaign_id):
+        return {int(r["lead_id"]) for r in self.tables["emails"].values() if str(r["campaign_id"]) == str(campaign_id)}
+
+    def select_lead_ids(self, statuses=None, tags=None, after_id=0, limit=500, exclude_campaign_id=None):
+        self._call("select_lead_ids")
+        excluded = self._contacted(exclude_campaign_id) if exclude_campaign_id is not None else set()
+        matches = [lead_id for lead_id in self._selected(statuses, tags) if lead_id > int(after_id) and lead_id not in excluded]
+        return matches[:limit]
+
+    def count_contacted_leads(self, campaign_id, statuses=None, tags=None):
+        self._call("count_contacted_leads")
+        contacted = self._contacted(campaign_id)
+        return sum(1 for lead_id in self._selected(statuses, tags) if lead_id in contacted)
+
+    def get_lead_by_email(self, email):
+        self._call("get_lead_by_email")
+        return next((r for _, r in sorted(self.tables["leads"].items())
+                     if (r.get("email") or "").lower() == email.lower()), None)
+
+    def update_lead(self, lead_id, update_data):
+        self._call("update_lead")
+        with self._lock:
+            row = self.tables["leads"].get(int(lead_id))
+            if row:
+                row.update(update_data, updated_at=datetime.now(timezone.utc).isoformat())
+            return dict(row) if row else None
+
+    def bulk_insert_leads(self, leads_data):
+        self._call("bulk_insert_leads")
+        return [self._insert("leads", row) for row in leads_data]
+
+    def create_email_template(self, template_data):
+        self._call("create_email_template")
+        return self._insert("templates", template_data)["id"]
+
+    def get_email_templates(self):
+        self._call("get_email_templates")
+        return list(self.tables["templates"].values())
+
+    def create_campaign(self, campaign_data):
+        self._call("create_campaign")
+        return self._insert("campaigns", campaign_data)
+
+    def get_all_campaigns(self):
+        self._call("get_all_campaigns")
+        return sorted(self.tables["campaigns"].values(), key=lambda r: r["created_at"], reverse=True)
+
+    def update_campaign(self, campaign_id, update_data):
+        self._call("update_campaign")
+        row = self.tables["campaigns"].get(int(campaign_id))
+        if row:
+            row.update(update_data, updated_at=datetime.now(timezone.utc).isoformat())
+        return row
+
+    def add_suppressions(self, rows):
+        self._call("add_suppressions")
+        return [self._insert("suppressions", row) for row in rows]
+
+    def get_suppressions_page(self, after_id=0, limit=5000):
+        self._call("get_suppressions_page")
+        return [r for _, r in sorted(self.tables["suppressions"].items()) if r["id"] > int(after_id)][:limit]
+
+    def get_latest_suppression(self, email=None, domain=None):
+        self._call("get_latest_suppression")
+        column, value = ("email", email) if email else ("domain", domain)
+        rows = [r for _, r in sorted(self.tables["suppressions"].items()) if r.get(column) == value]
+        return rows[-1] if rows else None
+
+    def _outbox_entry(self, key):
+        return next((r for r in self.tables["outbox"].values() if r["idempotency_key"] == key), None)
+
+    def claim_outbox_entries(self, entries, stale_before):
+        self._call("claim_outbox_entries")
+        claimed = []
+        with self._lock:
+            for entry in entries:
+                row = self._outbox_entry(entry["idempotency_key"])
+                if row is not None:
+                    stale = row["status"] == "pending" and row["claimed_at"] < stale_before
+                    if row["status"] != "failed" and not stale:
+                        continue
+                    row.update({k: entry[k] for k in ("status", "claim_token", "claimed_at")}, error_message=None)
+                else:
+                    # Inserted under the same lock as the lookup, so concurrent claims cannot both insert
+                    row = dict(entry, id=next(self._ids), created_at=datetime.now(timezone.utc).isoformat())
+                    self.tables["outbox"][row["id"]] = row
+                claimed.append(dict(row))
+        return claimed
+
+    def get_outbox_entries(self, keys):
+        self._call("get_outbox_entries")
+        with self._lock:
+            return [dict(row) for row in map(self._outbox_entry, keys) if row]
+
+    def renew_outbox_entries(self, keys, claim_token, claimed_at):
+        self._call("renew_outbox_entries")
+        with self._lock:
+            renewed = []
+            for row in filter(None, map(self._outbox_entry, keys)):
+                if row["claim_token"] == claim_token and row["status"] == "pending":
+                    row["claimed_at"] = claimed_at
+                    renewed.append(dict(row))
+            return renewed
+
+    def update_outbox_entries(self, updates):
+        self._call("update_outbox_entries")
+        with self._lock:
+            updated = []
+            for update in updates:
+                row = self._outbox_entry(update["idempotency_key"])
+                if row is None or row["claim_token"] != update["claim_token"]:
+                    continue
+                row.update(update, updated_at=datetime.now(timezone.utc).isoformat())
+                updated.append(dict(row))
+            return updated
+
+    def update_outbox_entry(self, key, claim_token, update_data):
+        self._call("update_outbox_entry")
+        with self._lock:
+            row = self._outbox_entry(key)
+            if row is None or row["claim_token"] != claim_token:
+                return None
+            row.update(update_data, updated_at=datetime.now(timezone.utc).isoformat())
+            return dict(row)
+
+    def reserve_send_slot(self, bucket, slot_date, daily_limit):
+        self._call("reserve_send_slot")
+        with self._lock:
+            slots = self.tables["send_slots"]
+            if sum(1 for row in slots.values() if row["slot_date"] == slot_date) >= daily_limit:
+                return "day_full"
+            if bucket in slots:
+                return "taken"
+            slots[bucket] = {"bucket": bucket, "slot_date": slot_date}
+            return "reserved"
+
+    def get_send_slots_page(self, after_bucket=0, limit=1000):
+        self._call("get_send_slots_page")
+        with self._lock:
+            return [dict(row) for _, row in sorted(self.tables["send_slots"].items()) if row["bucket"] > after_bucket][:limit]
+
+
+class FakeGmailAPI:
+    """GmailAPI that records sends instead of calling Google."""
+
+    def __init__(self, profile: Optional[FakeProfile] = None, seed: int = 1):
+        self.profile = profile or FakeProfile()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self.sent: List[Dict[str, Any]] = []
+        self.send_times: List[float] = []
+
+    def send_email(self, to: Union[str, List[str]], subject: str, body: str,
+                   body_type: str = 'plain', cc: str = None, bcc: str = None,
+                   attachment_paths=None) -> Dict:
+        with self._lock:
+            delay = self.profile.delay(self._rng)
+            fails = self.profile.fails(self._rng)
+        if delay:
+            time.sleep(delay)
+        if fails:
+            raise GmailAPIError("Failed to send email: injected 429 rateLimitExceeded")
+        with self._lock:
+            message_id = f"msg-{next(self._ids)}"
+            self.sent.append({"to": to, "subject": subject})
+            self.send_times.append(time.perf_counter())
+        return {"id": message_id, "threadId": f"thread-{message_id}"}
+
+    def list_labels(self) -> List[Dict]:
+        return [{"id": "INBOX", "name": "INBOX"}]
+
+
+class FakeLangChainAgent:
+    """LangChainAgent that returns canned content after a simulated model latency."""
+
+    def __init__(self, profile: Optional[FakeProfile] = None, seed: int = 2):
+        self.profile = profile or FakeProfile()
+        self._rng = random.Random(seed)
+        self.calls = 0
+        self.failures = 0
+
+    async def _generate(self, subject: str, body: str) -> Dict[str, str]:
+        self.calls += 1
+        delay = self.profile.delay(self._rng)
+        if delay:
+            await asyncio.sleep(delay)
+        if self.profile.fails(self._rng):
+            self.failures += 1
+            raise RuntimeError("Injected LLM failure")
+        return {"subject": subject, "body": body}
+
+    async def generate_cold_email(self, context: Dict[str, Any]) -> Dict[str, str]:
+        return await self._generate(
+            f"Quick question for {context.get('lead_company') or 'you'}",
+            f"Hi {context.get('lead_name')}, I noticed your work as {context.get('lead_position')}.",
+        )
+
+    async def generate_followup_email(self, context: Dict[str, Any]) -> Dict[str, str]:
+        return await self._generate(
+            f"Re: {context.get('previous_email_subject')}",
+            f"Hi {context.get('lead_name')}, just following up on my last note.",
+        )
+
+    async def generate_segment_template(self, context: Dict[str, Any]) -> Dict[str, str]:
+        return await self._generate(
+            "Quick question for {lead_company|you}",
+            "Hi {lead_first_name|there}, teams like {lead_company} are ...",
+        )
+
+    async def generate_segment_emails(self, leads, campaign, segment_by=None, max_segments=None,
+                                      custom_context=None, template_engine=None, concurrency=4):
+        # Delegates to the real implementation so segment grouping and rendering are measured too
+        from services.langchain_agent import LangChainAgent
+        return await LangChainAgent.generate_segment_emails(
+            self, leads, campaign, segment_by, max_segments, custom_context, template_engine, concurrency
+        )
+
+    def evaluate_email_quality(self, email_text: str, goal: str) -> Dict[str, Any]:
+        return {"score": 7, "feedback": "Fine."}
@@ -0,0 +1,91 @@
+"""
+Import-time budget for the API entry point.
+
+Imports `main` in fresh interpreters with -X importtime, reports the median
+total and the slowest top-level modules, and fails if the median exceeds the
+budget or if a module that must load lazily was imported.
+
+Run from the backend directory:
+    python -m benchmarks.import_budget
+    python -m benchmarks.import_budget --budget-ms 800 --runs 7
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+# Heavy dependencies that must only load when the feature using them runs
+LAZY_MODULES = ("pandas", "langchain_google_genai", "langchain_core", "googleapiclient", "supabase")
+
+PROBE = (
+    "import sys, main; "
+    "print('LOADED:' + ','.join(m for m in {lazy!r} if m in sys.modules))"
+)
+
+
+def import_once(lazy: Tuple[str, ...]) -> Tuple[float, Dict[str, float], List[str]]:
+    """
+    Imports main in a new interpreter. Returns the cumulative ms of `main`, the
+    cumulative ms of each module main imports directly, and eagerly loaded lazy modules.
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE.format(lazy=lazy)],
+        capture_output=True, text=True, check=True
+    )
+    total = 0.0
+    direct: Dict[str, float] = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue  # header line
+        # Nesting is shown by indentation: one space for top-level, two more per level
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        if depth == 0 and name.strip() == "main":
+            total = int(cumulative) / 1000
+        elif depth == 1:
+            direct[name.strip()] = int(cumulative) / 1000
+    loaded = []
+    for line in proc.stdout.splitlines():
+        if line.startswith("LOADED:") and line[len("LOADED:"):]:
+            loaded = line[len("LOADED:"):].split(",")
+    return total, direct, loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget-ms", type=float, default=1000, help="Maximum median import time of main")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="Slowest modules imported by main to show")
+    args = parser.parse_args()
+
+    totals, per_module, eager = [], {}, set()
+    for _ in range(args.runs):
+        total, modules, loaded = import_once(LAZY_MODULES)
+        totals.append(total)
+        eager.update(loaded)
+        for name, ms in modules.items():
+            per_module.setdefault(name, []).append(ms)
+
+    median_total = statistics.median(totals)
+    print(f"import main: median {median_total:.0f} ms over {args.runs} runs (budget {args.budget_ms:.0f} ms)")
+    slowest = sorted(per_module.items(), key=lambda item: statistics.median(item[1]), reverse=True)
+    for name, samples in slowest[:args.top]:
+        print(f"  {statistics.median(samples):8.1f} ms  {name}")
+
+    failed = False
+    if median_total > args.budget_ms:
+        print(f"FAIL: import time exceeds budget by {median_total - args.budget_ms:.0f} ms")
+        failed = True
+    if eager:
+        print(f"FAIL: modules that should load lazily were imported: {', '.join(sorted(eager))}")
+        failed = True
+    if not failed:
+        print("OK")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
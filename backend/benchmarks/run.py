@@ -0,0 +1,337 @@
+"""
+Offline throughput benchmarks for the hot paths of the API.
+
+Drives bulk_send_emails, upload_leads_from_csv, FollowupScheduler._execute_followup_check
+and the list endpoints against the fakes in benchmarks/fakes.py. Each scenario runs in
+its own process so peak RSS is reported per scenario.
+
+Run from the backend directory:
+    python -m benchmarks.run --leads 500 --llm-latency-ms 5 --gmail-latency-ms 2
+    python -m benchmarks.run --save-baseline main
+    python -m benchmarks.run --compare main
+"""
+import argparse
+import asyncio
+import io
+import json
+import resource
+import statistics
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+BASELINE_DIR = Path(__file__).parent / "baselines"
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """Returns p50/p95/p99 of latency samples (seconds) in milliseconds."""
+    if not samples:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0}
+    ordered = sorted(samples)
+    if len(ordered) == 1:
+        value = round(ordered[0] * 1000, 3)
+        return {"p50": value, "p95": value, "p99": value}
+    cuts = statistics.quantiles(ordered, n=100, method="inclusive")
+    return {"p50": round(cuts[49] * 1000, 3), "p95": round(cuts[94] * 1000, 3), "p99": round(cuts[98] * 1000, 3)}
+
+
+def build_fakes(config: Dict[str, Any]):
+    from benchmarks.fakes import FakeGmailAPI, FakeLangChainAgent, FakeProfile, FakeSupabaseClient
+
+    def profile(prefix: str) -> FakeProfile:
+        latency = config[f"{prefix}_latency_ms"] / 1000
+        return FakeProfile(latency=latency, jitter=latency * 0.5, error_rate=config[f"{prefix}_error_rate"])
+
+    if config["db"] == "sqlite":
+        import tempfile
+        from services.sqlite_client import SQLiteClient
+
+        class SeededSQLiteClient(SQLiteClient):
+            """SQLiteClient with the fake's seeding helpers."""
+            seed_campaign = FakeSupabaseClient.seed_campaign
+            seed_leads = FakeSupabaseClient.seed_leads
+
+            def _insert(self, table, row):
+                return self._insert_many(table, [row])[0]
+
+            @property
+            def calls(self) -> int:
+                # Every public SQLiteClient method is timed by the query histogram
+                from services.metrics import DB_LATENCY
+                return int(sum(sample.value for metric in DB_LATENCY.collect()
+                               for sample in metric.samples if sample.name.endswith("_count")))
+
+        db = SeededSQLiteClient(str(Path(tempfile.mkdtemp()) / "bench.db"))
+    else:
+        db = FakeSupabaseClient(profile("db"))
+    return (
+        db,
+        FakeGmailAPI(profile("gmail")),
+        FakeLangChainAgent(profile("llm")),
+    )
+
+
+# --- Scenarios ---
+
+def bench_bulk_send(config: Dict[str, Any]) -> Dict[str, Any]:
+    from fastapi import BackgroundTasks
+
+    from router import emails
+    from services.email_log_buffer import EmailLogBuffer
+    from services.followup_scheduler import FollowupScheduler
+    from services.outbox import Outbox
+    from services.suppression import SuppressionIndex
+    from services.template_engine import TemplateEngine
+
+    db, gmail, agent = build_fakes(config)
+    campaign = db.seed_campaign(personalization_mode=config["personalization_mode"])
+    leads = db.seed_leads(config["leads"])
+    suppression = SuppressionIndex(db, refresh_interval=float("inf"))
+    suppression.load()
+    outbox = Outbox(db)
+    scheduler = FollowupScheduler(db_client=db, gmail_api=gmail, agent=agent, suppression=suppression, outbox=outbox)
+    log_buffer = EmailLogBuffer(db, batch_size=200, flush_interval=0.5) if config["log_buffer"] else None
+    if log_buffer:
+        log_buffer.start()
+
+    request = emails.BulkEmailRequest(
+        campaign_id=str(campaign["id"]),
+        lead_ids=[str(lead["id"]) for lead in leads],
+        delay_seconds=0,
+    )
+    calls_before = db.calls
+    started = time.perf_counter()
+    response = asyncio.run(emails.bulk_send_emails(
+        request, BackgroundTasks(), agent=agent, gmail_api=gmail, db=db, scheduler=scheduler,
+        log_buffer=log_buffer, template_engine=TemplateEngine(), suppression=suppression,
+        outbox=outbox,
+    ))
+    if log_buffer:
+        log_buffer.close()
+    elapsed = time.perf_counter() - started
+
+    sends = [started] + gmail.send_times
+    latencies = [b - a for a, b in zip(sends, sends[1:])]
+    sent = sum(1 for r in response["results"] if r["success"])
+    return {
+        "items": sent,
+        "seconds": elapsed,
+        "items_per_sec": sent / elapsed if elapsed else 0.0,
+        "latency_ms": percentiles(latencies),
+        "db_calls_per_email": round((db.calls - calls_before) / max(sent, 1), 3),
+        "llm_calls": agent.calls,
+    }
+
+
+def bench_csv_upload(config: Dict[str, Any]) -> Dict[str, Any]:
+    from fastapi import UploadFile
+
+    from router import leads as leads_router
+
+    # The route imports pandas on first use; load it here so the import is not timed
+    import pandas  # noqa: F401
+
+    db, _, _ = build_fakes(config)
+    lines = ["name,email,company,position"]
+    lines += [f"Lead {i},lead{i}@example.com,Company {i % 50},CTO" for i in range(config["csv_rows"])]
+    payload = "\n".join(lines).encode("utf-8")
+
+    latencies, rows = [], 0
+    for _ in range(config["iterations"]):
+        upload = UploadFile(file=io.BytesIO(payload), filename="leads.csv")
+        started = time.perf_counter()
+        result = leads_router.upload_leads_from_csv(file=upload, db=db)
+        latencies.append(time.perf_counter() - started)
+        rows += result.successful_uploads
+    elapsed = sum(latencies)
+    return {
+        "items": rows,
+        "seconds": elapsed,
+        "items_per_sec": rows / elapsed if elapsed else 0.0,
+        "latency_ms": percentiles(latencies),
+    }
+
+
+def bench_followup(config: Dict[str, Any]) -> Dict[str, Any]:
+    from services.followup_scheduler import FollowupScheduler
+
+    db, gmail, agent = build_fakes(config)
+    campaign = db.seed_campaign()
+    leads = db.seed_leads(config["followups"])
+    for lead in leads:
+        db.log_email_activity({
+            "lead_id": lead["id"], "campaign_id": campaign["id"], "subject": "Hello", "body": "Hi",
+            "status": "sent", "email_type": "cold_email", "gmail_thread_id": f"thread-{lead['id']}",
+        })
+    scheduler = FollowupScheduler(db_client=db, gmail_api=gmail, agent=agent)
+
+    latencies = []
+    sent_before = len(gmail.sent)
+    for lead in leads:
+        started = time.perf_counter()
+        scheduler._execute_followup_check(lead["id"], campaign["id"])
+        latencies.append(time.perf_counter() - started)
+    elapsed = sum(latencies)
+    sent = len(gmail.sent) - sent_before
+    return {
+        "items": sent,
+        "seconds": elapsed,
+        "items_per_sec": sent / elapsed if elapsed else 0.0,
+        "latency_ms": percentiles(latencies),
+    }
+
+
+def bench_list_endpoints(config: Dict[str, Any]) -> Dict[str, Any]:
+    from router import campaigns as campaigns_router
+    from router import emails
+    from router import leads as leads_router
+
+    db, _, _ = build_fakes(config)
+    campaign = db.seed_campaign()
+    for _ in range(20):
+        db.seed_campaign()
+    leads = db.seed_leads(config["list_rows"])
+    for lead in leads[:1000]:
+        db.log_email_activity({"lead_id": lead["id"], "campaign_id": campaign["id"], "status": "sent"})
+
+    from fastapi import Request, Response
+
+    # Unconditional requests: every call builds the full response
+    request = Request({"type": "http", "method": "GET", "headers": []})
+    calls: Dict[str, Callable[[], Any]] = {
+        "leads": lambda: leads_router.get_leads(request, Response(), status=None, db=db),
+        "campaigns": lambda: campaigns_router.get_all_campaigns(request, Response(), db=db),
+        "campaign_emails": lambda: asyncio.run(
+            emails.get_campaign_emails(request, Response(), str(campaign["id"]), 0, 100, db)
+        ),
+    }
+    latencies, per_endpoint = [], {}
+    for name, call in calls.items():
+        samples = []
+        for _ in range(config["iterations"]):
+            started = time.perf_counter()
+            call()
+            samples.append(time.perf_counter() - started)
+        per_endpoint[name] = percentiles(samples)
+        latencies.extend(samples)
+    elapsed = sum(latencies)
+    return {
+        "items": len(latencies),
+        "seconds": elapsed,
+        "items_per_sec": len(latencies) / elapsed if elapsed else 0.0,
+        "latency_ms": percentiles(latencies),
+        "per_endpoint_ms": per_endpoint,
+    }
+
+
+SCENARIOS: Dict[str, Callable[[Dict[str, Any]], Dict[str, Any]]] = {
+    "bulk_send": bench_bulk_send,
+    "csv_upload": bench_csv_upload,
+    "followup": bench_followup,
+    "list_endpoints": bench_list_endpoints,
+}
+
+
+def run_scenario(name: str, config: Dict[str, Any]) -> Dict[str, Any]:
+    """Runs one scenario; called in a fresh process so ru_maxrss is scenario-specific."""
+    import logging
+    logging.disable(logging.CRITICAL)
+
+    tracemalloc.start()
+    result = SCENARIOS[name](config)
+    _, python_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    rss_divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    result["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / rss_divisor, 1)
+    result["python_peak_mb"] = round(python_peak / (1024 * 1024), 1)
+    result["items_per_sec"] = round(result["items_per_sec"], 2)
+    result["seconds"] = round(result["seconds"], 4)
+    return result
+
+
+# --- Baselines ---
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Returns a description of every metric that regressed by more than `tolerance`."""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get("results", {}).get(name)
+        if not previous:
+            continue
+        checks = [
+            ("items_per_sec", current["items_per_sec"], previous["items_per_sec"], False),
+            ("p95 ms", current["latency_ms"]["p95"], previous["latency_ms"]["p95"], True),
+            ("p99 ms", current["latency_ms"]["p99"], previous["latency_ms"]["p99"], True),
+            ("peak_rss_mb", current["peak_rss_mb"], previous["peak_rss_mb"], True),
+        ]
+        for metric, now, before, higher_is_worse in checks:
+            if not before:
+                continue
+            change = (now - before) / before
+            if (change > tolerance) if higher_is_worse else (change < -tolerance):
+                regressions.append(f"{name}: {metric} {before} -> {now} ({change:+.1%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS), help="Run only these scenarios")
+    parser.add_argument("--leads", type=int, default=200, help="Leads per bulk send")
+    parser.add_argument("--followups", type=int, default=100, help="Follow-up executions")
+    parser.add_argument("--csv-rows", type=int, default=5000, help="Rows per CSV upload")
+    parser.add_argument("--list-rows", type=int, default=10000, help="Leads returned by the list endpoint")
+    parser.add_argument("--iterations", type=int, default=5, help="Repetitions for upload and list scenarios")
+    for prefix, default_ms in (("db", 1.0), ("gmail", 2.0), ("llm", 5.0)):
+        parser.add_argument(f"--{prefix}-latency-ms", type=float, default=default_ms)
+        parser.add_argument(f"--{prefix}-error-rate", type=float, default=0.0)
+    parser.add_argument("--db", choices=["fake", "sqlite"], default="fake",
+                        help="In-memory fake (with --db-latency-ms) or a temporary SQLiteClient database")
+    parser.add_argument("--personalization-mode", choices=["per_lead", "segment"], default="per_lead")
+    parser.add_argument("--log-buffer", action="store_true", help="Use the email log write-behind buffer")
+    parser.add_argument("--save-baseline", metavar="NAME", help="Save results as benchmarks/baselines/NAME.json")
+    parser.add_argument("--compare", metavar="NAME", help="Compare against a saved baseline")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Allowed relative regression")
+    args = parser.parse_args()
+
+    config = {key: value for key, value in vars(args).items()
+              if key not in ("scenario", "save_baseline", "compare", "tolerance")}
+    names = args.scenario or list(SCENARIOS)
+
+    results = {}
+    for name in names:
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+            results[name] = pool.submit(run_scenario, name, config).result()
+        r = results[name]
+        print(f"{name:<16} {r['items']:>7} items  {r['items_per_sec']:>10.2f}/s  "
+              f"p50 {r['latency_ms']['p50']:>9.3f} ms  p95 {r['latency_ms']['p95']:>9.3f} ms  "
+              f"p99 {r['latency_ms']['p99']:>9.3f} ms  peak RSS {r['peak_rss_mb']:>7.1f} MB")
+        extras = {k: v for k, v in r.items() if k in ("db_calls_per_email", "llm_calls", "per_endpoint_ms")}
+        if extras:
+            print(f"{'':<16} {extras}")
+
+    report = {"config": config, "results": results}
+    if args.save_baseline:
+        BASELINE_DIR.mkdir(exist_ok=True)
+        path = BASELINE_DIR / f"{args.save_baseline}.json"
+        path.write_text(json.dumps(report, indent=2))
+        print(f"Saved baseline to {path}")
+
+    if args.compare:
+        baseline = json.loads((BASELINE_DIR / f"{args.compare}.json").read_text())
+        if baseline.get("config") != config:
+            print("Warning: baseline was recorded with a different configuration.")
+        regressions = compare(results, baseline, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.tolerance:.0%} against '{args.compare}'.")
+
+
+if __name__ == "__main__":
+    main()
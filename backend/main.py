@@ -1,35 +1,103 @@
+import asyncio
 import logging
 import os
 from contextlib import asynccontextmanager
 
 from dotenv import load_dotenv
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Response
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse
 
 # Load environment variables from the .env file at the project root
 load_dotenv()
 
 # Import all the routers and services
-from router import campaigns, emails, leads
-from services.followup_scheduler import FollowupScheduler
+from router import admin, campaigns, emails, leads, suppressions
+from services.bounce_processor import BounceProcessor
+from services.db import create_db_client
+from services.email_log_buffer import EmailLogBuffer
+from services.followup_scheduler import FollowupScheduler, create_jobstore_from_env
 from services.gmail_api import GmailAPI
+from services.http_cache import ConditionalGetMiddleware
 from services.langchain_agent import LangChainAgent
-from services.supabase_client import SupabaseClient
+from services.leader_lease import create_lease_from_env
+from services.metrics import render_latest
+from services.outbox import Outbox
+from services.registry import ServiceNotReadyError, ServiceRegistry
+from services.request_timing import ServerTimingMiddleware
+from services.send_window import SendSlotAllocator
+from services.suppression import SuppressionIndex
+from services.template_engine import TemplateEngine
 
 # --- 1. Configure Logging ---
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# --- 2. Initialize Services ---
+# --- 2. Register Services ---
 # These instances are created once and shared across the entire application
-# to ensure efficiency and consistent state.
-
-logger.info("Initializing services...")
-db_client = SupabaseClient()
-gmail_api = GmailAPI(client_file=os.getenv('GOOGLE_CLIENT_SECRET_FILE', 'credentials.json'))
-agent = LangChainAgent()
-# The scheduler needs access to the other services to perform its tasks
-scheduler = FollowupScheduler(db_client=db_client, gmail_api=gmail_api, agent=agent)
-logger.info("All services initialized.")
+# to ensure efficiency and consistent state. They are built in the lifespan,
+# not at import, so the app starts serving (and /ready can report progress)
+# while slow initializers such as the Gmail OAuth flow are still running.
+
+def init_email_log_buffer(db_client):
+    # Optional write-behind buffer for email logs (EMAIL_LOG_BUFFER_ENABLED=true)
+    email_log_buffer = EmailLogBuffer.from_env(db_client)
+    if email_log_buffer:
+        email_log_buffer.start()
+    return email_log_buffer
+
+
+def init_suppression(db_client):
+    # Do-not-contact index checked by every send path (SUPPRESSION_ENABLED, default true)
+    if os.getenv("SUPPRESSION_ENABLED", "true").lower() != "true":
+        return None
+    return SuppressionIndex.from_env(db_client)
+
+
+def init_outbox(db_client):
+    # Idempotency keys that stop retried sends and follow-up jobs from emailing a lead twice (OUTBOX_ENABLED, default true)
+    if os.getenv("OUTBOX_ENABLED", "true").lower() != "true":
+        return None
+    return Outbox.from_env(db_client)
+
+
+def init_scheduler(db_client, gmail_api, agent, send_slots, suppression, outbox):
+    # The scheduler needs access to the other services to perform its tasks.
+    # With several workers only the holder of the leader lease runs jobs
+    # (SCHEDULER_LEADER_LOCK), and SCHEDULER_JOBSTORE_URL shares jobs between them.
+    jobstore = create_jobstore_from_env()
+    scheduler = FollowupScheduler(
+        db_client=db_client, gmail_api=gmail_api, agent=agent,
+        lease=create_lease_from_env(shared_jobstore=jobstore is not None), jobstore=jobstore,
+        send_slots=send_slots, suppression=suppression, outbox=outbox
+    )
+    scheduler.start()
+    return scheduler
+
+
+def init_bounce_processor(db_client, gmail_api, scheduler, suppression):
+    # Marks bounced and out-of-office leads and cancels their follow-ups (BOUNCE_SCAN_*)
+    bounce_processor = BounceProcessor.from_env(db_client, gmail_api, scheduler, suppression)
+    bounce_processor.start()
+    return bounce_processor
+
+
+registry = ServiceRegistry()
+# DB_BACKEND selects Supabase (default) or the local SQLite implementation
+registry.register("db", create_db_client)
+registry.register("gmail", lambda: GmailAPI(client_file=os.getenv('GOOGLE_CLIENT_SECRET_FILE', 'credentials.json')))
+registry.register("agent", LangChainAgent)
+registry.register("template_engine", TemplateEngine)
+registry.register("email_log_buffer", init_email_log_buffer, depends_on=("db",))
+# Send-window slot allocator for follow-ups and queued bulk sends (SEND_WINDOW_*, off by default),
+# with slots reserved in the database so that all workers share the mailbox's daily limit
+registry.register("send_slots", SendSlotAllocator.from_env, depends_on=("db",))
+registry.register("suppression", init_suppression, depends_on=("db",))
+registry.register("outbox", init_outbox, depends_on=("db",))
+registry.register(
+    "scheduler", init_scheduler, depends_on=("db", "gmail", "agent", "send_slots", "suppression", "outbox")
+)
+registry.register("bounce_processor", init_bounce_processor, depends_on=("db", "gmail", "scheduler", "suppression"))
 
 
 # --- 3. Define Application Lifecycle ---
@@ -39,13 +107,26 @@ async def lifespan(app: FastAPI):
     Manages application startup and shutdown events.
     This is the recommended way to handle background tasks like the scheduler.
     """
-    logger.info("Application startup...")
-    # Start the background scheduler when the application starts
-    scheduler.start()
+    logger.info("Application startup, initializing services...")
+    warm_up = asyncio.create_task(registry.warm_up())
     yield
-    # Gracefully shut down the scheduler when the application stops
     logger.info("Application shutdown...")
-    scheduler.shutdown()
+    try:
+        # Services still initializing (e.g. waiting on an OAuth consent) get a short grace period
+        await asyncio.wait_for(asyncio.shield(warm_up), timeout=10)
+    except asyncio.TimeoutError:
+        logger.warning(f"Shutting down before all services initialized: {registry.summary()}")
+    # Gracefully shut down the scheduler when the application stops
+    scheduler = registry.get_if_ready("scheduler")
+    if scheduler:
+        scheduler.shutdown()
+    # Flush buffered email logs last so writes made by the scheduler are included
+    email_log_buffer = registry.get_if_ready("email_log_buffer")
+    if email_log_buffer:
+        email_log_buffer.close()
+    gmail_api = registry.get_if_ready("gmail")
+    if gmail_api:
+        gmail_api.close()
 
 
 # --- 4. Create FastAPI Application Instance ---
@@ -55,20 +136,45 @@ app = FastAPI(
     version="1.0.0",
     lifespan=lifespan  # Connect the lifespan manager
 )
+# ETags and 304 Not Modified for GET responses; runs inside compression so it sees the plain body
+app.add_middleware(ConditionalGetMiddleware)
+# Compress responses above GZIP_MINIMUM_SIZE bytes; brotli when the optional brotli-asgi package is installed
+try:
+    from brotli_asgi import BrotliMiddleware
+    app.add_middleware(BrotliMiddleware, minimum_size=int(os.getenv("GZIP_MINIMUM_SIZE", "1000")), gzip_fallback=True)
+except ImportError:
+    app.add_middleware(GZipMiddleware, minimum_size=int(os.getenv("GZIP_MINIMUM_SIZE", "1000")), compresslevel=6)
+# Adds a Server-Timing header (db, llm, gmail, serialize) and logs requests slower than SLOW_REQUEST_MS
+app.add_middleware(ServerTimingMiddleware)
 
 
 # --- 5. Set Up Dependency Injection Overrides ---
 # This is a crucial step. It tells FastAPI how to resolve the `Depends()` calls
 # in your router files. Instead of creating new service instances for every request,
-# it provides the single, shared instances we created above.
+# it provides the single, shared instances from the registry.
+
+def shared(name: str):
+    """Dependency resolving a registered service, or 503 while it is still starting."""
+    async def dependency():
+        try:
+            return registry.get(name)
+        except ServiceNotReadyError as e:
+            raise HTTPException(status_code=503, detail=str(e))
+    return dependency
+
 
-app.dependency_overrides[emails.get_supabase_client] = lambda: db_client
-app.dependency_overrides[emails.get_gmail_api] = lambda: gmail_api
-app.dependency_overrides[emails.get_langchain_agent] = lambda: agent
-app.dependency_overrides[emails.get_followup_scheduler] = lambda: scheduler
+app.dependency_overrides[emails.get_supabase_client] = shared("db")
+app.dependency_overrides[emails.get_gmail_api] = shared("gmail")
+app.dependency_overrides[emails.get_langchain_agent] = shared("agent")
+app.dependency_overrides[emails.get_followup_scheduler] = shared("scheduler")
+app.dependency_overrides[emails.get_email_log_buffer] = shared("email_log_buffer")
+app.dependency_overrides[emails.get_template_engine] = shared("template_engine")
+app.dependency_overrides[emails.get_bounce_processor] = shared("bounce_processor")
+app.dependency_overrides[emails.get_suppression_index] = shared("suppression")
+app.dependency_overrides[emails.get_outbox] = shared("outbox")
 
-app.dependency_overrides[campaigns.get_supabase_client] = lambda: db_client
-app.dependency_overrides[leads.get_supabase_client] = lambda: db_client
+app.dependency_overrides[campaigns.get_supabase_client] = shared("db")
+app.dependency_overrides[leads.get_supabase_client] = shared("db")
 
 
 # --- 6. Mount Routers ---
@@ -77,6 +183,8 @@ logger.info("Mounting routers...")
 app.include_router(emails.router)
 app.include_router(campaigns.router)
 app.include_router(leads.router)
+app.include_router(suppressions.router)
+app.include_router(admin.router)
 logger.info("Routers mounted successfully.")
 
 
@@ -86,4 +194,27 @@ def read_root():
     """
     A simple health check endpoint to confirm the API is running.
     """
-    return {"status": "ok", "message": "Welcome to the Agentic Cold Emailer API!"}
\ No newline at end of file
+    return {"status": "ok", "message": "Welcome to the Agentic Cold Emailer API!"}
+
+
+@app.get("/ready", tags=["Health Check"])
+def readiness():
+    """
+    Readiness probe: 200 once every service is initialized, 503 while any is
+    starting or has failed. The body reports each service's status.
+    """
+    ready = registry.is_ready()
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"ready": ready, "services": registry.status()}
+    )
+
+
+# --- 8. Prometheus Metrics ---
+@app.get("/metrics", tags=["Health Check"], include_in_schema=False)
+def metrics():
+    """
+    Exposes per-stage latency histograms and counters in Prometheus text format.
+    """
+    payload, content_type = render_latest()
+    return Response(content=payload, media_type=content_type)
@@ -0,0 +1,92 @@
+import logging
+from typing import Any, Dict, List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import FileResponse, PlainTextResponse
+from pydantic import BaseModel
+
+from services.profiler import Profiler, ProfilerError, profiler as shared_profiler
+from services.request_timing import TimedRoute
+
+from router.emails import get_langchain_agent
+
+
+async def get_profiler():
+    """Dependency function to get the shared profiler instance."""
+    return shared_profiler
+
+
+# --- Pydantic Models ---
+
+class ProfileInfo(BaseModel):
+    name: str
+    target: str
+    duration_ms: Optional[int] = None
+    created_at: Any
+    size_bytes: int
+
+class ProfilerStatus(BaseModel):
+    enabled: bool
+    sample_rate: float
+    directory: str
+    max_files: int
+    profiles: List[ProfileInfo]
+
+
+# --- API Router ---
+
+router = APIRouter(
+    prefix="/admin",
+    tags=["Admin"],
+    responses={404: {"description": "Not found"}},
+    route_class=TimedRoute
+)
+logger = logging.getLogger(__name__)
+
+
+@router.get("/profiles", response_model=ProfilerStatus)
+def list_profiles(profiler: Profiler = Depends(get_profiler)):
+    """
+    Lists the captured profiles, newest first, along with the profiler settings.
+    """
+    return ProfilerStatus(
+        enabled=profiler.enabled,
+        sample_rate=profiler.sample_rate,
+        directory=str(profiler.directory),
+        max_files=profiler.max_files,
+        profiles=profiler.list_profiles()
+    )
+
+
+@router.get("/profiles/{name}")
+def download_profile(
+    name: str,
+    format: str = Query("raw", pattern="^(raw|text)$"),
+    sort: str = Query("cumulative", description="pstats sort key for the text report."),
+    limit: int = Query(50, ge=1, le=1000, description="Number of functions in the text report."),
+    profiler: Profiler = Depends(get_profiler)
+):
+    """
+    Downloads a captured profile.
+    'raw' returns the pstats dump (open with snakeviz or pstats), 'text' a report of the top functions.
+    """
+    try:
+        if format == "text":
+            return PlainTextResponse(profiler.render_text(name, sort=sort, limit=limit))
+        path = profiler.get_profile_path(name)
+    except ProfilerError as e:
+        status_code = 404 if "not found" in str(e) else 400
+        raise HTTPException(status_code=status_code, detail=str(e))
+    return FileResponse(path, media_type="application/octet-stream", filename=name)
+
+
+@router.get("/llm")
+def get_llm_routing(agent: Any = Depends(get_langchain_agent)) -> Dict[str, Any]:
+    """
+    Reports the model each generation task is routed to, the hedging settings and,
+    per model, recent latency quantiles, hedges fired and tokens used.
+    """
+    llm_router = getattr(agent, "router", None)
+    if llm_router is None:
+        raise HTTPException(status_code=404, detail="The LLM agent does not route between models.")
+    return llm_router.stats()
@@ -1,11 +1,33 @@
+import asyncio
 import logging
-from typing import Any, Dict, List, Optional
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request, Response, status
 from pydantic import BaseModel, Field
 
 # Import the Supabase client and its dependency function
 from services.supabase_client import SupabaseClient, SupabaseClientError
+from services.email_log_buffer import EmailLogBuffer
+from services.followup_scheduler import FollowupScheduler
+from services.gmail_api import GmailAPI
+from services.langchain_agent import LangChainAgent
+from services.fast_json import list_response
+from services.http_cache import not_modified, versioned_etag, with_etag
+from services.export import EMAIL_EXPORT_COLUMNS, EXPORT_FORMAT_PATTERN, export_response, iter_keyset_pages
+from services.request_timing import TimedRoute
+from services.outbox import Outbox
+from services.suppression import SuppressionIndex
+from services.template_engine import TemplateEngine
+# Launches reuse the bulk send pipeline and its (overridden) service dependencies
+from router.emails import (
+    BulkEmailRequest, bulk_send_emails, get_email_log_buffer, get_followup_scheduler,
+    get_gmail_api, get_langchain_agent, get_outbox, get_suppression_index, get_template_engine
+)
 
 # This dependency getter should be defined in a central dependencies.py
 # or we can import it if it's already defined elsewhere. For now, we define it here.
@@ -21,30 +43,80 @@ class CampaignBase(BaseModel):
     objective: str = Field(..., min_length=10, description="The primary goal of the campaign (e.g., 'To book a demo for our new SaaS product').")
     tone: str = Field(default="professional", description="The desired tone for AI-generated content (e.g., 'professional', 'casual', 'witty').")
     status: str = Field(default="draft", description="The current status of the campaign (e.g., 'draft', 'active', 'paused', 'completed').")
+    personalization_mode: str = Field(default="per_lead", description="'per_lead' generates every email with the LLM; 'segment' generates one template per lead segment and fills it in locally.")
+    segment_by: Optional[List[str]] = Field(default=None, description="Lead fields used to build segments, e.g. ['position', 'company'] or 'custom_data.<field>'.")
+    max_segments: Optional[int] = Field(default=None, ge=1, description="Upper bound on segments, and therefore on LLM calls, per bulk send.")
+
+# Columns added with segment personalization. They are left out of writes while at
+# their defaults, so projects whose campaigns table predates them keep working.
+SEGMENT_COLUMNS = ("personalization_mode", "segment_by", "max_segments")
 
 class CampaignCreate(CampaignBase):
-    pass
+    def to_row(self) -> Dict[str, Any]:
+        """The campaign as a database row, without segment columns the campaign does not use."""
+        row = self.model_dump()
+        for column in SEGMENT_COLUMNS:
+            if row[column] == CampaignBase.model_fields[column].default:
+                del row[column]
+        return row
 
 class CampaignUpdate(BaseModel):
     name: Optional[str] = Field(None, min_length=3)
     objective: Optional[str] = Field(None, min_length=10)
     tone: Optional[str] = None
     status: Optional[str] = None
+    personalization_mode: Optional[str] = None
+    segment_by: Optional[List[str]] = None
+    max_segments: Optional[int] = Field(None, ge=1)
 
 class CampaignResponse(CampaignBase):
     id: int
+    # NULL in rows created before, or without, segment personalization
+    personalization_mode: Optional[str] = "per_lead"
     created_at: Any # Using Any to avoid strict datetime parsing on the client side
 
     class Config:
         orm_mode = True # Use from_attributes=True for Pydantic v2
 
+class LeadSelector(BaseModel):
+    statuses: Optional[List[str]] = Field(default=None, description="Only leads with one of these statuses, e.g. ['new'].")
+    tags: Optional[List[str]] = Field(default=None, description="Only leads whose custom_data.tags contains all of these tags.")
+    include_contacted: bool = Field(default=False, description="Also email leads that already have an email in this campaign.")
+    max_leads: Optional[int] = Field(default=None, ge=1, description="Stop after this many selected leads.")
+
+class CampaignLaunchRequest(BaseModel):
+    selector: LeadSelector = Field(default_factory=LeadSelector)
+    custom_context: Optional[Dict[str, Any]] = None
+    template_id: Optional[str] = None
+    delay_seconds: float = Field(default=2.0, ge=0)
+    use_send_window: bool = False
+    followup_days: int = Field(default=3, ge=1, le=30)
+    page_size: int = Field(default=100, ge=1, le=1000, description="Leads handed to the send pipeline per batch.")
+    dry_run: bool = Field(default=False, description="Only resolve the selector and report what would be sent.")
+
+class CampaignLaunchStatus(BaseModel):
+    launch_id: str
+    campaign_id: int
+    status: str = Field(..., description="'running', 'completed', 'failed' or 'dry_run'.")
+    selected: int = 0
+    skipped_contacted: int = 0
+    skipped_suppressed: int = 0
+    processed: int = 0
+    succeeded: int = 0
+    failed: int = 0
+    errors: List[Dict[str, Any]] = Field(default_factory=list)
+    sample_lead_ids: Optional[List[str]] = None
+    started_at: datetime
+    finished_at: Optional[datetime] = None
+
 
 # --- API Router ---
 
 router = APIRouter(
     prefix="/campaigns",
     tags=["Campaigns"],
-    responses={404: {"description": "Not found"}}
+    responses={404: {"description": "Not found"}},
+    route_class=TimedRoute
 )
 
 logger = logging.getLogger(__name__)
@@ -60,7 +132,7 @@ def create_campaign(
     """
     try:
         logger.info(f"Creating new campaign with name: {campaign.name}")
-        campaign_dict = campaign.model_dump() # Use campaign.dict() for Pydantic v1
+        campaign_dict = campaign.to_row()
         new_campaign = db.create_campaign(campaign_dict)
         return new_campaign
     except SupabaseClientError as e:
@@ -74,14 +146,22 @@ def create_campaign(
 
 @router.get("/", response_model=List[CampaignResponse])
 def get_all_campaigns(
+    request: Request,
+    response: Response,
     db: SupabaseClient = Depends(get_supabase_client)
 ):
     """
     Retrieves a list of all campaigns.
+    Answers 304 Not Modified when the client's ETag is still current.
     """
+    etag = versioned_etag(db, "campaigns")
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+
     logger.info("Fetching all campaigns.")
     campaigns = db.get_all_campaigns()
-    return campaigns
+    return with_etag(list_response(campaigns, CampaignResponse), response, etag)
 
 
 @router.get("/{campaign_id}", response_model=CampaignResponse)
@@ -136,4 +216,232 @@ def delete_campaign(
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Campaign with ID {campaign_id} not found to delete.")
     
     logger.info(f"Successfully deleted campaign with ID: {campaign_id}")
-    return None
\ No newline at end of file
+    return None
+
+
+@router.get("/{campaign_id}/emails/export")
+def export_campaign_emails(
+    campaign_id: int,
+    format: str = Query("csv", pattern=EXPORT_FORMAT_PATTERN),
+    gzip: bool = Query(False, description="Download a gzip-compressed file."),
+    page_size: int = Query(1000, ge=100, le=10000, description="Rows fetched from the database per query."),
+    db: SupabaseClient = Depends(get_supabase_client)
+):
+    """
+    Exports every email of a campaign as a CSV or NDJSON download.
+    Rows are streamed from the database page by page, so memory use does not
+    grow with the size of the campaign history.
+    """
+    if not db.get_campaign(campaign_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Campaign with ID {campaign_id} not found.")
+    logger.info(f"Exporting emails of campaign {campaign_id} as {format}")
+    pages = iter_keyset_pages(
+        lambda after_id, limit: db.get_campaign_emails_page(campaign_id, after_id=after_id, limit=limit), page_size
+    )
+    return export_response(pages, format, f"campaign-{campaign_id}-emails", EMAIL_EXPORT_COLUMNS, gzip=gzip)
+
+
+# --- Campaign Launch ---
+
+class LaunchRegistry:
+    """
+    Launch progress by launch ID, kept in the memory of the instance running the
+    launch. Running launches are always kept; finished ones are dropped after
+    `ttl` seconds, and the oldest beyond `max_finished`, so the registry stays bounded.
+    """
+
+    def __init__(self, max_finished: int = 500, ttl: float = 86400):
+        self.max_finished = max_finished
+        self.ttl = ttl
+        self._launches: "OrderedDict[str, CampaignLaunchStatus]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "LaunchRegistry":
+        """LAUNCH_HISTORY_SIZE (default 500) finished launches, each kept LAUNCH_HISTORY_TTL_SECONDS (86400)."""
+        return cls(
+            max_finished=int(os.getenv("LAUNCH_HISTORY_SIZE", "500")),
+            ttl=float(os.getenv("LAUNCH_HISTORY_TTL_SECONDS", "86400")),
+        )
+
+    def _evict(self):
+        now = datetime.now(timezone.utc)
+        finished = [key for key, launch in self._launches.items() if launch.finished_at is not None]
+        kept = [key for key in finished if (now - self._launches[key].finished_at).total_seconds() <= self.ttl]
+        evicted = set(finished) - set(kept) | set(kept[:max(0, len(kept) - self.max_finished)])
+        for key in evicted:
+            del self._launches[key]
+
+    def add(self, launch: CampaignLaunchStatus):
+        with self._lock:
+            self._evict()
+            self._launches[launch.launch_id] = launch
+
+    def get(self, launch_id: str) -> Optional[CampaignLaunchStatus]:
+        with self._lock:
+            self._evict()
+            return self._launches.get(launch_id)
+
+    def __len__(self) -> int:
+        return len(self._launches)
+
+
+launches = LaunchRegistry.from_env()
+MAX_LAUNCH_ERRORS = 100
+
+
+def iter_selected_lead_ids(db: SupabaseClient, campaign_id: int, selector: LeadSelector,
+                           launch: CampaignLaunchStatus, page_size: int) -> Iterator[List[str]]:
+    """
+    Resolves a lead selector in the database one keyset page at a time,
+    yielding pages of lead IDs. Already contacted leads are filtered out by
+    the database (unless include_contacted is set) and only counted here.
+    """
+    exclude_campaign_id = None
+    if not selector.include_contacted:
+        exclude_campaign_id = campaign_id
+        launch.skipped_contacted = db.count_contacted_leads(campaign_id, statuses=selector.statuses, tags=selector.tags)
+    after_id = 0
+    while True:
+        ids = db.select_lead_ids(
+            statuses=selector.statuses, tags=selector.tags, after_id=after_id, limit=page_size,
+            exclude_campaign_id=exclude_campaign_id
+        )
+        if not ids:
+            return
+        after_id = ids[-1]
+        page = [str(lead_id) for lead_id in ids]
+        if selector.max_leads is not None:
+            page = page[:selector.max_leads - launch.selected]
+        launch.selected += len(page)
+        if page:
+            yield page
+        if selector.max_leads is not None and launch.selected >= selector.max_leads:
+            return
+
+
+async def run_campaign_launch(launch: CampaignLaunchStatus, request: CampaignLaunchRequest, db: SupabaseClient,
+                              agent, gmail_api, scheduler, log_buffer, template_engine, suppression=None,
+                              outbox=None):
+    """Feeds the selected leads to the bulk send pipeline page by page."""
+    try:
+        for page in iter_selected_lead_ids(db, launch.campaign_id, request.selector, launch, request.page_size):
+            page_tasks = BackgroundTasks()
+            bulk_request = BulkEmailRequest(
+                campaign_id=str(launch.campaign_id),
+                lead_ids=page,
+                custom_context=request.custom_context,
+                template_id=request.template_id,
+                delay_seconds=request.delay_seconds,
+                use_send_window=request.use_send_window,
+                followup_days=request.followup_days,
+                # Leads re-included on purpose must not be skipped as duplicates of their earlier email,
+                # while a page retried within this launch still is
+                idempotency_scope=launch.launch_id if request.selector.include_contacted else None
+            )
+            try:
+                response = await bulk_send_emails(
+                    bulk_request, page_tasks, agent, gmail_api, db, scheduler, log_buffer, template_engine,
+                    suppression, outbox
+                )
+                results = response["results"]
+            except HTTPException as e:
+                results = [{"lead_id": lead_id, "success": False, "error": e.detail} for lead_id in page]
+            # Follow-up scheduling queued by the sends of this page
+            await page_tasks()
+
+            launch.processed += len(results)
+            for result in results:
+                if result["success"]:
+                    launch.succeeded += 1
+                elif result.get("suppressed"):
+                    launch.skipped_suppressed += 1
+                else:
+                    launch.failed += 1
+                    if len(launch.errors) < MAX_LAUNCH_ERRORS:
+                        launch.errors.append({"lead_id": result["lead_id"], "error": result.get("error")})
+        launch.status = "completed"
+    except Exception as e:
+        logger.error(f"Launch {launch.launch_id} of campaign {launch.campaign_id} failed: {e}")
+        launch.status = "failed"
+        launch.errors.append({"error": str(e)})
+    finally:
+        launch.finished_at = datetime.now(timezone.utc)
+        logger.info(
+            f"Launch {launch.launch_id} of campaign {launch.campaign_id} {launch.status}: "
+            f"{launch.succeeded} sent, {launch.failed} failed, {launch.skipped_contacted} already contacted, "
+            f"{launch.skipped_suppressed} suppressed"
+        )
+
+
+@router.post("/{campaign_id}/launch", status_code=status.HTTP_202_ACCEPTED, response_model=CampaignLaunchStatus)
+async def launch_campaign(
+    campaign_id: int,
+    request: CampaignLaunchRequest,
+    background_tasks: BackgroundTasks,
+    db: SupabaseClient = Depends(get_supabase_client),
+    agent: LangChainAgent = Depends(get_langchain_agent),
+    gmail_api: GmailAPI = Depends(get_gmail_api),
+    scheduler: FollowupScheduler = Depends(get_followup_scheduler),
+    log_buffer: Optional[EmailLogBuffer] = Depends(get_email_log_buffer),
+    template_engine: TemplateEngine = Depends(get_template_engine),
+    suppression: Optional[SuppressionIndex] = Depends(get_suppression_index),
+    outbox: Optional[Outbox] = Depends(get_outbox)
+):
+    """
+    Sends the campaign to every lead matching a selector, resolved in the database.
+    Leads that already have an email in this campaign are skipped unless
+    include_contacted is set. The send runs in the background in pages;
+    poll GET /campaigns/{campaign_id}/launches/{launch_id} for progress.
+    With dry_run the selector is resolved and counted without sending.
+    """
+    campaign = db.get_campaign(campaign_id)
+    if not campaign:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Campaign with ID {campaign_id} not found.")
+    if request.use_send_window and getattr(scheduler, "send_slots", None) is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Send windows are disabled on this server")
+
+    launch = CampaignLaunchStatus(
+        launch_id=uuid.uuid4().hex,
+        campaign_id=campaign_id,
+        status="dry_run" if request.dry_run else "running",
+        started_at=datetime.now(timezone.utc)
+    )
+
+    if request.dry_run:
+        def resolve():
+            sample = []
+            for page in iter_selected_lead_ids(db, campaign_id, request.selector, launch, 1000):
+                sample.extend(page[:100 - len(sample)])
+            return sample
+        try:
+            launch.sample_lead_ids = await asyncio.to_thread(resolve)
+        except SupabaseClientError as e:
+            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+        launch.finished_at = datetime.now(timezone.utc)
+        return launch
+
+    if campaign.get("status") == "draft":
+        db.update_campaign(campaign_id, {"status": "active"})
+    launches.add(launch)
+    background_tasks.add_task(
+        run_campaign_launch, launch, request, db, agent, gmail_api, scheduler, log_buffer, template_engine,
+        suppression, outbox
+    )
+    logger.info(f"Launching campaign {campaign_id} as {launch.launch_id}")
+    return launch
+
+
+@router.get("/{campaign_id}/launches/{launch_id}", response_model=CampaignLaunchStatus)
+def get_launch_status(campaign_id: int, launch_id: str):
+    """
+    Reports the progress of a campaign launch started by this API instance.
+    Finished launches are kept for LAUNCH_HISTORY_TTL_SECONDS.
+    """
+    launch = launches.get(launch_id)
+    if not launch or launch.campaign_id != campaign_id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Launch {launch_id} not found on this instance; it may have expired or run on another worker."
+        )
+    return launch
@@ -1,9 +1,10 @@
 from sched import scheduler
-from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks
+from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks, Query, Request, Response
 from pydantic import BaseModel, EmailStr, Field
-from typing import Optional, List, Dict, Any, Union
+from typing import Optional, List, Dict, Any, Union, AsyncIterator, Tuple
 from datetime import datetime, timezone
 import logging
+import math
 import os
 import asyncio
 
@@ -12,13 +13,25 @@ from services.gmail_api import GmailAPI, GmailAPIError
 from services.langchain_agent import LangChainAgent
 from services.supabase_client import SupabaseClient
 from services.followup_scheduler import FollowupScheduler
+from services.bounce_processor import BounceProcessor
+from services.outbox import OUTBOX_SCHEDULED, Outbox, OutboxClaim
+from services.suppression import SuppressionIndex
+from services.email_log_buffer import BufferedSupabaseClient, EmailLogBuffer
+from services.metrics import BULK_QUEUE_DEPTH, record_batch_size
+from services.profiler import profiler
+from services.resilience import circuit_open_cause, is_ambiguous, wait_for_circuits
+from services.request_timing import TimedRoute
+from services.fast_json import fast_response
+from services.http_cache import not_modified, versioned_etag, with_etag
+from services.streaming import STREAM_FORMAT_PATTERN, stream_events
+from services.template_engine import TemplateEngine, TemplateSyntaxError, build_template_context
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Initialize router
-router = APIRouter(prefix="/emails", tags=["emails"])
+router = APIRouter(prefix="/emails", tags=["emails"], route_class=TimedRoute)
 
 # Pydantic models for request/response
 class EmailGenerationRequest(BaseModel):
@@ -32,9 +45,10 @@ class EmailGenerationRequest(BaseModel):
     campaign_type: str = Field(..., description="Type of campaign (cold_email, followup)")
     custom_context: Optional[Dict[str, Any]] = None
     template_id: Optional[str] = None
+    idempotency_scope: Optional[str] = Field(default=None, description="Scope of the send's outbox key, passed on to its follow-up")
 
 class EmailSendRequest(BaseModel):
-    email_log_id: int
+    email_log_id: Union[int, str]  # str when the log row is still in the write-behind buffer
     lead_id: str
     campaign_id: str
     recipient_email: EmailStr
@@ -43,11 +57,17 @@ class EmailSendRequest(BaseModel):
     body_type: str = Field(default="html", description="plain or html")
     schedule_followup: bool = Field(default=True)
     followup_days: int = Field(default=3, ge=1, le=30)
+    idempotency_scope: Optional[str] = Field(default=None, description="Scope of the follow-up's outbox key")
 
 class BulkEmailRequest(BaseModel):
     campaign_id: str
     lead_ids: List[str]
     custom_context: Optional[Dict[str, Any]] = None
+    template_id: Optional[str] = Field(default=None, description="Render this stored template instead of calling the LLM")
+    delay_seconds: float = Field(default=2.0, ge=0, description="Pause between sends to stay under Gmail rate limits")
+    use_send_window: bool = Field(default=False, description="Queue each email into a slot in the lead's local send window instead of sending now")
+    followup_days: int = Field(default=3, ge=1, le=30, description="Follow-up delay for emails queued with use_send_window")
+    idempotency_scope: Optional[str] = Field(default=None, description="Sends are deduplicated per lead within a scope; a new scope emails leads that were already sent this campaign's email again")
 
 class EmailResponse(BaseModel):
     success: bool
@@ -106,17 +126,75 @@ async def get_followup_scheduler():
         logger.error(f"Failed to initialize followup scheduler: {e}")
         raise HTTPException(status_code=500, detail="Failed to initialize followup scheduler")
 
+async def get_template_engine():
+    """Get template engine instance"""
+    return TemplateEngine()
+
+async def get_email_log_buffer() -> Optional[EmailLogBuffer]:
+    """Get the email log write-behind buffer, or None when buffering is disabled"""
+    return None
+
+async def get_suppression_index() -> Optional[SuppressionIndex]:
+    """Get the suppression index, or None when suppression checks are disabled"""
+    return None
+
+def suppression_reason(suppression: Optional[SuppressionIndex], email: Optional[str]) -> Optional[str]:
+    """Why an address must not be emailed, or None; checked before any generation or send"""
+    if suppression is None or not email:
+        return None
+    return suppression.check(email)
+
+async def get_outbox() -> Optional[Outbox]:
+    """Get the send outbox, or None when sends are not deduplicated"""
+    return None
+
+def duplicate_send_response(claim: OutboxClaim) -> EmailResponse:
+    """The response to a retry of an email that was already sent; 409 while the first attempt is still sending"""
+    if claim.entry.get("status") == OUTBOX_SCHEDULED:
+        raise HTTPException(status_code=409, detail="This email is already queued into a send slot")
+    if not claim.sent:
+        raise HTTPException(status_code=409, detail="This email is already being sent")
+    return EmailResponse(
+        success=True,
+        message="Email already sent",
+        email_id=claim.entry.get("gmail_message_id"),
+        subject=claim.entry.get("subject"),
+        sent_at=claim.entry.get("sent_at")
+    )
+
+def unavailable_exception(error: Exception, detail: str) -> Optional[HTTPException]:
+    """A 503 with Retry-After when the error came from an open circuit breaker, otherwise None"""
+    open_circuit = circuit_open_cause(error)
+    if open_circuit is None:
+        return None
+    return HTTPException(
+        status_code=503,
+        detail=f"{detail}: {open_circuit}",
+        headers={"Retry-After": str(math.ceil(open_circuit.retry_after))}
+    )
+
+async def get_bounce_processor():
+    """Get bounce processor instance"""
+    raise HTTPException(status_code=503, detail="Bounce processing is not configured")
+
 # Email generation endpoints
 @router.post("/generate", response_model=EmailResponse)
 async def generate_email(
     request: EmailGenerationRequest,
     agent: LangChainAgent = Depends(get_langchain_agent),
-    db: SupabaseClient = Depends(get_supabase_client)
+    db: SupabaseClient = Depends(get_supabase_client),
+    template_engine: TemplateEngine = Depends(get_template_engine),
+    suppression: Optional[SuppressionIndex] = Depends(get_suppression_index)
 ):
-    """Generate AI-powered cold email content"""
+    """Generate cold email content, from a stored template when template_id is set, otherwise with AI"""
     try:
         logger.info(f"Generating email for lead {request.lead_id} in campaign {request.campaign_id}")
         
+        # Never spend a generation on an address we will not email
+        reason = suppression_reason(suppression, request.lead_email)
+        if reason:
+            raise HTTPException(status_code=409, detail=f"Recipient is suppressed ({reason})")
+        
         # Get campaign details from database
         campaign = db.get_campaign(request.campaign_id)
         if not campaign:
@@ -140,8 +218,21 @@ async def generate_email(
             "custom_context": request.custom_context or {}
         }
         
+        # Render a stored template deterministically when one is requested
+        if request.template_id:
+            template = db.get_email_template(request.template_id)
+            if not template:
+                raise HTTPException(status_code=404, detail="Template not found")
+            template_context = build_template_context(lead, campaign, request.custom_context)
+            template_context.update(
+                {k: v for k, v in context.items() if k != "custom_context" and v is not None}
+            )
+            try:
+                email_content = template_engine.render_template(template, template_context)
+            except TemplateSyntaxError as e:
+                raise HTTPException(status_code=400, detail=f"Invalid template: {e}")
         # Generate email content using AI
-        if request.campaign_type == "cold_email":
+        elif request.campaign_type == "cold_email":
             email_content = await agent.generate_cold_email(context)
         elif request.campaign_type == "followup":
             email_content = await agent.generate_followup_email(context)
@@ -149,17 +240,9 @@ async def generate_email(
             raise HTTPException(status_code=400, detail="Invalid campaign type")
         
         # Log generation to database
-        email_log = {
-            "lead_id": request.lead_id,
-            "campaign_id": request.campaign_id,
-            "subject": email_content.get("subject"),
-            "body": email_content.get("body"),
-            "status": "generated",
-            "generated_at": datetime.now(timezone.utc).isoformat(),
-            "email_type": request.campaign_type
-        }
-        
-        email_id = db.log_email_activity(email_log)
+        email_id = log_generated_email(
+            db, request.lead_id, request.campaign_id, email_content, request.campaign_type
+        )
         
         logger.info(f"Email generated successfully for lead {request.lead_id}")
         
@@ -171,8 +254,13 @@ async def generate_email(
             body=email_content.get("body")
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to generate email: {e}")
+        unavailable = unavailable_exception(e, "Failed to generate email")
+        if unavailable:
+            raise unavailable
         raise HTTPException(status_code=500, detail=f"Failed to generate email: {str(e)}")
 
 @router.post("/send", response_model=EmailResponse)
@@ -181,14 +269,24 @@ async def send_email(
     background_tasks: BackgroundTasks,
     gmail_api: GmailAPI = Depends(get_gmail_api),
     db: SupabaseClient = Depends(get_supabase_client),
-    scheduler: FollowupScheduler = Depends(get_followup_scheduler)
+    scheduler: FollowupScheduler = Depends(get_followup_scheduler),
+    suppression: Optional[SuppressionIndex] = Depends(get_suppression_index)
 ):
     """Send email via Gmail API and log to database"""
+    reason = suppression_reason(suppression, request.recipient_email)
+    if reason:
+        db.update_email_status(
+            request.email_log_id,
+            {"status": "cancelled", "error_message": f"Recipient is suppressed ({reason})"}
+        )
+        raise HTTPException(status_code=409, detail=f"Recipient is suppressed ({reason})")
+    
     try:
         logger.info(f"Sending email for lead {request.lead_id} in campaign {request.campaign_id}")
         
-        # Send email via Gmail API
-        sent_message = gmail_api.send_email(
+        # Send email via Gmail API, in a worker thread since retries back off with blocking sleeps
+        sent_message = await asyncio.to_thread(
+            gmail_api.send_email,
             to=request.recipient_email,
             subject=request.subject,
             body=request.body,
@@ -205,7 +303,11 @@ async def send_email(
             "gmail_thread_id": sent_message.get("threadId")
         }
         
-        db.update_email_status(request.email_log_id, email_update)
+        try:
+            db.update_email_status(request.email_log_id, email_update)
+        except Exception as e:
+            # Gmail accepted the email; failing the request now would invite a retry that sends it twice
+            logger.error(f"Email {request.email_log_id} was sent but its log could not be updated: {e}")
         
         # Schedule followup if requested
         if request.schedule_followup:
@@ -214,7 +316,8 @@ async def send_email(
                 scheduler,
                 request.lead_id,
                 request.campaign_id,
-                request.followup_days
+                request.followup_days,
+                request.idempotency_scope
             )
         
         logger.info(f"Email sent successfully to {request.recipient_email}")
@@ -233,6 +336,9 @@ async def send_email(
             request.email_log_id,
             {"status": "failed", "error_message": str(e)}
         )
+        unavailable = unavailable_exception(e, "Failed to send email")
+        if unavailable:
+            raise unavailable
         raise HTTPException(status_code=500, detail=f"Failed to send email: {str(e)}")
     except Exception as e:
         logger.error(f"Failed to send email: {e}")
@@ -245,14 +351,50 @@ async def generate_and_send_email(
     agent: LangChainAgent = Depends(get_langchain_agent),
     gmail_api: GmailAPI = Depends(get_gmail_api),
     db: SupabaseClient = Depends(get_supabase_client),
-    scheduler: FollowupScheduler = Depends(get_followup_scheduler)
+    scheduler: FollowupScheduler = Depends(get_followup_scheduler),
+    template_engine: TemplateEngine = Depends(get_template_engine),
+    suppression: Optional[SuppressionIndex] = Depends(get_suppression_index),
+    outbox: Optional[Outbox] = Depends(get_outbox)
 ):
-    """Generate and send email in one step"""
+    """
+    Generate and send email in one step. Retrying a request whose email was
+    already sent returns the original send instead of emailing the lead again.
+    """
+    reason = suppression_reason(suppression, request.lead_email)
+    if reason:
+        raise HTTPException(status_code=409, detail=f"Recipient is suppressed ({reason})")
+    
+    # Claimed before generating, so a retry spends neither an LLM call nor a send
+    claim = None
+    if outbox is not None:
+        claim = outbox.claim(
+            request.lead_id, request.campaign_id, request.campaign_type, request.template_id, request.idempotency_scope
+        )
+        if not claim.claimed:
+            return duplicate_send_response(claim)
+    return await generate_and_send_claimed(
+        request, background_tasks, agent, gmail_api, db, scheduler, template_engine, suppression, outbox, claim
+    )
+
+async def generate_and_send_claimed(
+    request: EmailGenerationRequest,
+    background_tasks: BackgroundTasks,
+    agent: LangChainAgent,
+    gmail_api: GmailAPI,
+    db: SupabaseClient,
+    scheduler: FollowupScheduler,
+    template_engine: TemplateEngine,
+    suppression: Optional[SuppressionIndex],
+    outbox: Optional[Outbox],
+    claim: Optional[OutboxClaim]
+) -> EmailResponse:
+    """Generates and sends an email under an outbox claim held by the caller, then completes or releases the claim"""
+    sending = False
     try:
         logger.info(f"Generating and sending email for lead {request.lead_id}")
         
         # Generate email content
-        generate_response = await generate_email(request, agent, db)
+        generate_response = await generate_email(request, agent, db, template_engine, suppression)
         
         if not generate_response.success:
             return generate_response
@@ -265,83 +407,341 @@ async def generate_and_send_email(
             recipient_email=request.lead_email,
             subject=generate_response.subject,
             body=generate_response.body,
-            body_type="html"
+            body_type="html",
+            idempotency_scope=request.idempotency_scope
         )
         
-        send_response = await send_email(send_request, background_tasks, gmail_api, db, scheduler)
+        sending = True
+        send_response = await send_email(send_request, background_tasks, gmail_api, db, scheduler, suppression)
         
+        if claim is not None:
+            outbox.complete(claim, generate_response.email_id, send_response.email_id, subject=send_response.subject)
         return send_response
         
     except Exception as e:
+        # A send that timed out may have gone through, so its claim expires instead of being released
+        if claim is not None and not (sending and is_ambiguous(e)):
+            outbox.release(claim, str(e))
+        if isinstance(e, HTTPException):
+            # Not found, suppressed or dependency unavailable: keep the status for the caller
+            raise
         logger.error(f"Failed to generate and send email: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to generate and send email: {str(e)}")
 
+# Emails generated for send windows are handed to the scheduler in groups of this size
+SLOT_SCHEDULE_BATCH = 50
+
+# Bulk sends claim the outbox entries of this many leads at a time. A page must be
+# sent well within OUTBOX_CLAIM_TTL_SECONDS, or its last claims expire before use.
+OUTBOX_CLAIM_BATCH = 25
+
+def schedule_slot_queue(
+    db: SupabaseClient,
+    scheduler: FollowupScheduler,
+    request: BulkEmailRequest,
+    slot_queue: List[Tuple[Union[int, str], Dict[str, Any], Dict[str, Any], Optional[OutboxClaim]]],
+    outbox: Optional[Outbox] = None
+):
+    """Schedules generated emails into send slots, filling in each result's email ID and send time"""
+    # Claims are marked scheduled before any job exists, so a send due at once cannot be overtaken
+    for email_log_id, _, _, claim in slot_queue:
+        if claim is not None:
+            outbox.schedule(claim, email_log_id)
+    # Buffered log rows need their database IDs before jobs can refer to them
+    if isinstance(db, BufferedSupabaseClient):
+        db.buffer.flush()
+    for email_log_id, lead, result, claim in slot_queue:
+        try:
+            if isinstance(db, BufferedSupabaseClient):
+                email_log_id = db.buffer.resolve(email_log_id)
+            result["email_id"] = email_log_id
+            result["scheduled_at"] = scheduler.schedule_send(
+                email_log_id, lead, request.campaign_id, followup_days=request.followup_days,
+                scope=request.idempotency_scope
+            ).isoformat()
+        except Exception as e:
+            logger.error(f"Failed to schedule email for lead {result['lead_id']}: {e}")
+            result.update({"success": False, "error": str(e)})
+            if claim is not None:
+                outbox.release(claim, str(e))
+
+async def iter_bulk_send(
+    request: BulkEmailRequest,
+    background_tasks: BackgroundTasks,
+    agent: LangChainAgent,
+    gmail_api: GmailAPI,
+    db: SupabaseClient,
+    scheduler: FollowupScheduler,
+    log_buffer: Optional[EmailLogBuffer],
+    template_engine: TemplateEngine,
+    suppression: Optional[SuppressionIndex] = None,
+    outbox: Optional[Outbox] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Sends the emails of a bulk request lead by lead, yielding each lead's result
+    as soon as it is known. With use_send_window the emails are generated and
+    yielded once they have been scheduled into send slots. Suppressed leads
+    are skipped before any content is generated for them, and with an outbox
+    a rerun of the same request skips the leads that were already emailed.
+    """
+    queued = len(request.lead_ids)
+    record_batch_size("bulk_send", queued)
+    BULK_QUEUE_DEPTH.inc(queued)
+    # (email log ID, lead, result, claim) of emails waiting for a send slot
+    slot_queue = []
+    # Outbox claims of the current page that have not been used yet
+    unused_claims: Dict[str, OutboxClaim] = {}
+    try:
+        logger.info(f"Bulk sending emails for campaign {request.campaign_id}")
+        
+        # In buffered mode email logs and outbox updates are written behind in batches
+        # and lead/campaign lookups are served from one prefetch per page of leads.
+        if log_buffer is not None:
+            db = BufferedSupabaseClient(db, log_buffer)
+            db.prefetch_leads(request.lead_ids)
+            if outbox is not None:
+                outbox = outbox.bind(db)
+        
+        # Campaigns in segment mode make one LLM call per lead segment up front;
+        # each lead then gets locally rendered content instead of its own call.
+        segment_content: Dict[str, Dict[str, str]] = {}
+        if not request.template_id:
+            campaign = db.get_campaign(request.campaign_id)
+            if campaign and campaign.get("personalization_mode") == "segment":
+                segment_leads = fetch_leads(db, request.lead_ids)
+                if suppression is not None:
+                    segment_leads, _ = suppression.partition(segment_leads)
+                segment_content = await agent.generate_segment_emails(
+                    segment_leads,
+                    campaign,
+                    segment_by=campaign.get("segment_by"),
+                    max_segments=campaign.get("max_segments"),
+                    custom_context=request.custom_context,
+                    template_engine=template_engine
+                )
+        
+        # While Gemini or Gmail is down the run pauses rather than failing every remaining lead
+        dependencies = ("gmail",) if request.template_id else ("gemini", "gmail")
+        
+        for start in range(0, len(request.lead_ids), OUTBOX_CLAIM_BATCH):
+            # Leads that are missing or suppressed are settled before the page is claimed
+            page = []
+            for lead_id in request.lead_ids[start:start + OUTBOX_CLAIM_BATCH]:
+                try:
+                    lead = db.get_lead(lead_id)
+                    reason = suppression_reason(suppression, lead.get("email")) if lead else None
+                except Exception as e:
+                    lead, reason, error = None, None, str(e)
+                else:
+                    error = "Lead not found"
+                if lead and not reason:
+                    page.append((lead_id, lead))
+                    continue
+                BULK_QUEUE_DEPTH.dec()
+                queued -= 1
+                if reason:
+                    yield {
+                        "lead_id": lead_id,
+                        "success": False,
+                        "suppressed": True,
+                        "error": f"Recipient is suppressed ({reason})"
+                    }
+                else:
+                    yield {
+                        "lead_id": lead_id,
+                        "success": False,
+                        "error": error
+                    }
+            
+            # One claim for the whole page, taken before any content is generated for it and
+            # once the dependencies are up, so the claims are not held through a pause
+            claim_error = None
+            if outbox is not None and page:
+                await wait_for_circuits(dependencies)
+                try:
+                    unused_claims = outbox.claim_many(
+                        [lead_id for lead_id, _ in page], request.campaign_id, "cold_email", request.template_id,
+                        request.idempotency_scope
+                    )
+                except Exception as e:
+                    logger.error(f"Failed to claim sends for campaign {request.campaign_id}: {e}")
+                    claim_error = str(e)
+            
+            for lead_id, lead in page:
+                if await wait_for_circuits(dependencies) and unused_claims and not claim_error:
+                    # The pause may have outlasted the claims' TTL; renew them before sending under them
+                    try:
+                        unused_claims = outbox.renew(unused_claims)
+                    except Exception as e:
+                        logger.error(f"Failed to renew send claims for campaign {request.campaign_id}: {e}")
+                        claim_error = str(e)
+                BULK_QUEUE_DEPTH.dec()
+                queued -= 1
+                claim = unused_claims.pop(str(lead_id), None)
+                try:
+                    if claim_error:
+                        if claim is not None and claim.claimed:
+                            outbox.release(claim, claim_error)
+                        raise RuntimeError(f"Could not claim the send: {claim_error}")
+                    if claim is not None and not claim.claimed:
+                        response = duplicate_send_response(claim)
+                        yield {
+                            "lead_id": lead_id,
+                            "success": response.success,
+                            "email_id": response.email_id,
+                            "subject": response.subject
+                        }
+                        continue
+                    
+                    # Generate email for this lead
+                    generate_request = EmailGenerationRequest(
+                        lead_id=lead_id,
+                        campaign_id=request.campaign_id,
+                        lead_name=lead.get("name"),
+                        lead_email=lead.get("email"),
+                        lead_company=lead.get("company"),
+                        lead_position=lead.get("position"),
+                        lead_linkedin=lead.get("linkedin"),
+                        campaign_type="cold_email",
+                        custom_context=request.custom_context,
+                        template_id=request.template_id,
+                        idempotency_scope=request.idempotency_scope
+                    )
+                    
+                    content = segment_content.get(str(lead_id))
+                    if request.use_send_window:
+                        # Generate now, send later: the scheduler sends it in the lead's next free slot
+                        try:
+                            if content:
+                                email_log_id = log_generated_email(db, lead_id, request.campaign_id, content, "cold_email")
+                            else:
+                                generated = await generate_email(generate_request, agent, db, template_engine, suppression)
+                                email_log_id, content = generated.email_id, {"subject": generated.subject}
+                            # The queued email keeps the claim until its scheduled send completes or releases it
+                            db.update_email_status(email_log_id, {"status": "scheduled", **(claim.columns() if claim else {})})
+                        except Exception as e:
+                            if claim is not None:
+                                outbox.release(claim, str(e))
+                            raise
+                        slot_queue.append((email_log_id, lead, {"lead_id": lead_id, "success": True, "subject": content["subject"]}, claim))
+                        if len(slot_queue) >= SLOT_SCHEDULE_BATCH:
+                            scheduled, slot_queue = slot_queue, []
+                            schedule_slot_queue(db, scheduler, request, scheduled, outbox)
+                            for _, _, result, _ in scheduled:
+                                yield result
+                        continue
+                    elif content:
+                        response = await send_segment_email(
+                            lead, content, request, background_tasks, gmail_api, db, scheduler, suppression, outbox, claim
+                        )
+                    else:
+                        response = await generate_and_send_claimed(
+                            generate_request, background_tasks, agent, gmail_api, db, scheduler, template_engine,
+                            suppression, outbox, claim
+                        )
+                    
+                    yield {
+                        "lead_id": lead_id,
+                        "success": response.success,
+                        "email_id": response.email_id,
+                        "subject": response.subject
+                    }
+                    
+                    # Add delay between emails to avoid rate limiting
+                    if request.delay_seconds:
+                        await asyncio.sleep(request.delay_seconds)
+                    
+                except Exception as e:
+                    logger.error(f"Failed to send email to lead {lead_id}: {e}")
+                    yield {
+                        "lead_id": lead_id,
+                        "success": False,
+                        "error": str(e)
+                    }
+        
+        if slot_queue:
+            scheduled, slot_queue = slot_queue, []
+            schedule_slot_queue(db, scheduler, request, scheduled, outbox)
+            for _, _, result, _ in scheduled:
+                yield result
+    finally:
+        # Leads left unprocessed by an aborted run no longer count as queued
+        BULK_QUEUE_DEPTH.dec(queued)
+        # and their claims are given back, so that a rerun can send to them
+        for claim in list(unused_claims.values()) + [entry[3] for entry in slot_queue]:
+            if claim is not None and claim.claimed:
+                outbox.release(claim, "The bulk send stopped before this email was sent")
+
+async def send_segment_email(
+    lead: Dict[str, Any],
+    content: Dict[str, str],
+    request: BulkEmailRequest,
+    background_tasks: BackgroundTasks,
+    gmail_api: GmailAPI,
+    db: SupabaseClient,
+    scheduler: FollowupScheduler,
+    suppression: Optional[SuppressionIndex],
+    outbox: Optional[Outbox],
+    claim: Optional[OutboxClaim]
+) -> EmailResponse:
+    """Logs and sends content rendered from a segment template under an outbox claim held by the caller"""
+    sending = False
+    try:
+        email_log_id = log_generated_email(db, lead["id"], request.campaign_id, content, "cold_email")
+        send_request = EmailSendRequest(
+            email_log_id=email_log_id,
+            lead_id=str(lead["id"]),
+            campaign_id=request.campaign_id,
+            recipient_email=lead.get("email"),
+            subject=content["subject"],
+            body=content["body"],
+            body_type="html",
+            idempotency_scope=request.idempotency_scope
+        )
+        sending = True
+        response = await send_email(send_request, background_tasks, gmail_api, db, scheduler, suppression)
+    except Exception as e:
+        if claim is not None and not (sending and is_ambiguous(e)):
+            outbox.release(claim, str(e))
+        raise
+    if claim is not None:
+        outbox.complete(claim, email_log_id, response.email_id, subject=response.subject)
+    return response
+
+def bulk_send_message(request: BulkEmailRequest, success_count: int) -> str:
+    if request.use_send_window:
+        return f"Bulk email scheduling completed. {success_count}/{len(request.lead_ids)} emails queued into send slots"
+    return f"Bulk email sending completed. {success_count}/{len(request.lead_ids)} emails sent successfully"
+
 @router.post("/bulk-send")
+@profiler.profile("bulk_send_emails")
 async def bulk_send_emails(
     request: BulkEmailRequest,
     background_tasks: BackgroundTasks,
     agent: LangChainAgent = Depends(get_langchain_agent),
     gmail_api: GmailAPI = Depends(get_gmail_api),
-    db: SupabaseClient = Depends(get_supabase_client)
+    db: SupabaseClient = Depends(get_supabase_client),
+    scheduler: FollowupScheduler = Depends(get_followup_scheduler),
+    log_buffer: Optional[EmailLogBuffer] = Depends(get_email_log_buffer),
+    template_engine: TemplateEngine = Depends(get_template_engine),
+    suppression: Optional[SuppressionIndex] = Depends(get_suppression_index),
+    outbox: Optional[Outbox] = Depends(get_outbox)
 ):
     """Send emails to multiple leads in a campaign"""
+    if request.use_send_window and getattr(scheduler, "send_slots", None) is None:
+        raise HTTPException(status_code=400, detail="Send windows are disabled on this server")
+    
     try:
-        logger.info(f"Bulk sending emails for campaign {request.campaign_id}")
-        
-        results = []
-        
-        for lead_id in request.lead_ids:
-            try:
-                # Get lead details
-                lead = db.get_lead(lead_id)
-                if not lead:
-                    results.append({
-                        "lead_id": lead_id,
-                        "success": False,
-                        "error": "Lead not found"
-                    })
-                    continue
-                
-                # Generate email for this lead
-                generate_request = EmailGenerationRequest(
-                    lead_id=lead_id,
-                    campaign_id=request.campaign_id,
-                    lead_name=lead.get("name"),
-                    lead_email=lead.get("email"),
-                    lead_company=lead.get("company"),
-                    lead_position=lead.get("position"),
-                    lead_linkedin=lead.get("linkedin"),
-                    campaign_type="cold_email",
-                    custom_context=request.custom_context
-                )
-                
-                response = await generate_and_send_email(
-                    generate_request, background_tasks, agent, gmail_api, db, scheduler
-                )
-                
-                results.append({
-                    "lead_id": lead_id,
-                    "success": response.success,
-                    "email_id": response.email_id,
-                    "subject": response.subject
-                })
-                
-                # Add delay between emails to avoid rate limiting
-                await asyncio.sleep(2)
-                
-            except Exception as e:
-                logger.error(f"Failed to send email to lead {lead_id}: {e}")
-                results.append({
-                    "lead_id": lead_id,
-                    "success": False,
-                    "error": str(e)
-                })
-        
+        results = [
+            result async for result in iter_bulk_send(
+                request, background_tasks, agent, gmail_api, db, scheduler, log_buffer, template_engine, suppression,
+                outbox
+            )
+        ]
         success_count = sum(1 for r in results if r["success"])
-        
         return {
             "success": True,
-            "message": f"Bulk email sending completed. {success_count}/{len(request.lead_ids)} emails sent successfully",
+            "message": bulk_send_message(request, success_count),
             "results": results
         }
         
@@ -349,6 +749,52 @@ async def bulk_send_emails(
         logger.error(f"Failed to bulk send emails: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to bulk send emails: {str(e)}")
 
+@router.post("/bulk-send/stream")
+async def bulk_send_emails_stream(
+    request: BulkEmailRequest,
+    background_tasks: BackgroundTasks,
+    format: str = Query("ndjson", pattern=STREAM_FORMAT_PATTERN, description="ndjson or sse (Server-Sent Events)"),
+    agent: LangChainAgent = Depends(get_langchain_agent),
+    gmail_api: GmailAPI = Depends(get_gmail_api),
+    db: SupabaseClient = Depends(get_supabase_client),
+    scheduler: FollowupScheduler = Depends(get_followup_scheduler),
+    log_buffer: Optional[EmailLogBuffer] = Depends(get_email_log_buffer),
+    template_engine: TemplateEngine = Depends(get_template_engine),
+    suppression: Optional[SuppressionIndex] = Depends(get_suppression_index),
+    outbox: Optional[Outbox] = Depends(get_outbox)
+):
+    """
+    Send emails to multiple leads in a campaign, streaming progress.
+    Emits one 'result' event per lead as it completes and a final 'summary'
+    event. Disconnecting stops the run after the lead in progress.
+    """
+    if request.use_send_window and getattr(scheduler, "send_slots", None) is None:
+        raise HTTPException(status_code=400, detail="Send windows are disabled on this server")
+    
+    async def events():
+        total = len(request.lead_ids)
+        processed = success_count = suppressed_count = 0
+        async for result in iter_bulk_send(
+            request, background_tasks, agent, gmail_api, db, scheduler, log_buffer, template_engine, suppression,
+            outbox
+        ):
+            processed += 1
+            success_count += result["success"]
+            suppressed_count += result.get("suppressed", False)
+            yield {"type": "result", "processed": processed, "total": total, **result}
+        yield {
+            "type": "summary",
+            "success": True,
+            "message": bulk_send_message(request, success_count),
+            "processed": processed,
+            "succeeded": success_count,
+            "failed": processed - success_count,
+            "suppressed": suppressed_count,
+        }
+    
+    # Follow-ups queued during the stream run once it has finished
+    return stream_events(events(), format)
+
 # Email status and tracking endpoints
 @router.get("/status/{email_id}", response_model=EmailStatus)
 async def get_email_status(
@@ -370,20 +816,27 @@ async def get_email_status(
 
 @router.get("/campaign/{campaign_id}/emails")
 async def get_campaign_emails(
+    request: Request,
+    response: Response,
     campaign_id: str,
     skip: int = 0,
     limit: int = 100,
     db: SupabaseClient = Depends(get_supabase_client)
 ):
-    """Get all emails for a specific campaign"""
+    """Get all emails for a specific campaign; 304 Not Modified while the client's ETag is current"""
     try:
+        etag = versioned_etag(db, "emails", {"campaign_id": campaign_id}, skip, limit)
+        cached = not_modified(request, etag)
+        if cached:
+            return cached
+        
         emails = db.get_campaign_emails(campaign_id, skip, limit)
         
-        return {
+        return with_etag(fast_response({
             "success": True,
             "emails": emails,
             "count": len(emails)
-        }
+        }), response, etag)
         
     except Exception as e:
         logger.error(f"Failed to get campaign emails: {e}")
@@ -391,33 +844,95 @@ async def get_campaign_emails(
 
 @router.get("/lead/{lead_id}/emails")
 async def get_lead_emails(
+    request: Request,
+    response: Response,
     lead_id: str,
     db: SupabaseClient = Depends(get_supabase_client)
 ):
-    """Get all emails for a specific lead"""
+    """Get all emails for a specific lead; 304 Not Modified while the client's ETag is current"""
     try:
+        etag = versioned_etag(db, "emails", {"lead_id": lead_id})
+        cached = not_modified(request, etag)
+        if cached:
+            return cached
+        
         emails = db.get_lead_emails(lead_id)
         
-        return {
+        return with_etag(fast_response({
             "success": True,
             "emails": emails,
             "count": len(emails)
-        }
+        }), response, etag)
         
     except Exception as e:
         logger.error(f"Failed to get lead emails: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to get lead emails: {str(e)}")
 
+@router.get("/log-buffer/stats")
+async def get_email_log_buffer_stats(
+    log_buffer: Optional[EmailLogBuffer] = Depends(get_email_log_buffer)
+):
+    """Get write-behind buffer counters and flush latency"""
+    if log_buffer is None:
+        return {"enabled": False}
+    return {"enabled": True, **log_buffer.stats()}
+
+@router.post("/bounces/scan")
+async def scan_bounces(
+    processor: BounceProcessor = Depends(get_bounce_processor)
+):
+    """Scan the mailbox for bounces and auto-replies now, instead of waiting for the next scheduled scan"""
+    try:
+        summary = await asyncio.to_thread(processor.scan)
+        return {"success": True, **summary}
+    except Exception as e:
+        logger.error(f"Bounce scan failed: {e}")
+        raise HTTPException(status_code=500, detail=f"Bounce scan failed: {str(e)}")
+
+@router.get("/bounces/last-scan")
+async def get_last_bounce_scan(
+    processor: BounceProcessor = Depends(get_bounce_processor)
+):
+    """Get the counts of the most recent bounce scan"""
+    return {"last_scan": processor.last_scan}
+
 # Utility functions
+def log_generated_email(db: SupabaseClient, lead_id: str, campaign_id: str,
+                        email_content: Dict[str, str], email_type: str) -> Union[int, str]:
+    """Log a generated (not yet sent) email and return its log ID"""
+    email_log = {
+        "lead_id": lead_id,
+        "campaign_id": campaign_id,
+        "subject": email_content.get("subject"),
+        "body": email_content.get("body"),
+        "status": "generated",
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "email_type": email_type
+    }
+    return db.log_email_activity(email_log)
+
+def fetch_leads(db: SupabaseClient, lead_ids: List[str], page_size: int = 500) -> List[Dict[str, Any]]:
+    """Fetch lead records for a list of IDs, one query per page"""
+    leads = []
+    for start in range(0, len(lead_ids), page_size):
+        page = lead_ids[start:start + page_size]
+        if isinstance(db, BufferedSupabaseClient):
+            # Served from the run cache filled by prefetch_leads
+            leads.extend(lead for lead in (db.get_lead(lead_id) for lead_id in page) if lead)
+        else:
+            leads.extend(db.get_leads_by_ids(page))
+    return leads
+
 async def schedule_followup_task(
     scheduler: FollowupScheduler,
     lead_id: str,
     campaign_id: str,
-    followup_days: int
+    followup_days: int,
+    scope: Optional[str] = None
 ):
     """Background task to schedule followup emails"""
     try:
-        await scheduler.schedule_followup(lead_id, campaign_id, followup_days)
+        await scheduler.schedule_followup(lead_id, campaign_id, followup_days, scope)
         logger.info(f"Followup scheduled for lead {lead_id} in {followup_days} days")
     except Exception as e:
         logger.error(f"Failed to schedule followup: {e}")
@@ -429,7 +944,7 @@ async def test_email_connection(
     """Test Gmail API connection"""
     try:
         # Try to list labels to test connection
-        labels = gmail_api.list_labels()
+        labels = await asyncio.to_thread(gmail_api.list_labels)
         
         return {
             "success": True,
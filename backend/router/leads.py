@@ -1,13 +1,18 @@
 import io
 import logging
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
-import pandas as pd
-from fastapi import APIRouter, Depends, File, HTTPException, UploadFile, status
+from fastapi import APIRouter, Depends, File, HTTPException, Query, Request, Response, UploadFile, status
 from pydantic import BaseModel, EmailStr, Field
 
 # Import the Supabase client and its dependency function
 from services.supabase_client import SupabaseClient, SupabaseClientError
+from services.profiler import profiler
+from services.request_timing import TimedRoute
+from services.fast_json import list_response
+from services.http_cache import not_modified, versioned_etag, with_etag
+from services.export import EXPORT_FORMAT_PATTERN, LEAD_EXPORT_COLUMNS, export_response, iter_keyset_pages
+from services.streaming import STREAM_FORMAT_PATTERN, stream_events
 
 # In a real app, this would be in a central dependencies.py file
 # For now, we define it here for clarity.
@@ -58,12 +63,28 @@ class BulkUploadResponse(BaseModel):
 router = APIRouter(
     prefix="/leads",
     tags=["Leads"],
-    responses={404: {"description": "Not found"}}
+    responses={404: {"description": "Not found"}},
+    route_class=TimedRoute
 )
 logger = logging.getLogger(__name__)
 
 
+def validate_lead_rows(df) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Validates each row of a DataFrame of leads, returning the valid leads and the row errors."""
+    leads_to_insert = []
+    errors = []
+    for index, row in df.iterrows():
+        try:
+            # Use Pydantic to validate each row
+            lead_data = LeadCreate(**row.to_dict())
+            leads_to_insert.append(lead_data.model_dump()) # Use .dict() for Pydantic v1
+        except Exception as e:
+            errors.append({"row": index + 2, "details": str(e)}) # +2 to account for header and 0-indexing
+    return leads_to_insert, errors
+
+
 @router.post("/upload/csv", response_model=BulkUploadResponse)
+@profiler.profile("upload_leads_from_csv")
 def upload_leads_from_csv(
     file: UploadFile = File(...),
     db: SupabaseClient = Depends(get_supabase_client)
@@ -76,6 +97,9 @@ def upload_leads_from_csv(
     if not file.filename.endswith('.csv'):
         raise HTTPException(status_code=400, detail="Invalid file type. Please upload a CSV file.")
 
+    # pandas is only needed here, so it is imported on the first upload instead of at startup
+    import pandas as pd
+
     try:
         # Read CSV file into a pandas DataFrame
         contents = file.file.read()
@@ -95,15 +119,7 @@ def upload_leads_from_csv(
         logger.error(f"Error parsing CSV file: {e}")
         raise HTTPException(status_code=400, detail=f"Could not parse CSV file: {e}")
 
-    leads_to_insert = []
-    errors = []
-    for index, row in df.iterrows():
-        try:
-            # Use Pydantic to validate each row
-            lead_data = LeadCreate(**row.to_dict())
-            leads_to_insert.append(lead_data.model_dump()) # Use .dict() for Pydantic v1
-        except Exception as e:
-            errors.append({"row": index + 2, "details": str(e)}) # +2 to account for header and 0-indexing
+    leads_to_insert, errors = validate_lead_rows(df)
 
     if not leads_to_insert:
         return BulkUploadResponse(
@@ -127,20 +143,111 @@ def upload_leads_from_csv(
         raise HTTPException(status_code=500, detail=f"Failed to insert leads into database: {e}")
 
 
+@router.post("/upload/csv/stream")
+def upload_leads_from_csv_stream(
+    file: UploadFile = File(...),
+    format: str = Query("ndjson", pattern=STREAM_FORMAT_PATTERN, description="ndjson or sse (Server-Sent Events)"),
+    batch_size: int = Query(500, ge=1, le=5000, description="Rows parsed and inserted per batch."),
+    db: SupabaseClient = Depends(get_supabase_client)
+):
+    """
+    Uploads leads from a CSV file, streaming progress.
+    The file is parsed and inserted in batches; each emits a 'batch' event with
+    its row errors, followed by a final 'summary' event. Batches already
+    inserted stay inserted if a later one fails.
+    """
+    if not file.filename.endswith('.csv'):
+        raise HTTPException(status_code=400, detail="Invalid file type. Please upload a CSV file.")
+
+    import pandas as pd
+
+    try:
+        reader = pd.read_csv(file.file, chunksize=batch_size, encoding='utf-8')
+        first_chunk = next(reader, None)
+        columns = [col.lower().strip() for col in first_chunk.columns] if first_chunk is not None else []
+    except Exception as e:
+        logger.error(f"Error parsing CSV file: {e}")
+        raise HTTPException(status_code=400, detail=f"Could not parse CSV file: {e}")
+
+    required_columns = {'name', 'email'}
+    if not required_columns.issubset(columns):
+        raise HTTPException(
+            status_code=400,
+            detail=f"CSV must contain the following columns: {list(required_columns)}"
+        )
+
+    def events():
+        uploaded = failed = batches = 0
+        chunk = first_chunk
+        while chunk is not None:
+            chunk.columns = columns # Normalize column names
+            leads_to_insert, errors = validate_lead_rows(chunk)
+            inserted = db.bulk_insert_leads(leads_to_insert) if leads_to_insert else []
+            batches += 1
+            uploaded += len(inserted)
+            failed += len(errors)
+            yield {
+                "type": "batch",
+                "batch": batches,
+                "rows": len(chunk),
+                "successful_uploads": len(inserted),
+                "failed_records": len(errors),
+                "errors": errors,
+                "total_uploaded": uploaded
+            }
+            chunk = next(reader, None)
+        yield {
+            "type": "summary",
+            "message": f"Successfully uploaded {uploaded} leads." if uploaded else "No valid lead data found to upload.",
+            "successful_uploads": uploaded,
+            "failed_records": failed
+        }
+
+    return stream_events(events(), format)
+
+
+@router.get("/export")
+def export_leads(
+    format: str = Query("csv", pattern=EXPORT_FORMAT_PATTERN),
+    gzip: bool = Query(False, description="Download a gzip-compressed file."),
+    status: Optional[str] = None,
+    page_size: int = Query(1000, ge=100, le=10000, description="Rows fetched from the database per query."),
+    db: SupabaseClient = Depends(get_supabase_client)
+):
+    """
+    Exports leads, optionally filtered by status, as a CSV or NDJSON download.
+    Rows are streamed from the database page by page, so memory use does not
+    grow with the number of leads.
+    """
+    logger.info(f"Exporting leads with status {status if status else 'any'} as {format}")
+    pages = iter_keyset_pages(
+        lambda after_id, limit: db.get_leads_page(after_id=after_id, limit=limit, status=status), page_size
+    )
+    return export_response(pages, format, "leads", LEAD_EXPORT_COLUMNS, gzip=gzip)
+
+
 @router.get("/", response_model=List[LeadResponse])
 def get_leads(
+    request: Request,
+    response: Response,
     status: Optional[str] = None,
     db: SupabaseClient = Depends(get_supabase_client)
 ):
     """
     Retrieves leads, optionally filtered by status.
+    Answers 304 Not Modified when the client's ETag is still current.
     """
+    etag = versioned_etag(db, "leads", {"status": status} if status else None)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+
     logger.info(f"Fetching leads with status: {status if status else 'any'}")
     if status:
         leads = db.get_leads_by_status(status)
     else:
         leads = db.get_all_leads()
-    return leads
+    return with_etag(list_response(leads, LeadResponse), response, etag)
 
 
 @router.get("/{lead_id}", response_model=LeadResponse)
@@ -0,0 +1,96 @@
+import asyncio
+import logging
+from typing import Any, Dict, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from pydantic import BaseModel, EmailStr, Field
+
+from services.request_timing import TimedRoute
+from services.supabase_client import SupabaseClientError
+from services.suppression import SUPPRESSION_REASON_PATTERN, SuppressionIndex
+
+from router.emails import get_suppression_index
+
+
+# --- Pydantic Models ---
+
+class SuppressionCreate(BaseModel):
+    email: Optional[EmailStr] = Field(default=None, description="Address to suppress.")
+    domain: Optional[str] = Field(default=None, description="Domain to suppress, including its subdomains.")
+    reason: str = Field(default="manual", pattern=SUPPRESSION_REASON_PATTERN)
+    note: Optional[str] = None
+
+class SuppressionCheck(BaseModel):
+    email: str
+    suppressed: bool
+    reason: Optional[str] = None
+
+
+# --- API Router ---
+
+router = APIRouter(
+    prefix="/suppressions",
+    tags=["Suppressions"],
+    responses={404: {"description": "Not found"}},
+    route_class=TimedRoute
+)
+logger = logging.getLogger(__name__)
+
+
+def require_index(suppression: Optional[SuppressionIndex] = Depends(get_suppression_index)) -> SuppressionIndex:
+    if suppression is None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Suppression list is disabled.")
+    return suppression
+
+
+@router.get("")
+def get_suppression_stats(suppression: SuppressionIndex = Depends(require_index)) -> Dict[str, Any]:
+    """
+    Reports the size of the in-memory suppression index.
+    """
+    return suppression.stats()
+
+
+@router.get("/check", response_model=SuppressionCheck)
+def check_suppression(email: str = Query(...), suppression: SuppressionIndex = Depends(require_index)):
+    """
+    Checks whether an address may be emailed, as every send path does before generating content.
+    """
+    reason = suppression.check(email)
+    return SuppressionCheck(email=email, suppressed=reason is not None, reason=reason)
+
+
+@router.post("", status_code=status.HTTP_201_CREATED)
+async def add_suppression(entry: SuppressionCreate, suppression: SuppressionIndex = Depends(require_index)):
+    """
+    Adds an address or a whole domain to the do-not-contact list.
+    Takes effect immediately on this instance and within the refresh interval on others.
+    """
+    try:
+        row = await asyncio.to_thread(suppression.add, entry.email, entry.domain, entry.reason, entry.note)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except SupabaseClientError as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+    logger.info(f"Suppressed {entry.email or entry.domain} ({entry.reason})")
+    return row
+
+
+@router.delete("")
+async def remove_suppression(
+    email: Optional[str] = None,
+    domain: Optional[str] = None,
+    note: Optional[str] = None,
+    suppression: SuppressionIndex = Depends(require_index)
+):
+    """
+    Lifts the suppression of an address or domain.
+    """
+    try:
+        row = await asyncio.to_thread(suppression.remove, email, domain, note)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except SupabaseClientError as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+    logger.info(f"Lifted suppression of {email or domain}")
+    return row
@@ -0,0 +1,176 @@
+import base64
+import hashlib
+import logging
+import os
+import re
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Iterable, Iterator, Optional, Tuple, Union
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Size of the chunks attachments are read, decoded and written in
+CHUNK_SIZE = 256 * 1024
+# ioctl that clones a file's extents (a reflink) on Btrfs, XFS and similar filesystems
+FICLONE = 0x40049409
+
+
+def iter_base64url_decoded(chunks: Iterable[Union[str, bytes]]) -> Iterator[bytes]:
+    """
+    Decodes a stream of base64url text chunks of any size into binary chunks.
+    Only the few characters that do not yet make a full 4-character quantum
+    are carried over between chunks.
+    """
+    remainder = b""
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode("ascii")
+        chunk = remainder + chunk
+        usable = len(chunk) - len(chunk) % 4
+        remainder = chunk[usable:]
+        if usable:
+            yield base64.urlsafe_b64decode(chunk[:usable])
+    if remainder:
+        yield base64.urlsafe_b64decode(remainder + b"=" * (-len(remainder) % 4))
+
+
+def iter_chunks(text: str, size: int = CHUNK_SIZE) -> Iterator[str]:
+    """Slices an in-memory string into chunks."""
+    for start in range(0, len(text), size):
+        yield text[start:start + size]
+
+
+def iter_json_string_field(chunks: Iterable[bytes], field: str) -> Iterator[bytes]:
+    """
+    Yields the value of a top-level string `field` from a streamed JSON object
+    without buffering the whole document. Meant for values without escape
+    sequences, such as the base64url 'data' of a Gmail attachment.
+    """
+    opening = re.compile(rb'"' + re.escape(field.encode()) + rb'"\s*:\s*"')
+    buffer = b""
+    chunks = iter(chunks)
+    for chunk in chunks:
+        buffer += chunk
+        match = opening.search(buffer)
+        if match:
+            buffer = buffer[match.end():]
+            break
+        # Keep just enough of the tail to match an opening split across chunks
+        buffer = buffer[-(len(field) + 64):]
+    else:
+        raise ValueError(f"Field '{field}' not found in response")
+
+    while True:
+        end = buffer.find(b'"')
+        if end != -1:
+            if end:
+                yield buffer[:end]
+            return
+        if buffer:
+            yield buffer
+        buffer = next(chunks, None)
+        if buffer is None:
+            raise ValueError(f"Response ended inside field '{field}'")
+
+
+class AttachmentStore:
+    """
+    Content-addressed store of downloaded attachments.
+
+    Each distinct attachment is saved once, under its SHA-256, so an attachment
+    repeated across replies is not written again. Stored blobs are read-only,
+    and each requested path gets its own copy (a copy-on-write reflink where
+    the filesystem supports it, so it takes no extra space), so writing to a
+    materialized file can never alter the blob other emails share.
+    """
+
+    def __init__(self, root: Union[str, Path]):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_env(cls) -> Optional["AttachmentStore"]:
+        """A store under ATTACHMENT_STORE_DIR, or None when it is not set (no dedup)."""
+        root = os.getenv("ATTACHMENT_STORE_DIR")
+        return cls(root) if root else None
+
+    def path_for(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest
+
+    def put(self, chunks: Iterable[bytes]) -> Tuple[Path, str, int]:
+        """
+        Writes a stream of chunks into the store, hashing as it goes.
+        Returns the stored path, the SHA-256 hex digest and the size.
+        """
+        digest, size, temp_path = write_chunks(chunks, self.root)
+        path = self.path_for(digest)
+        if path.exists():
+            os.unlink(temp_path)
+            self.hits += 1
+        else:
+            path.parent.mkdir(exist_ok=True)
+            os.chmod(temp_path, 0o444)
+            os.replace(temp_path, path)
+            self.misses += 1
+        return path, digest, size
+
+    def materialize(self, digest: str, target: Path) -> Path:
+        """Places the stored attachment at `target`, replacing what is there."""
+        source = self.path_for(digest)
+        temp_target = target.with_name(f".{target.name}.{digest[:12]}.tmp")
+        copy_file(source, temp_target)
+        os.replace(temp_target, target)
+        return target
+
+
+def copy_file(source: Path, target: Path):
+    """Copies a file as a reflink where supported, otherwise byte by byte."""
+    try:
+        import fcntl
+
+        with open(source, "rb") as src, open(target, "wb") as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        return
+    except (ImportError, OSError):
+        pass
+    shutil.copyfile(source, target)
+
+
+def write_chunks(chunks: Iterable[bytes], directory: Path) -> Tuple[str, int, str]:
+    """
+    Streams chunks into a new temporary file in `directory`.
+    Returns the SHA-256 hex digest, the size and the file's path.
+    """
+    sha256 = hashlib.sha256()
+    size = 0
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".download-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for chunk in chunks:
+                sha256.update(chunk)
+                size += len(chunk)
+                f.write(chunk)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+    return sha256.hexdigest(), size, temp_path
+
+
+def save_stream(chunks: Iterable[bytes], target: Path, store: Optional[AttachmentStore] = None) -> Tuple[Path, str, int]:
+    """
+    Saves decoded attachment chunks to `target` without holding the whole file
+    in memory, through `store` when given. The file appears atomically, so a
+    failed download never leaves a partial file behind.
+    Returns the target path, the SHA-256 hex digest and the size.
+    """
+    if store is not None:
+        _, digest, size = store.put(chunks)
+        return store.materialize(digest, target), digest, size
+    digest, size, temp_path = write_chunks(chunks, target.parent)
+    os.replace(temp_path, target)
+    return target, digest, size
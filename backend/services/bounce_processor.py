@@ -0,0 +1,294 @@
+import logging
+import os
+import re
+from collections import OrderedDict
+from dataclasses import dataclass
+from email.utils import getaddresses, parseaddr
+from typing import Any, Dict, Optional, Tuple
+
+from services.gmail_api import METADATA_HEADERS, GmailAPI
+from services.metrics import REPLIES_CLASSIFIED
+from services.supabase_client import SupabaseClient
+from services.suppression import SuppressionIndex
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BOUNCE = "bounce"
+AUTO_REPLY = "auto_reply"
+# Lead status set for each kind of message
+LEAD_STATUSES = {BOUNCE: "bounced", AUTO_REPLY: "ooo"}
+# An auto-reply only changes leads that have not engaged or dropped out already
+AUTO_REPLY_UPDATABLE_STATUSES = (None, "", "new", "contacted")
+
+# Gmail search matching candidate messages; header rules below make the actual decision
+DEFAULT_SCAN_QUERY = (
+    'newer_than:2d (from:mailer-daemon OR from:postmaster OR subject:undeliverable '
+    'OR subject:"delivery status notification" OR subject:"automatic reply" '
+    'OR subject:"auto reply" OR subject:"out of office")'
+)
+CLASSIFIER_HEADERS = METADATA_HEADERS + [
+    'Auto-Submitted', 'Content-Type', 'Precedence', 'X-Autoreply', 'X-Autorespond', 'X-Failed-Recipients',
+]
+
+DAEMON_SENDERS = ("mailer-daemon", "postmaster", "mail-daemon", "mailerdaemon")
+BOUNCE_SUBJECT = re.compile(
+    r"undeliver|delivery status notification|delivery (?:has )?failed|mail delivery (?:failed|failure|subsystem)"
+    r"|returned mail|failure notice|message not delivered|address not found|non.?delivery",
+    re.IGNORECASE,
+)
+# Temporary delays are retried by the sending server and are not bounces
+DELAY_SUBJECT = re.compile(r"\(delay\)|delayed|will retry", re.IGNORECASE)
+AUTO_REPLY_SUBJECT = re.compile(
+    r"^\s*(?:automatic reply|auto(?:matic)?[ -]?(?:reply|response)|out of (?:the )?office|ooo\b|autoreply"
+    r"|abwesenheitsnotiz|r[ée]ponse automatique|respuesta autom[áa]tica|risposta automatica|autosvar)",
+    re.IGNORECASE,
+)
+FAILED_RECIPIENT = re.compile(
+    r"(?:final|original)-recipient:\s*rfc822;\s*<?([^\s<>;]+@[^\s<>;]+?)>?(?:\s|$)"
+    r"|(?:delivered to|message to|delivery to|recipients?:)\s*<?([^\s<>;:,]+@[^\s<>;:,]+?)>?(?=[\s.,:;]|$)",
+    re.IGNORECASE,
+)
+
+
+@dataclass
+class Classification:
+    kind: str
+    reason: str
+    # Bounced address for bounces, the auto-replying sender otherwise
+    address: Optional[str] = None
+
+
+def find_failed_recipient(headers: Dict[str, str], text: str) -> Optional[str]:
+    """The address a bounce reports as undeliverable, from X-Failed-Recipients or the DSN text."""
+    failed = headers.get('x-failed-recipients')
+    if failed:
+        return failed.split(',')[0].strip().lower()
+    match = FAILED_RECIPIENT.search(text or '')
+    if match:
+        return (match.group(1) or match.group(2)).lower()
+    return None
+
+
+def classify_message(details: Dict[str, Any]) -> Optional[Classification]:
+    """
+    Classifies a message from `GmailAPI.get_message_details` as a bounce (DSN),
+    an auto-reply, or neither (None), from its headers and subject alone.
+    Bounces are checked first because many DSNs also carry Auto-Submitted.
+    """
+    headers = details.get('headers') or {}
+    subject = details.get('subject') or ''
+    sender = parseaddr(details.get('sender') or '')[1].lower()
+    content_type = re.sub(r'[\s"]', '', headers.get('content-type', '').lower())
+
+    if DELAY_SUBJECT.search(subject):
+        return None
+    bounce_reason = None
+    if sender.split('@')[0] in DAEMON_SENDERS:
+        bounce_reason = f"sender {sender}"
+    elif content_type.startswith('multipart/report') and 'report-type=delivery-status' in content_type:
+        bounce_reason = "delivery status report"
+    elif headers.get('x-failed-recipients'):
+        bounce_reason = "X-Failed-Recipients"
+    elif BOUNCE_SUBJECT.search(subject):
+        bounce_reason = f"subject '{subject}'"
+    if bounce_reason:
+        return Classification(BOUNCE, bounce_reason, find_failed_recipient(headers, details.get('snippet')))
+
+    auto_submitted = headers.get('auto-submitted', 'no').strip().lower()
+    if auto_submitted != 'no':
+        auto_reason = f"Auto-Submitted: {auto_submitted}"
+    elif 'x-autoreply' in headers or 'x-autorespond' in headers:
+        auto_reason = "auto-reply header"
+    elif headers.get('precedence', '').strip().lower() == 'auto_reply':
+        auto_reason = "Precedence: auto_reply"
+    elif AUTO_REPLY_SUBJECT.search(subject):
+        auto_reason = f"subject '{subject}'"
+    else:
+        return None
+    return Classification(AUTO_REPLY, auto_reason, sender or None)
+
+
+class BounceProcessor:
+    """
+    Finds bounces and auto-replies in the mailbox and stops outreach to the leads they concern.
+
+    Each scan searches Gmail for candidates, fetches only their headers and
+    snippets (format='metadata'), classifies them with header and subject
+    rules, and matches them to a lead through the Gmail thread of the email
+    we sent, falling back to the addresses involved. Matched leads are marked
+    'bounced' or 'ooo' and their pending follow-ups and queued sends are cancelled.
+    """
+
+    def __init__(self, db_client: SupabaseClient, gmail_api: GmailAPI, scheduler=None,
+                 query: str = DEFAULT_SCAN_QUERY, max_results: int = 100, memory: int = 10000,
+                 suppression: Optional[SuppressionIndex] = None):
+        """
+        Args:
+            db_client: An instance of SupabaseClient.
+            gmail_api: An instance of GmailAPI.
+            scheduler: The FollowupScheduler whose jobs are cancelled; None only updates statuses.
+            query: Gmail search for candidate messages.
+            max_results: Messages examined per scan.
+            memory: How many processed message IDs are remembered to skip on later scans.
+            suppression: Bounced addresses are added to it, so no send path emails them again.
+        """
+        self.db = db_client
+        self.gmail = gmail_api
+        self.scheduler = scheduler
+        self.suppression = suppression
+        self.query = query
+        self.max_results = max_results
+        self.memory = memory
+        self._seen: "OrderedDict[str, None]" = OrderedDict()
+        self.last_scan: Optional[Dict[str, int]] = None
+
+    @classmethod
+    def from_env(cls, db_client: SupabaseClient, gmail_api: GmailAPI, scheduler=None,
+                 suppression: Optional[SuppressionIndex] = None) -> "BounceProcessor":
+        """Builds a processor configured by BOUNCE_SCAN_QUERY and BOUNCE_SCAN_MAX_RESULTS (default 100)."""
+        return cls(
+            db_client, gmail_api, scheduler,
+            query=os.getenv("BOUNCE_SCAN_QUERY", DEFAULT_SCAN_QUERY),
+            max_results=int(os.getenv("BOUNCE_SCAN_MAX_RESULTS", "100")),
+            suppression=suppression,
+        )
+
+    def start(self, interval_minutes: float = None):
+        """
+        Scans every BOUNCE_SCAN_INTERVAL_MINUTES (default 15; 0 disables) on the
+        follow-up scheduler, so only the leader process runs the scans.
+        """
+        global _active_processor
+        if interval_minutes is None:
+            interval_minutes = float(os.getenv("BOUNCE_SCAN_INTERVAL_MINUTES", "15"))
+        _active_processor = self
+        if not interval_minutes or self.scheduler is None:
+            return
+        self.scheduler.scheduler.add_job(
+            run_bounce_scan,
+            'interval',
+            minutes=interval_minutes,
+            id="bouncescan",
+            replace_existing=True,
+            coalesce=True,
+            max_instances=1
+        )
+        logger.info(f"Scanning for bounces and auto-replies every {interval_minutes:g} minutes.")
+
+    def scan(self) -> Dict[str, int]:
+        """Processes new candidate messages and returns counts of what was found and done."""
+        summary = {"examined": 0, "bounces": 0, "auto_replies": 0, "unmatched": 0, "cancelled_jobs": 0}
+        messages = self.gmail.search_emails(self.query, max_results=self.max_results)
+        new_ids = [message['id'] for message in messages if message['id'] not in self._seen]
+        details = self.gmail.get_messages_details_parallel(
+            new_ids, include_body=False, metadata_headers=CLASSIFIER_HEADERS
+        )
+        for msg_id, result in zip(new_ids, details):
+            if not result['success']:
+                logger.warning(f"Skipping message {msg_id}: {result['error']}")
+                continue
+            summary["examined"] += 1
+            try:
+                outcome, cancelled = self.process_message(result['result'])
+            except Exception as e:
+                logger.error(f"Failed to process message {msg_id}: {e}")
+                continue
+            self._remember(msg_id)
+            if outcome:
+                summary[outcome] += 1
+            summary["cancelled_jobs"] += cancelled
+        self.last_scan = summary
+        logger.info(f"Bounce scan: {summary}")
+        return summary
+
+    def process_message(self, details: Dict[str, Any]) -> Tuple[Optional[str], int]:
+        """
+        Classifies one message and applies it to its lead. Returns the summary
+        key of the outcome ('bounces', 'auto_replies', 'unmatched' or None for
+        other mail) and the number of jobs cancelled.
+        """
+        classification = classify_message(details)
+        if classification is None:
+            return None, 0
+        if classification.kind == BOUNCE and classification.address is None:
+            # The snippet did not name the recipient; read the DSN text itself
+            body = self.gmail.get_message_body(details['id'])
+            classification.address = find_failed_recipient(details.get('headers') or {}, body)
+
+        lead, email_log = self._find_lead(details, classification)
+        if lead is None:
+            logger.info(f"No lead found for {classification.kind} {details['id']} ({classification.reason}).")
+            return "unmatched", 0
+        REPLIES_CLASSIFIED.labels(kind=classification.kind).inc()
+        cancelled = self._apply(lead, email_log, classification)
+        return ("bounces" if classification.kind == BOUNCE else "auto_replies"), cancelled
+
+    def _find_lead(self, details: Dict[str, Any],
+                   classification: Classification) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        """The lead a message concerns and, when known, the email log it answers."""
+        thread_id = details.get('thread_id')
+        email_log = self.db.get_email_by_thread_id(thread_id) if thread_id else None
+        if email_log:
+            lead = self.db.get_lead(email_log['lead_id'])
+            if lead:
+                return lead, email_log
+
+        if classification.address:
+            lead = self.db.get_lead_by_email(classification.address)
+            if lead:
+                return lead, None
+
+        if thread_id:
+            # Threads we did not log (e.g. sent before logging): try the recipients of our messages in it
+            for message in self.gmail.get_thread_messages(thread_id, include_body=False):
+                if message['id'] == details['id']:
+                    continue
+                for _, address in getaddresses([message.get('to', '')]):
+                    lead = self.db.get_lead_by_email(address) if address else None
+                    if lead:
+                        return lead, None
+        return None, None
+
+    def _apply(self, lead: Dict[str, Any], email_log: Optional[Dict[str, Any]],
+               classification: Classification) -> int:
+        """Marks the lead (and bounced email), then cancels the lead's pending jobs."""
+        status = LEAD_STATUSES[classification.kind]
+        if classification.kind == AUTO_REPLY and lead.get('status') not in AUTO_REPLY_UPDATABLE_STATUSES:
+            logger.info(f"Ignoring auto-reply from lead {lead['id']} with status {lead.get('status')}.")
+            return 0
+        if lead.get('status') != status:
+            self.db.update_lead(lead['id'], {"status": status})
+            logger.info(f"Marked lead {lead['id']} as {status} ({classification.reason}).")
+        if classification.kind == BOUNCE and email_log and email_log.get('status') == 'sent':
+            self.db.update_email_status(email_log['id'], {
+                "status": "bounced", "error_message": f"Bounced: {classification.reason}"
+            })
+        if classification.kind == BOUNCE and self.suppression is not None and lead.get('email') \
+                and self.suppression.check(lead['email']) is None:
+            self.suppression.add(email=lead['email'], reason="bounce", note=classification.reason)
+        if self.scheduler is None:
+            return 0
+        return self.scheduler.cancel_lead_jobs(lead['id'], reason=status)
+
+    def _remember(self, msg_id: str):
+        self._seen[msg_id] = None
+        while len(self._seen) > self.memory:
+            self._seen.popitem(last=False)
+
+
+# The processor whose scans run in this process; the job references this
+# module-level function so it can be pickled into a shared job store.
+_active_processor: Optional[BounceProcessor] = None
+
+
+def run_bounce_scan():
+    """Job entry point for periodic bounce and auto-reply scans."""
+    if _active_processor is None:
+        logger.error("No bounce processor is active; skipping scan.")
+        return
+    try:
+        _active_processor.scan()
+    except Exception as e:
+        logger.error(f"Bounce scan failed: {e}", exc_info=True)
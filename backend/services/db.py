@@ -0,0 +1,24 @@
+import logging
+import os
+
+from services.supabase_client import SupabaseClient
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def create_db_client():
+    """
+    Returns the database client selected by DB_BACKEND.
+
+    'supabase' (the default) uses SupabaseClient and requires SUPABASE_URL and
+    SUPABASE_KEY; 'sqlite' uses the local SQLiteClient at SQLITE_DB_PATH.
+    """
+    backend = os.getenv("DB_BACKEND", "supabase").lower()
+    if backend == "sqlite":
+        from services.sqlite_client import SQLiteClient
+        return SQLiteClient()
+    if backend != "supabase":
+        raise ValueError(f"Unknown DB_BACKEND '{backend}'. Expected 'supabase' or 'sqlite'.")
+    return SupabaseClient()
@@ -0,0 +1,516 @@
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from services.metrics import LOG_BUFFER_FLUSH_LATENCY
+from services.resilience import is_transient
+from services.supabase_client import SupabaseClient, SupabaseClientError
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+PENDING_PREFIX = "pending-"
+
+
+class EmailLogBuffer:
+    """
+    A write-behind buffer for the 'emails' table.
+
+    Inserts from `log_email_activity` are held in memory and written in bulk,
+    and updates from `update_email_status` are merged into the pending insert
+    when the row has not been flushed yet. Outbox updates of the same run are
+    written after them in one batch, each still conditional on its claim
+    token, with email log handles replaced by the rows' IDs. Flushes happen
+    when `batch_size` rows are waiting or every `flush_interval` seconds,
+    whichever comes first. Rows the database keeps rejecting are isolated
+    and dead-lettered instead of holding back every later write.
+    """
+
+    def __init__(self, db_client: SupabaseClient, batch_size: int = 100,
+                 flush_interval: float = 2.0, spill_path: Optional[str] = None,
+                 max_attempts: int = 3, dead_letter_path: Optional[str] = None):
+        """
+        Args:
+            db_client: The SupabaseClient the buffered writes are flushed to.
+            batch_size: Number of pending rows that triggers an early flush.
+            flush_interval: Maximum seconds a write may wait before being flushed.
+            spill_path: JSONL file that receives writes which could not be flushed
+                        on shutdown. They are replayed on the next start.
+            max_attempts: Flushes a row may fail with a non-transient error before
+                          its batch is written in parts to find the rows at fault.
+            dead_letter_path: JSONL file that receives rows the database rejected on
+                              their own. They are not replayed.
+        """
+        self.db = db_client
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spill_path = Path(spill_path) if spill_path else None
+        self.max_attempts = max_attempts
+        self.dead_letter_path = Path(dead_letter_path) if dead_letter_path else None
+
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self._pending_inserts: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._pending_updates: "OrderedDict[Any, Dict[str, Any]]" = OrderedDict()
+        self._pending_outbox: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        # Handles that have been flushed, mapped to their database IDs
+        self._resolved: "OrderedDict[str, Any]" = OrderedDict()
+        self._max_resolved = 100_000
+        # Failed flushes per pending write, keyed by (kind, handle / ID / outbox key)
+        self._attempts: Dict[Tuple[str, Any], int] = {}
+
+        self._flush_latencies = deque(maxlen=1000)
+        self._counters = {
+            "emails_logged": 0,
+            "updates_received": 0,
+            "updates_coalesced": 0,
+            "rows_inserted": 0,
+            "rows_updated": 0,
+            "outbox_entries_written": 0,
+            "rows_dead_lettered": 0,
+            "flushes": 0,
+            "flush_errors": 0,
+            "round_trips": 0,
+        }
+
+    @classmethod
+    def from_env(cls, db_client: SupabaseClient) -> Optional["EmailLogBuffer"]:
+        """Builds a buffer from EMAIL_LOG_BUFFER_* settings, or returns None when disabled."""
+        if os.getenv("EMAIL_LOG_BUFFER_ENABLED", "false").lower() not in ("1", "true", "yes"):
+            return None
+        return cls(
+            db_client,
+            batch_size=int(os.getenv("EMAIL_LOG_BUFFER_BATCH_SIZE", "100")),
+            flush_interval=float(os.getenv("EMAIL_LOG_BUFFER_FLUSH_INTERVAL", "2.0")),
+            spill_path=os.getenv("EMAIL_LOG_BUFFER_SPILL_FILE", "email_log_spill.jsonl"),
+            max_attempts=int(os.getenv("EMAIL_LOG_BUFFER_MAX_ATTEMPTS", "3")),
+            dead_letter_path=os.getenv("EMAIL_LOG_BUFFER_DEAD_LETTER_FILE", "email_log_dead_letter.jsonl"),
+        )
+
+    # --- Lifecycle ---
+
+    def start(self):
+        """Replays any spilled writes and starts the background flusher thread."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._replay_spill()
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="email-log-buffer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+        logger.info(f"Email log buffer started (batch_size={self.batch_size}, interval={self.flush_interval}s).")
+
+    def close(self, retries: int = 3):
+        """
+        Stops the flusher and writes out everything still pending.
+        Writes that cannot be flushed after `retries` attempts are spilled to disk.
+        """
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout=self.flush_interval + 5)
+
+        for attempt in range(1, retries + 1):
+            try:
+                self.flush()
+                break
+            except SupabaseClientError as e:
+                logger.warning(f"Final email log flush failed (attempt {attempt}/{retries}): {e}")
+                time.sleep(min(2 ** attempt * 0.1, 2))
+
+        if self.pending_count():
+            self._spill()
+        logger.info("Email log buffer closed.")
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except SupabaseClientError as e:
+                # The failed writes have been re-queued; the next tick retries them.
+                logger.error(f"Background email log flush failed: {e}")
+
+    # --- Buffered write API (mirrors SupabaseClient) ---
+
+    def log_email_activity(self, email_log: Dict[str, Any]) -> str:
+        """
+        Queues an email log insert.
+        Returns a handle that can be passed to `update_email_status` or `resolve`.
+        """
+        handle = f"{PENDING_PREFIX}{uuid.uuid4().hex}"
+        with self._lock:
+            self._pending_inserts[handle] = dict(email_log)
+            self._counters["emails_logged"] += 1
+            should_flush = len(self._pending_inserts) >= self.batch_size
+        if should_flush:
+            self._wakeup.set()
+        return handle
+
+    def update_email_status(self, email_id: Any, update_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Queues an update for a buffered handle or a database ID.
+        Updates to rows that have not been inserted yet are folded into the insert.
+        """
+        with self._lock:
+            self._counters["updates_received"] += 1
+            if email_id in self._pending_inserts:
+                self._pending_inserts[email_id].update(update_data)
+                self._counters["updates_coalesced"] += 1
+            else:
+                key = self._resolved.get(email_id, email_id)
+                self._pending_updates.setdefault(key, {}).update(update_data)
+                if len(self._pending_updates) >= self.batch_size:
+                    self._wakeup.set()
+        return {"id": email_id, **update_data}
+
+    def update_outbox_entry(self, key: str, claim_token: str, update_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Queues an outbox entry update, applied at the next flush only if `claim_token`
+        still holds the entry. The return value assumes it will be.
+        """
+        with self._lock:
+            self._pending_outbox.setdefault(key, {}).update(
+                update_data, idempotency_key=key, claim_token=claim_token
+            )
+            if len(self._pending_outbox) >= self.batch_size:
+                self._wakeup.set()
+        return {"idempotency_key": key, **update_data}
+
+    def resolve(self, handle: Any) -> Any:
+        """Returns the database ID for a handle, flushing first if it is still pending."""
+        if not isinstance(handle, str) or not handle.startswith(PENDING_PREFIX):
+            return handle
+        with self._lock:
+            if handle in self._resolved:
+                return self._resolved[handle]
+        self.flush()
+        with self._lock:
+            return self._resolved.get(handle)
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._pending_inserts) + len(self._pending_updates) + len(self._pending_outbox)
+
+    # --- Flushing ---
+
+    def flush(self):
+        """Writes all pending inserts in one bulk call, then applies pending updates and outbox writes."""
+        with self._flush_lock:
+            with self._lock:
+                inserts = self._pending_inserts
+                updates = self._pending_updates
+                outbox = self._pending_outbox
+                self._pending_inserts = OrderedDict()
+                self._pending_updates = OrderedDict()
+                self._pending_outbox = OrderedDict()
+
+            if not inserts and not updates and not outbox:
+                return
+
+            started = time.perf_counter()
+            try:
+                if inserts:
+                    self._flush_batch("insert", inserts, self._flush_inserts)
+                if updates:
+                    self._flush_updates(updates)
+                if outbox:
+                    self._flush_batch("outbox", outbox, self._flush_outbox)
+            except SupabaseClientError:
+                self._requeue(inserts, updates, outbox)
+                with self._lock:
+                    self._counters["flush_errors"] += 1
+                raise
+            finally:
+                elapsed = time.perf_counter() - started
+                LOG_BUFFER_FLUSH_LATENCY.observe(elapsed)
+                with self._lock:
+                    self._flush_latencies.append(elapsed)
+                    self._counters["flushes"] += 1
+
+    def _flush_batch(self, kind: str, batch: "OrderedDict[Any, Dict[str, Any]]",
+                     write: Callable[["OrderedDict[Any, Dict[str, Any]]"], None]):
+        """
+        Writes a batch with `write`, leaving in `batch` only what is still unwritten.
+        Once a row has failed `max_attempts` flushes with an error that is not
+        transient, the batch is written in halves down to single rows, so a row
+        the database rejects is dead-lettered and the others go through. Transient
+        errors (timeouts, 5xx) only re-queue: the database is down, not the row bad.
+        """
+        try:
+            write(batch)
+        except SupabaseClientError as e:
+            with self._lock:
+                for key in batch:
+                    self._attempts[(kind, key)] = self._attempts.get((kind, key), 0) + 1
+                exhausted = any(self._attempts[(kind, key)] >= self.max_attempts for key in batch)
+            if is_transient(e) or not exhausted:
+                raise
+            logger.warning(f"Email log {kind} batch of {len(batch)} keeps failing ({e}); writing it in parts.")
+            self._isolate(kind, batch, write, e)
+            return
+        self._forget(kind, batch)
+        batch.clear()
+
+    def _isolate(self, kind: str, batch: "OrderedDict[Any, Dict[str, Any]]",
+                 write: Callable[["OrderedDict[Any, Dict[str, Any]]"], None], error: SupabaseClientError):
+        if len(batch) == 1:
+            key, data = batch.popitem()
+            self._dead_letter(kind, key, data, error)
+            return
+        keys = list(batch)
+        for part_keys in (keys[:len(keys) // 2], keys[len(keys) // 2:]):
+            part = OrderedDict((key, batch[key]) for key in part_keys)
+            try:
+                write(part)
+            except SupabaseClientError as e:
+                if is_transient(e):
+                    raise
+                self._isolate(kind, part, write, e)
+            self._forget(kind, part_keys)
+            for key in part_keys:
+                del batch[key]
+
+    def _forget(self, kind: str, keys: Iterable[Any]):
+        with self._lock:
+            for key in keys:
+                self._attempts.pop((kind, key), None)
+
+    def _dead_letter(self, kind: str, key: Any, data: Dict[str, Any], error: SupabaseClientError):
+        """Sets aside a write the database rejected on its own, so it stops blocking the buffer."""
+        self._forget(kind, (key,))
+        with self._lock:
+            self._counters["rows_dead_lettered"] += 1
+        if not self.dead_letter_path:
+            logger.error(f"Dropping email log {kind} {key} rejected by the database: {error}")
+            return
+        with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"op": kind, "key": key, "data": data, "error": str(error)}, default=str) + "\n")
+        logger.error(f"Dead-lettered email log {kind} {key} to {self.dead_letter_path}: {error}")
+
+    def _flush_inserts(self, inserts: "OrderedDict[str, Dict[str, Any]]"):
+        handles = list(inserts.keys())
+        with self._lock:
+            self._counters["round_trips"] += 1
+        rows = self.db.bulk_insert_email_logs(list(inserts.values()))
+        if len(rows) != len(handles):
+            raise SupabaseClientError(
+                f"Bulk email log insert returned {len(rows)} rows for {len(handles)} inserts."
+            )
+        with self._lock:
+            for handle, row in zip(handles, rows):
+                self._resolved[handle] = row["id"]
+            while len(self._resolved) > self._max_resolved:
+                self._resolved.popitem(last=False)
+            self._counters["rows_inserted"] += len(rows)
+
+    def _flush_updates(self, updates: "OrderedDict[Any, Dict[str, Any]]"):
+        # Updates queued while their insert was in flight are keyed by handle.
+        with self._lock:
+            translated: "OrderedDict[Any, Dict[str, Any]]" = OrderedDict()
+            for key, data in updates.items():
+                translated.setdefault(self._resolved.get(key, key), {}).update(data)
+        updates.clear()
+        updates.update(translated)
+        self._flush_batch("update", updates, self._write_updates)
+
+    def _write_updates(self, updates: "OrderedDict[Any, Dict[str, Any]]"):
+        # Rows with the same change (e.g. a status) are updated in one request. Applied
+        # updates are removed as we go so a failure only re-queues the rest.
+        groups: Dict[str, List[Any]] = {}
+        for email_id, data in updates.items():
+            groups.setdefault(json.dumps(data, sort_keys=True, default=str), []).append(email_id)
+        for email_ids in groups.values():
+            with self._lock:
+                self._counters["round_trips"] += 1
+            if len(email_ids) == 1:
+                self.db.update_email_status(email_ids[0], updates[email_ids[0]])
+            else:
+                self.db.bulk_update_email_status(email_ids, updates[email_ids[0]])
+            for email_id in email_ids:
+                del updates[email_id]
+            with self._lock:
+                self._counters["rows_updated"] += len(email_ids)
+
+    def _flush_outbox(self, outbox: "OrderedDict[str, Dict[str, Any]]"):
+        # Outbox entries refer to their email log, which has an ID once the inserts are flushed
+        with self._lock:
+            rows = []
+            for row in outbox.values():
+                email_log_id = row.get("email_log_id")
+                if email_log_id in self._resolved:
+                    row = {**row, "email_log_id": str(self._resolved[email_log_id])}
+                rows.append(row)
+            self._counters["round_trips"] += 1
+        written = {row["idempotency_key"] for row in self.db.update_outbox_entries(rows)}
+        for row in rows:
+            if row["idempotency_key"] not in written:
+                logger.warning(f"Claim on send {row['idempotency_key']} was taken over; its update was dropped.")
+        with self._lock:
+            self._counters["outbox_entries_written"] += len(written)
+
+    def _requeue(self, inserts: "OrderedDict[str, Dict[str, Any]]",
+                 updates: "OrderedDict[Any, Dict[str, Any]]",
+                 outbox: Optional["OrderedDict[str, Dict[str, Any]]"] = None):
+        """Puts writes from a failed flush back in front of anything queued since."""
+        with self._lock:
+            merged_outbox = OrderedDict(outbox or {})
+            for key, data in self._pending_outbox.items():
+                merged_outbox.setdefault(key, {}).update(data)
+            self._pending_outbox = merged_outbox
+
+            merged_inserts = OrderedDict(inserts)
+            for handle, row in self._pending_inserts.items():
+                merged_inserts[handle] = row
+            self._pending_inserts = merged_inserts
+
+            merged_updates: "OrderedDict[Any, Dict[str, Any]]" = OrderedDict()
+            for source in (updates, self._pending_updates):
+                for key, data in source.items():
+                    key = self._resolved.get(key, key)
+                    if key in self._pending_inserts:
+                        self._pending_inserts[key].update(data)
+                        self._attempts.pop(("update", key), None)
+                    else:
+                        merged_updates.setdefault(key, {}).update(data)
+            self._pending_updates = merged_updates
+
+    # --- Durability ---
+
+    def _spill(self):
+        if not self.spill_path:
+            logger.error(f"Dropping {self.pending_count()} unflushed email log writes; no spill file configured.")
+            return
+        with self._lock:
+            inserts = list(self._pending_inserts.items())
+            updates = list(self._pending_updates.items())
+            outbox = list(self._pending_outbox.values())
+            self._pending_inserts = OrderedDict()
+            self._pending_updates = OrderedDict()
+            self._pending_outbox = OrderedDict()
+        with open(self.spill_path, "a", encoding="utf-8") as f:
+            for handle, row in inserts:
+                f.write(json.dumps({"op": "insert", "handle": handle, "row": row}, default=str) + "\n")
+            for email_id, data in updates:
+                f.write(json.dumps({"op": "update", "id": email_id, "data": data}, default=str) + "\n")
+            for row in outbox:
+                f.write(json.dumps({"op": "outbox", "row": row}, default=str) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        logger.warning(
+            f"Spilled {len(inserts)} inserts, {len(updates)} updates and {len(outbox)} outbox writes to {self.spill_path}."
+        )
+
+    def _replay_spill(self):
+        if not self.spill_path or not self.spill_path.exists():
+            return
+        replayed = 0
+        with open(self.spill_path, encoding="utf-8") as f:
+            entries = [json.loads(line) for line in f if line.strip()]
+        with self._lock:
+            for entry in entries:
+                if entry["op"] == "insert":
+                    self._pending_inserts[entry["handle"]] = entry["row"]
+                elif entry["op"] == "outbox":
+                    self._pending_outbox.setdefault(entry["row"]["idempotency_key"], {}).update(entry["row"])
+                else:
+                    self._pending_updates.setdefault(entry["id"], {}).update(entry["data"])
+                replayed += 1
+        self.spill_path.unlink()
+        logger.info(f"Replaying {replayed} spilled email log writes from {self.spill_path}.")
+
+    # --- Metrics ---
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns write counters and flush latency figures in milliseconds."""
+        with self._lock:
+            latencies = sorted(self._flush_latencies)
+            stats: Dict[str, Any] = dict(self._counters)
+            stats["pending_inserts"] = len(self._pending_inserts)
+            stats["pending_updates"] = len(self._pending_updates)
+            stats["pending_outbox"] = len(self._pending_outbox)
+
+        def percentile(p: float) -> Optional[float]:
+            if not latencies:
+                return None
+            index = min(len(latencies) - 1, int(round(p * (len(latencies) - 1))))
+            return round(latencies[index] * 1000, 3)
+
+        stats["flush_latency_ms"] = {
+            "p50": percentile(0.50),
+            "p95": percentile(0.95),
+            "max": round(latencies[-1] * 1000, 3) if latencies else None,
+            "avg": round(sum(latencies) / len(latencies) * 1000, 3) if latencies else None,
+        }
+        emails = stats["emails_logged"]
+        stats["round_trips_per_email"] = round(stats["round_trips"] / emails, 4) if emails else None
+        return stats
+
+
+class BufferedSupabaseClient:
+    """
+    Stand-in for SupabaseClient used for the duration of a bulk run.
+    Email log and outbox writes go through an EmailLogBuffer and lead, campaign and
+    template lookups are served from a per-run cache; every other call is
+    passed through.
+    """
+
+    def __init__(self, db_client: SupabaseClient, buffer: EmailLogBuffer):
+        self._db = db_client
+        self.buffer = buffer
+        self._leads: Dict[str, Optional[Dict[str, Any]]] = {}
+        self._campaigns: Dict[str, Optional[Dict[str, Any]]] = {}
+        self._templates: Dict[str, Optional[Dict[str, Any]]] = {}
+
+    def __getattr__(self, name: str):
+        return getattr(self._db, name)
+
+    def prefetch_leads(self, lead_ids: Iterable[str], page_size: int = 500):
+        """Loads leads into the run cache with one query per page."""
+        ids: List[str] = [str(lead_id) for lead_id in lead_ids if str(lead_id) not in self._leads]
+        for start in range(0, len(ids), page_size):
+            page = ids[start:start + page_size]
+            for lead in self._db.get_leads_by_ids(page):
+                self._leads[str(lead["id"])] = lead
+
+    def get_lead(self, lead_id: str) -> Optional[Dict[str, Any]]:
+        key = str(lead_id)
+        if key not in self._leads:
+            self._leads[key] = self._db.get_lead(lead_id)
+        return self._leads[key]
+
+    def get_campaign(self, campaign_id: str) -> Optional[Dict[str, Any]]:
+        key = str(campaign_id)
+        if key not in self._campaigns:
+            self._campaigns[key] = self._db.get_campaign(campaign_id)
+        return self._campaigns[key]
+
+    def get_email_template(self, template_id: str) -> Optional[Dict[str, Any]]:
+        key = str(template_id)
+        if key not in self._templates:
+            self._templates[key] = self._db.get_email_template(template_id)
+        return self._templates[key]
+
+    def log_email_activity(self, email_log: Dict[str, Any]) -> str:
+        return self.buffer.log_email_activity(email_log)
+
+    def update_email_status(self, email_id: Any, update_data: Dict[str, Any]) -> Dict[str, Any]:
+        return self.buffer.update_email_status(email_id, update_data)
+
+    def update_outbox_entry(self, key: str, claim_token: str, update_data: Dict[str, Any]) -> Dict[str, Any]:
+        return self.buffer.update_outbox_entry(key, claim_token, update_data)
@@ -0,0 +1,107 @@
+import csv
+import io
+import json
+import logging
+import zlib
+from typing import Any, Callable, Dict, Iterator, List, Sequence
+
+from fastapi.responses import StreamingResponse
+
+from services.fast_json import dumps
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMAT_PATTERN = "^(csv|ndjson)$"
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+# Column order of CSV exports; NDJSON exports keep every field of the row
+LEAD_EXPORT_COLUMNS = (
+    "id", "name", "email", "company", "position", "linkedin_url", "status", "custom_data", "created_at",
+)
+EMAIL_EXPORT_COLUMNS = (
+    "id", "lead_id", "campaign_id", "email_type", "status", "subject", "body", "generated_at", "sent_at",
+    "opened_at", "replied_at", "error_message", "gmail_message_id", "gmail_thread_id", "created_at",
+)
+
+
+def iter_keyset_pages(fetch_page: Callable[[int, int], List[Dict[str, Any]]],
+                      page_size: int = 1000) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Yields pages of rows from `fetch_page(after_id, limit)`, which must return
+    rows in ascending ID order. Each page starts after the last ID of the
+    previous one, so only one page is held in memory and deep pages cost the
+    same as the first (unlike offset paging).
+    """
+    after_id = 0
+    while True:
+        rows = fetch_page(after_id, page_size)
+        if not rows:
+            return
+        yield rows
+        if len(rows) < page_size:
+            return
+        after_id = rows[-1]["id"]
+
+
+def encode_pages(pages: Iterator[List[Dict[str, Any]]], format: str,
+                 columns: Sequence[str]) -> Iterator[bytes]:
+    """Encodes each page of rows as one chunk of CSV (header first) or NDJSON."""
+    if format == "csv":
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction="ignore")
+        writer.writeheader()
+        yield buffer.getvalue().encode("utf-8")
+        for page in pages:
+            buffer.seek(0)
+            buffer.truncate()
+            for row in page:
+                writer.writerow({
+                    key: json.dumps(value) if isinstance(value, (dict, list)) else value
+                    for key, value in row.items()
+                })
+            yield buffer.getvalue().encode("utf-8")
+    else:
+        for page in pages:
+            yield b"".join(dumps(row) + b"\n" for row in page)
+
+
+def gzip_chunks(chunks: Iterator[bytes], level: int = 6) -> Iterator[bytes]:
+    """Compresses a stream of chunks into one gzip stream, chunk by chunk."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export_response(pages: Iterator[List[Dict[str, Any]]], format: str, filename: str,
+                    columns: Sequence[str], gzip: bool = False) -> StreamingResponse:
+    """
+    Streams pages of rows as a downloadable CSV or NDJSON file, optionally
+    gzipped (as a .gz file). Memory use is bounded by one page of rows.
+    """
+    def body() -> Iterator[bytes]:
+        rows = 0
+
+        def counted(pages: Iterator[List[Dict[str, Any]]]) -> Iterator[List[Dict[str, Any]]]:
+            nonlocal rows
+            for page in pages:
+                rows += len(page)
+                yield page
+
+        chunks = encode_pages(counted(pages), format, columns)
+        yield from gzip_chunks(chunks) if gzip else chunks
+        logger.info(f"Exported {rows} rows to {filename}")
+
+    filename = f"{filename}.{format}" + (".gz" if gzip else "")
+    return StreamingResponse(
+        body(),
+        media_type="application/gzip" if gzip else EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
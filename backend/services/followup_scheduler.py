@@ -1,13 +1,26 @@
 import logging
-from datetime import datetime, timedelta
+import os
+import random
+import threading
+from datetime import datetime, timedelta, timezone
 import asyncio
+from typing import Any, Dict, Optional
 
+from apscheduler.events import EVENT_JOB_SUBMITTED
+from apscheduler.jobstores.base import JobLookupError
 from apscheduler.schedulers.background import BackgroundScheduler
 
 # Import your services
 # These will be passed in during initialization to avoid re-creating them
 from services.gmail_api import GmailAPI
 from services.langchain_agent import LangChainAgent
+from services.leader_lease import LeaderLease, NullLease
+from services.metrics import SENDS_AVOIDED, record_scheduler_lag
+from services.outbox import Outbox, OutboxClaim
+from services.profiler import profiler
+from services.resilience import circuit_open_cause, is_ambiguous, should_retry_later
+from services.send_window import SendSlotAllocator
+from services.suppression import SuppressionIndex
 from services.supabase_client import SupabaseClient
 
 logging.basicConfig(level=logging.INFO)
@@ -16,13 +29,64 @@ logging.getLogger('apscheduler').setLevel(logging.WARNING)
 
 logger = logging.getLogger(__name__)
 
+# The scheduler whose services run jobs in this process. Jobs reference the
+# module-level functions below rather than bound methods so that they can be
+# pickled into a shared job store and run by whichever process is the leader.
+_active_scheduler: Optional["FollowupScheduler"] = None
+
+# Leads in these statuses are not followed up (set by the bounce processor or on unsubscribe)
+INACTIVE_LEAD_STATUSES = ("bounced", "ooo", "unsubscribed")
+
+
+def run_followup_check(lead_id: str, campaign_id: str, scope: Optional[str] = None):
+    """Job entry point for follow-up checks."""
+    if _active_scheduler is None:
+        logger.error(f"No follow-up scheduler is active; skipping follow-up for lead {lead_id}.")
+        return
+    _active_scheduler._execute_followup_check(lead_id, campaign_id, scope)
+
+
+def run_scheduled_send(email_log_id: Any, lead_id: str, campaign_id: str, recipient_email: str,
+                       body_type: str = "html", followup_days: Optional[int] = None, scope: Optional[str] = None):
+    """Job entry point for emails queued into a send slot."""
+    if _active_scheduler is None:
+        logger.error(f"No follow-up scheduler is active; skipping scheduled email {email_log_id}.")
+        return
+    _active_scheduler._execute_scheduled_send(
+        email_log_id, lead_id, campaign_id, recipient_email, body_type, followup_days, scope
+    )
+
+
+def create_jobstore_from_env():
+    """
+    Returns a SQLAlchemy job store for SCHEDULER_JOBSTORE_URL, or None for the
+    default in-memory store. A shared store lets jobs scheduled by any worker
+    be run by the leader; it requires the optional SQLAlchemy package.
+    """
+    url = os.getenv("SCHEDULER_JOBSTORE_URL")
+    if not url:
+        return None
+    try:
+        from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+    except ImportError as e:
+        raise ImportError("SCHEDULER_JOBSTORE_URL requires the 'sqlalchemy' package.") from e
+    return SQLAlchemyJobStore(url=url)
+
 
 class FollowupScheduler:
     """
     Manages scheduling and execution of follow-up email tasks using APScheduler.
+
+    When several API workers run, each constructs a scheduler but only the
+    holder of the leader lease executes jobs; the others run it paused, so
+    they can still add jobs to a shared job store, and retry the lease every
+    `lease_interval` seconds to take over if the leader goes away.
     """
 
-    def __init__(self, db_client: SupabaseClient, gmail_api: GmailAPI, agent: LangChainAgent):
+    def __init__(self, db_client: SupabaseClient, gmail_api: GmailAPI, agent: LangChainAgent,
+                 lease: Optional[LeaderLease] = None, jobstore=None, lease_interval: float = None,
+                 send_slots: Optional[SendSlotAllocator] = None, suppression: Optional[SuppressionIndex] = None,
+                 outbox: Optional[Outbox] = None, retry_delay: float = None):
         """
         Initializes the scheduler and injects required service dependencies.
 
@@ -30,45 +94,258 @@ class FollowupScheduler:
             db_client: An instance of SupabaseClient.
             gmail_api: An instance of GmailAPI.
             agent: An instance of LangChainAgent.
+            lease: Leader election lock; defaults to NullLease (always leader).
+            jobstore: APScheduler job store shared between workers; defaults to in-memory.
+            lease_interval: Seconds between lease renewals / takeover attempts
+                            (SCHEDULER_LEASE_INTERVAL, default 15).
+            send_slots: Places follow-ups and queued sends inside each lead's local
+                        send window; without it follow-ups run exactly `followup_days` later.
+            suppression: Addresses that must not be emailed; checked before generating or sending.
+            outbox: Claims each follow-up before it is generated, so a job that runs
+                    twice (e.g. after a leader takeover) sends it only once.
+            retry_delay: Seconds after which a job that failed because Gemini or Gmail was
+                         unavailable runs again (SCHEDULER_RETRY_SECONDS, default 300).
         """
-        self.scheduler = BackgroundScheduler(daemon=True)
+        jobstores = {"default": jobstore} if jobstore is not None else {}
+        self.scheduler = BackgroundScheduler(daemon=True, jobstores=jobstores)
+        self.scheduler.add_listener(self._on_job_submitted, EVENT_JOB_SUBMITTED)
         self.db = db_client
         self.gmail = gmail_api
         self.agent = agent
+        self.send_slots = send_slots
+        self.suppression = suppression
+        self.outbox = outbox
+        self.lease = lease or NullLease()
+        self.shared_jobstore = jobstore is not None
+        if lease_interval is None:
+            lease_interval = float(os.getenv("SCHEDULER_LEASE_INTERVAL", "15"))
+        self.lease_interval = lease_interval
+        if retry_delay is None:
+            retry_delay = float(os.getenv("SCHEDULER_RETRY_SECONDS", "300"))
+        self.retry_delay = retry_delay
+        self.is_leader = False
+        self._stop = threading.Event()
+        self._lease_thread: Optional[threading.Thread] = None
+
+    def _on_job_submitted(self, event):
+        """Records how late each job started relative to its scheduled run_date."""
+        job_type = event.job_id.split("_", 1)[0]
+        for run_time in event.scheduled_run_times:
+            record_scheduler_lag(job_type, run_time)
 
     def start(self):
-        """Starts the scheduler's background thread."""
+        """Starts the scheduler's background thread, paused unless this process holds the lease."""
+        global _active_scheduler
+        _active_scheduler = self
         try:
-            self.scheduler.start()
-            logger.info("Follow-up scheduler started successfully.")
+            self.is_leader = self.lease.acquire()
+            self.scheduler.start(paused=not self.is_leader)
+            role = "leader" if self.is_leader else "follower (paused)"
+            logger.info(f"Follow-up scheduler started successfully as {role}.")
+            if not self.is_leader and not self.shared_jobstore:
+                logger.warning("Follow-ups scheduled by this follower are kept in memory and only run "
+                               "if it becomes leader. Set SCHEDULER_JOBSTORE_URL to share jobs between workers.")
         except Exception as e:
             logger.error(f"Failed to start the scheduler: {e}")
+            return
+        if not isinstance(self.lease, NullLease):
+            self._lease_thread = threading.Thread(target=self._lease_loop, name="scheduler-lease", daemon=True)
+            self._lease_thread.start()
+
+    def _lease_loop(self):
+        """Renews the lease while leading, retries it while following."""
+        while not self._stop.wait(self.lease_interval):
+            try:
+                leader = self.lease.acquire()
+            except Exception as e:
+                logger.error(f"Leader lease check failed: {e}")
+                leader = False
+            if leader and not self.is_leader:
+                logger.info("Acquired scheduler leadership; resuming job processing.")
+                self.scheduler.resume()
+            elif not leader and self.is_leader:
+                logger.warning("Lost scheduler leadership; pausing job processing.")
+                self.scheduler.pause()
+            self.is_leader = leader
+            if leader and self.shared_jobstore:
+                # Jobs added by other workers don't wake this scheduler, so re-check the store
+                self.scheduler.wakeup()
 
     def shutdown(self):
         """Shuts down the scheduler gracefully."""
         logger.info("Shutting down the follow-up scheduler...")
+        self._stop.set()
         self.scheduler.shutdown()
+        if self.is_leader:
+            self.lease.release()
+            self.is_leader = False
 
-    async def schedule_followup(self, lead_id: str, campaign_id: str, followup_days: int):
+    async def schedule_followup(self, lead_id: str, campaign_id: str, followup_days: int,
+                                scope: Optional[str] = None):
         """
         Schedules a follow-up check for a given lead and campaign.
 
         If a job for this lead/campaign combo already exists, it will be replaced.
+        `scope` is the idempotency scope of the email followed up (e.g. a relaunch),
+        so that each scoped send gets its own follow-up.
         """
         run_date = datetime.now() + timedelta(days=followup_days)
+        if self.send_slots is not None:
+            run_date = self.send_slots.allocate(self.db.get_lead(lead_id), earliest=run_date)
         job_id = f"followup_{lead_id}_{campaign_id}"
 
         self.scheduler.add_job(
-            self._execute_followup_check,
+            run_followup_check,
             'date',
             run_date=run_date,
-            args=[lead_id, campaign_id],
+            args=[lead_id, campaign_id, scope],
             id=job_id,
             replace_existing=True
         )
         logger.info(f"Scheduled follow-up for lead {lead_id} on {run_date.strftime('%Y-%m-%d %H:%M:%S')}. Job ID: {job_id}")
 
-    def _execute_followup_check(self, lead_id: str, campaign_id: str):
+    def schedule_send(self, email_log_id: Any, lead: Dict[str, Any], campaign_id: str,
+                      body_type: str = "html", followup_days: Optional[int] = None,
+                      scope: Optional[str] = None) -> datetime:
+        """
+        Queues an already generated email (its log row must have status 'scheduled')
+        for the lead's next free send slot and returns the slot time.
+        """
+        if self.send_slots is None:
+            raise ValueError("Send windows are disabled (set SEND_WINDOW_ENABLED=true).")
+        run_date = self.send_slots.allocate(lead)
+        self.scheduler.add_job(
+            run_scheduled_send,
+            'date',
+            run_date=run_date,
+            args=[email_log_id, str(lead["id"]), campaign_id, lead["email"], body_type, followup_days, scope],
+            id=f"send_{email_log_id}",
+            replace_existing=True,
+            misfire_grace_time=None
+        )
+        logger.info(f"Queued email {email_log_id} for lead {lead['id']} at {run_date.isoformat()}")
+        return run_date
+
+    def cancel_lead_jobs(self, lead_id: Any, reason: str) -> int:
+        """
+        Removes the pending follow-up checks and queued sends of a lead, marking
+        the queued emails 'cancelled' with `reason`. Returns the number of jobs removed.
+        """
+        cancelled = 0
+        for job in self.scheduler.get_jobs():
+            job_type = job.id.split("_", 1)[0]
+            if job_type == "followup":
+                job_lead_id = job.args[0]
+            elif job_type == "send":
+                job_lead_id = job.args[1]
+            else:
+                continue
+            if str(job_lead_id) != str(lead_id):
+                continue
+            try:
+                job.remove()
+            except JobLookupError:
+                continue  # ran or was removed in the meantime
+            cancelled += 1
+            if job_type == "send":
+                try:
+                    email_log = self.db.get_email_status(job.args[0])
+                    self.db.update_email_status(job.args[0], {"status": "cancelled", "error_message": reason})
+                except Exception as e:
+                    logger.error(f"Failed to mark queued email {job.args[0]} as cancelled: {e}")
+                    continue
+                self._release_scheduled(email_log, reason)
+        if cancelled:
+            SENDS_AVOIDED.labels(reason=reason).inc(cancelled)
+            logger.info(f"Cancelled {cancelled} pending jobs for lead {lead_id} ({reason}).")
+        return cancelled
+
+    def _release_scheduled(self, email_log: Optional[Dict[str, Any]], error: str):
+        """Gives up the outbox claim a queued email holds, if any, once it will not be sent."""
+        claim = OutboxClaim.from_email_log(email_log) if self.outbox is not None and email_log else None
+        if claim is not None:
+            self.outbox.release(claim, error)
+
+    def _retry_later(self, job_id: str, func, args: list, error: Exception, **job_options) -> datetime:
+        """
+        Runs a job again once the dependency it failed on is likely back: when its
+        circuit breaker half-opens, but no sooner than `retry_delay`, with jitter
+        so that deferred jobs do not all retry at the same moment.
+        """
+        open_circuit = circuit_open_cause(error)
+        delay = max(self.retry_delay, open_circuit.retry_after if open_circuit else 0.0)
+        run_date = datetime.now() + timedelta(seconds=delay * random.uniform(1.0, 1.5))
+        self.scheduler.add_job(func, 'date', run_date=run_date, args=args, id=job_id, replace_existing=True,
+                               **job_options)
+        logger.warning(f"Job {job_id} deferred to {run_date.isoformat()}: {error}")
+        return run_date
+
+    @profiler.profile("scheduled_send")
+    def _execute_scheduled_send(self, email_log_id: Any, lead_id: str, campaign_id: str, recipient_email: str,
+                                body_type: str = "html", followup_days: Optional[int] = None,
+                                scope: Optional[str] = None):
+        """Sends a queued email at its slot, unless it was cancelled or sent in the meantime."""
+        try:
+            email_log = self.db.get_email_status(email_log_id)
+            if not email_log or email_log.get("status") != "scheduled":
+                logger.info(f"Email {email_log_id} is no longer scheduled; skipping send.")
+                if email_log and email_log.get("status") == "cancelled":
+                    self._release_scheduled(email_log, email_log.get("error_message") or "Scheduled send cancelled")
+                return
+            # The outbox claim taken when the email was generated, completed or released here
+            claim = OutboxClaim.from_email_log(email_log) if self.outbox is not None else None
+
+            reason = self.suppression.check(recipient_email) if self.suppression else None
+            if reason:
+                logger.info(f"Recipient of email {email_log_id} is suppressed ({reason}); cancelling send.")
+                self.db.update_email_status(email_log_id, {
+                    "status": "cancelled", "error_message": f"Recipient is suppressed ({reason})"
+                })
+                SENDS_AVOIDED.labels(reason="suppressed").inc()
+                self._release_scheduled(email_log, f"Recipient is suppressed ({reason})")
+                return
+
+            try:
+                sent_message = self.gmail.send_email(
+                    to=recipient_email,
+                    subject=email_log.get("subject"),
+                    body=email_log.get("body"),
+                    body_type=body_type,
+                )
+            except Exception as e:
+                if should_retry_later(e, sending=True):
+                    # Gmail refused it or was not called; the email stays 'scheduled'
+                    self._retry_later(
+                        f"send_{email_log_id}", run_scheduled_send,
+                        [email_log_id, lead_id, campaign_id, recipient_email, body_type, followup_days, scope], e,
+                        misfire_grace_time=None
+                    )
+                    return
+                self.db.update_email_status(email_log_id, {"status": "failed", "error_message": str(e)})
+                # A send that timed out may have gone through, so its claim is left to expire
+                if claim is not None and not is_ambiguous(e):
+                    self.outbox.release(claim, str(e))
+                raise
+
+            if claim is not None:
+                self.outbox.complete(claim, email_log_id, sent_message.get("id"), sent_message.get("threadId"),
+                                     email_log.get("subject"))
+            self.db.update_email_status(email_log_id, {
+                "status": "sent",
+                "sent_at": datetime.now(timezone.utc).isoformat(),
+                "gmail_message_id": sent_message.get("id"),
+                "gmail_thread_id": sent_message.get("threadId"),
+            })
+            logger.info(f"Sent scheduled email {email_log_id} to lead {lead_id}.")
+
+            if followup_days:
+                asyncio.run(self.schedule_followup(lead_id, campaign_id, followup_days, scope))
+
+        except Exception as e:
+            logger.error(f"An error occurred sending scheduled email {email_log_id}: {e}", exc_info=True)
+
+    @profiler.profile("followup")
+    def _execute_followup_check(self, lead_id: str, campaign_id: str, scope: Optional[str] = None):
         """
         The actual job executed by the scheduler. It checks for replies and sends a follow-up if needed.
         """
@@ -103,6 +380,25 @@ class FollowupScheduler:
                  logger.error(f"Could not retrieve lead or campaign info for lead {lead_id}. Aborting.")
                  return
 
+            if lead_info.get("status") in INACTIVE_LEAD_STATUSES:
+                logger.info(f"Lead {lead_id} is {lead_info['status']}. No follow-up will be sent.")
+                SENDS_AVOIDED.labels(reason=lead_info["status"]).inc()
+                return
+
+            # Checked before generating, so no LLM call is spent on a lead we will not email
+            reason = self.suppression.check(lead_info.get("email") or "") if self.suppression else None
+            if reason:
+                logger.info(f"Lead {lead_id} is suppressed ({reason}). No follow-up will be sent.")
+                SENDS_AVOIDED.labels(reason="suppressed").inc()
+                return
+
+            claim = None
+            if self.outbox is not None:
+                claim = self.outbox.claim(lead_id, campaign_id, "followup", scope=scope)
+                if not claim.claimed:
+                    logger.info(f"Follow-up for lead {lead_id} was already sent or is being sent.")
+                    return
+
             context = {
                 "lead_name": lead_info.get("name"),
                 "campaign_objective": campaign_info.get("objective"),
@@ -110,19 +406,30 @@ class FollowupScheduler:
                 "previous_email_body": latest_email.get("body"),
             }
 
-            # Use asyncio.run to handle the async method call
-            followup_content = asyncio.run(self.agent.generate_followup_email(context))
-            subject = followup_content["subject"]
-            body = followup_content["body"]
-            
-            # 3. Send the follow-up email
-            # For a true threaded reply, more headers (In-Reply-To, References) are needed.
-            # For simplicity, we send an email with a "Re:" subject and log it to the same threadId.
-            sent_message = self.gmail.send_email(
-                to=lead_info["email"],
-                subject=subject,
-                body=body,
-            )
+            sending = False
+            try:
+                # Use asyncio.run to handle the async method call
+                followup_content = asyncio.run(self.agent.generate_followup_email(context))
+                subject = followup_content["subject"]
+                body = followup_content["body"]
+
+                # 3. Send the follow-up email
+                # For a true threaded reply, more headers (In-Reply-To, References) are needed.
+                # For simplicity, we send an email with a "Re:" subject and log it to the same threadId.
+                sending = True
+                sent_message = self.gmail.send_email(
+                    to=lead_info["email"],
+                    subject=subject,
+                    body=body,
+                )
+            except Exception as e:
+                # A send that timed out may have gone through, so its claim expires instead of being released
+                if claim is not None and not (sending and is_ambiguous(e)):
+                    self.outbox.release(claim, str(e))
+                if should_retry_later(e, sending):
+                    self._retry_later(f"followup_{lead_id}_{campaign_id}", run_followup_check, [lead_id, campaign_id, scope], e)
+                    return
+                raise
             
             # 4. Log the follow-up email to the database
             followup_log = {
@@ -136,7 +443,13 @@ class FollowupScheduler:
                 "email_type": "followup",
                 "sent_at": datetime.now().isoformat(),
             }
-            self.db.log_email_activity(followup_log)
+            email_log_id = None
+            try:
+                email_log_id = self.db.log_email_activity(followup_log)
+            finally:
+                # Gmail accepted it, so it counts as sent even if logging failed
+                if claim is not None:
+                    self.outbox.complete(claim, email_log_id, sent_message["id"], sent_message.get("threadId"), subject)
             logger.info(f"Successfully sent and logged follow-up to lead {lead_id}.")
 
         except Exception as e:
@@ -1,18 +1,27 @@
 import os
 import base64
 import logging
-from typing import List, Dict, Optional, Union
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from email.mime.base import MIMEBase
-from email import encoders
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, Dict, Optional, Union
 from pathlib import Path
-from .google_apis import create_services
+from .attachment_store import (
+    AttachmentStore, CHUNK_SIZE, iter_base64url_decoded, iter_chunks, iter_json_string_field, save_stream
+)
+from .google_apis import authorized_session, build_service, discovery_document, load_credentials
+from .metrics import record_batch_size, track_gmail
+from .mime_builder import MimeMessageBuilder
+from .mime_parser import BODY_PLACEHOLDER, extract_body, has_attachments
+from .resilience import RetryPolicy, call_with_retry, get_breaker, is_rejected, is_transient
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Headers requested for format='metadata' fetches, which skip the message body
+METADATA_HEADERS = ['Subject', 'From', 'To', 'Cc', 'Bcc', 'Date']
+ATTACHMENT_URL = 'https://gmail.googleapis.com/gmail/v1/users/{user_id}/messages/{message_id}/attachments/{attachment_id}'
+
 class GmailAPIError(Exception):
     """Custom exception for Gmail API errors"""
     pass
@@ -20,44 +29,142 @@ class GmailAPIError(Exception):
 class GmailAPI:
     """Enhanced Gmail API wrapper with improved error handling and features"""
     
+    # Shared so the attachment cache also serves the backward-compatible helpers,
+    # which build instances without calling __init__
+    message_builder = MimeMessageBuilder.from_env()
+    # Body part taken when a message has both; GMAIL_BODY_PREFERENCE=text/html for the HTML one
+    body_type_preference = os.getenv('GMAIL_BODY_PREFERENCE', 'text/plain')
+    # Content-addressed dedup of downloaded attachments, enabled by ATTACHMENT_STORE_DIR
+    attachment_store = AttachmentStore.from_env()
+    # Transient errors are retried with backoff (RETRY_*); sustained failure opens the circuit (CIRCUIT_*)
+    breaker = get_breaker('gmail')
+    retry_policy = RetryPolicy.from_env()
+    
     def __init__(self, client_file: str, api_name: str = 'gmail', 
-                 api_version: str = 'v1', scopes: List[str] = None):
-        """Initialize Gmail API service"""
+                 api_version: str = 'v1', scopes: List[str] = None,
+                 max_workers: int = None):
+        """
+        Initialize Gmail API service.
+        
+        The googleapiclient transport (httplib2) is not thread-safe, so every
+        thread that uses `self.service` gets its own service object and
+        keep-alive connection, built from the same credentials and discovery
+        document. `max_workers` bounds the parallel fetch helper
+        (GMAIL_MAX_WORKERS, default 4).
+        """
         if scopes is None:
             scopes = ['https://mail.google.com/']
+        if max_workers is None:
+            max_workers = int(os.getenv('GMAIL_MAX_WORKERS', '4'))
         
+        self.max_workers = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        self._local = threading.local()
         try:
-            self.service = create_services(client_file, api_name, api_version, scopes)
+            self._credentials = load_credentials(client_file, api_name, api_version, scopes)
+            service = build_service(api_name, api_version, self._credentials)
+            self._discovery_doc = discovery_document(service)
+            self._local.service = service
             logger.info("Gmail API service initialized successfully")
         except Exception as e:
             logger.error(f"Failed to initialize Gmail API service: {e}")
             raise GmailAPIError(f"Service initialization failed: {e}")
     
-    def _extract_body(self, payload: Dict) -> str:
-        """Extract email body from payload with improved handling"""
-        body = '<Text body not available>'
+    @property
+    def service(self):
+        """The service object for the calling thread, built on first use in that thread"""
+        shared = self.__dict__.get('_shared_service')
+        if shared is not None:
+            return shared
+        service = getattr(self._local, 'service', None)
+        if service is None:
+            try:
+                service = build_service(None, None, self._credentials, discovery_doc=self._discovery_doc)
+            except Exception as e:
+                logger.error(f"Failed to build Gmail API service for thread: {e}")
+                raise GmailAPIError(f"Service initialization failed: {e}")
+            self._local.service = service
+            logger.debug(f"Built Gmail API service for thread {threading.current_thread().name}")
+        return service
+    
+    @property
+    def session(self):
+        """
+        An authorized requests session for the calling thread, for streamed
+        downloads; None for instances built from a bare service object.
+        """
+        credentials = self.__dict__.get('_credentials')
+        if credentials is None:
+            return None
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = authorized_session(credentials)
+            self._local.session = session
+        return session
+    
+    @service.setter
+    def service(self, service):
+        # An explicitly assigned service (backward-compatible helpers) is used as-is by every thread
+        self.__dict__['_shared_service'] = service
+    
+    def _execute(self, request, retry_on: Callable[[BaseException], bool] = is_transient) -> Any:
+        """
+        Execute an API request through the Gmail circuit breaker, retrying
+        transient errors. Non-idempotent requests such as sends pass
+        retry_on=is_rejected, so a timeout that may have gone through is not repeated.
+        """
+        return call_with_retry(request.execute, self.breaker, self.retry_policy, retry_on=retry_on)
+    
+    def _map_parallel(self, func: Callable[[Any], Any], items: List[Any]) -> List[Dict[str, Any]]:
+        """Runs func over items on the Gmail worker threads; results keep the input order"""
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='gmail')
+        
+        def run(item):
+            try:
+                return {'success': True, 'result': func(item)}
+            except Exception as e:
+                return {'success': False, 'error': str(e)}
         
+        return list(self._executor.map(run, items))
+    
+    def get_messages_details_parallel(self, msg_ids: List[str], user_id: str = 'me', include_body: bool = True,
+                                      metadata_headers: List[str] = None) -> List[Dict[str, Any]]:
+        """Fetch the details of several messages concurrently, in order"""
+        return self._map_parallel(
+            lambda msg_id: self.get_message_details(
+                msg_id, user_id, include_body=include_body, metadata_headers=metadata_headers
+            ),
+            msg_ids
+        )
+    
+    def close(self):
+        """Stop the worker threads used by the parallel helpers"""
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+    
+    def _extract_body(self, payload: Dict, msg_id: str = None, user_id: str = 'me') -> str:
+        """
+        Extract the email body from a full payload, at any MIME nesting depth.
+        Only the chosen text part is decoded; with `msg_id`, a body Gmail
+        stored out of line (as an attachment) is fetched too.
+        """
+        fetch = None
+        if msg_id:
+            fetch = lambda attachment_id: self._execute(self.service.users().messages().attachments().get(
+                userId=user_id, messageId=msg_id, id=attachment_id
+            ))['data']
         try:
-            if 'parts' in payload:
-                for part in payload['parts']:
-                    if part['mimeType'] == 'multipart/alternative':
-                        for subpart in part['parts']:
-                            if subpart['mimeType'] == 'text/plain' and 'data' in subpart['body']:
-                                body = base64.urlsafe_b64decode(subpart['body']['data']).decode('utf-8')
-                                break
-                    elif part['mimeType'] == 'text/plain' and 'data' in part['body']:
-                        body = base64.urlsafe_b64decode(part['body']['data']).decode('utf-8')
-                        break
-                    elif part['mimeType'] == 'text/html' and 'data' in part['body'] and body == '<Text body not available>':
-                        # Fallback to HTML if plain text not available
-                        body = base64.urlsafe_b64decode(part['body']['data']).decode('utf-8')
-            elif 'body' in payload and 'data' in payload['body']:
-                body = base64.urlsafe_b64decode(payload['body']['data']).decode('utf-8')
+            return extract_body(payload, prefer=self.body_type_preference, fetch_attachment=fetch)
         except Exception as e:
             logger.warning(f"Failed to extract email body: {e}")
-        
-        return body
+            return BODY_PLACEHOLDER
     
+    @track_gmail("list")
     def get_messages(self, user_id: str = 'me', label_ids: List[str] = None, 
                     folder_name: str = 'INBOX', max_results: int = 5) -> List[Dict]:
         """Get email messages with improved error handling"""
@@ -67,7 +174,7 @@ class GmailAPI:
         try:
             # Handle folder name to label ID conversion
             if folder_name:
-                label_result = self.service.users().labels().list(userId=user_id).execute()
+                label_result = self._execute(self.service.users().labels().list(userId=user_id))
                 labels = label_result.get('labels', [])
                 folder_label_id = next((label['id'] for label in labels 
                                       if label['name'].lower() == folder_name.lower()), None)
@@ -81,12 +188,12 @@ class GmailAPI:
                     raise GmailAPIError(f"Folder '{folder_name}' not found")
             
             while True:
-                result = self.service.users().messages().list(
+                result = self._execute(self.service.users().messages().list(
                     userId=user_id,
                     labelIds=label_ids,
                     maxResults=min(500, max_results - len(messages)) if max_results else 500,
                     pageToken=next_page_token
-                ).execute()
+                ))
                 
                 messages.extend(result.get('messages', []))
                 next_page_token = result.get('nextPageToken')
@@ -101,12 +208,23 @@ class GmailAPI:
             logger.error(f"Failed to get messages: {e}")
             raise GmailAPIError(f"Failed to retrieve messages: {e}")
     
-    def get_message_details(self, msg_id: str, user_id: str = 'me') -> Dict:
-        """Get detailed information about a specific message"""
+    @track_gmail("get")
+    def get_message_details(self, msg_id: str, user_id: str = 'me', include_body: bool = True,
+                            metadata_headers: List[str] = None) -> Dict:
+        """
+        Get detailed information about a specific message.
+        
+        With include_body=False only headers and the snippet are fetched
+        (format='metadata'), which is much smaller than the full payload;
+        'body' is then None and 'has_attachments' is not known (False).
+        `metadata_headers` replaces the default METADATA_HEADERS in that mode.
+        Use get_message_body when the snippet is not enough.
+        """
         try:
-            message = self.service.users().messages().get(
-                userId=user_id, id=msg_id, format='full'
-            ).execute()
+            message = self._execute(self.service.users().messages().get(
+                userId=user_id, id=msg_id, format='full' if include_body else 'metadata',
+                metadataHeaders=None if include_body else (metadata_headers or METADATA_HEADERS)
+            ))
             
             payload = message['payload']
             headers = payload.get('headers', [])
@@ -122,71 +240,48 @@ class GmailAPI:
                 'cc': header_dict.get('cc', ''),
                 'bcc': header_dict.get('bcc', ''),
                 'date': header_dict.get('date', 'No date'),
-                'body': self._extract_body(payload),
+                'body': self._extract_body(payload, msg_id, user_id) if include_body else None,
                 'snippet': message.get('snippet', 'No snippet'),
-                'has_attachments': any(part.get('filename') for part in payload.get('parts', []) 
-                                     if part.get('filename')),
+                'has_attachments': has_attachments(payload),
                 'starred': 'STARRED' in message.get('labelIds', []),
                 'labels': message.get('labelIds', []),
                 'thread_id': message.get('threadId', ''),
-                'size_estimate': message.get('sizeEstimate', 0)
+                'size_estimate': message.get('sizeEstimate', 0),
+                'headers': header_dict
             }
             
         except Exception as e:
             logger.error(f"Failed to get message details for {msg_id}: {e}")
             raise GmailAPIError(f"Failed to retrieve message details: {e}")
     
+    @track_gmail("get")
+    def get_message_body(self, msg_id: str, user_id: str = 'me') -> str:
+        """Fetch and extract only the body of a message, e.g. after a metadata-only fetch"""
+        try:
+            message = self._execute(self.service.users().messages().get(
+                userId=user_id, id=msg_id, format='full'
+            ))
+            return self._extract_body(message['payload'], msg_id, user_id)
+        except Exception as e:
+            logger.error(f"Failed to get message body for {msg_id}: {e}")
+            raise GmailAPIError(f"Failed to retrieve message body: {e}")
+    
+    @track_gmail("send")
     def send_email(self, to: Union[str, List[str]], subject: str, body: str, 
                    body_type: str = 'plain', cc: str = None, bcc: str = None,
                    attachment_paths: List[Union[str, Path]] = None) -> Dict:
         """Send email with enhanced features"""
         try:
-            message = MIMEMultipart()
-            
-            # Handle multiple recipients
-            if isinstance(to, list):
-                message['To'] = ', '.join(to)
-            else:
-                message['To'] = to
-            
-            message['Subject'] = subject
-            
-            if cc:
-                message['Cc'] = cc
-            if bcc:
-                message['Bcc'] = bcc
-            
-            # Validate body type
-            if body_type.lower() not in ['plain', 'html']:
-                raise ValueError("body_type must be either 'plain' or 'html'")
-            
-            message.attach(MIMEText(body, body_type.lower()))
-            
-            # Handle attachments
-            if attachment_paths:
-                for attachment_path in attachment_paths:
-                    attachment_path = Path(attachment_path)
-                    
-                    if not attachment_path.exists():
-                        raise FileNotFoundError(f"Attachment not found: {attachment_path}")
-                    
-                    with open(attachment_path, "rb") as attachment:
-                        part = MIMEBase("application", "octet-stream")
-                        part.set_payload(attachment.read())
-                    
-                    encoders.encode_base64(part)
-                    part.add_header(
-                        "Content-Disposition",
-                        f"attachment; filename={attachment_path.name}"
-                    )
-                    message.attach(part)
+            raw_message = self.message_builder.build_raw(
+                to, subject, body, body_type, cc=cc, bcc=bcc,
+                attachment_paths=attachment_paths
+            )
             
             # Send message
-            raw_message = base64.urlsafe_b64encode(message.as_bytes()).decode('utf-8')
-            sent_message = self.service.users().messages().send(
+            sent_message = self._execute(self.service.users().messages().send(
                 userId='me',
                 body={'raw': raw_message}
-            ).execute()
+            ), retry_on=is_rejected)
             
             logger.info(f"Email sent successfully. Message ID: {sent_message['id']}")
             return sent_message
@@ -195,6 +290,7 @@ class GmailAPI:
             logger.error(f"Failed to send email: {e}")
             raise GmailAPIError(f"Failed to send email: {e}")
     
+    @track_gmail("search")
     def search_emails(self, query: str, user_id: str = 'me', max_results: int = 5) -> List[Dict]:
         """Search emails with query"""
         messages = []
@@ -202,12 +298,12 @@ class GmailAPI:
         
         try:
             while True:
-                result = self.service.users().messages().list(
+                result = self._execute(self.service.users().messages().list(
                     userId=user_id,
                     q=query,
                     maxResults=min(500, max_results - len(messages)) if max_results else 500,
                     pageToken=next_page_token
-                ).execute()
+                ))
                 
                 messages.extend(result.get('messages', []))
                 next_page_token = result.get('nextPageToken')
@@ -222,6 +318,7 @@ class GmailAPI:
             logger.error(f"Failed to search emails: {e}")
             raise GmailAPIError(f"Failed to search emails: {e}")
     
+    @track_gmail("create_label")
     def create_label(self, name: str, label_list_visibility: str = 'labelShow',
                     message_list_visibility: str = 'show') -> Dict:
         """Create a new label"""
@@ -231,9 +328,9 @@ class GmailAPI:
                 'labelListVisibility': label_list_visibility,
                 'messageListVisibility': message_list_visibility
             }
-            created_label = self.service.users().labels().create(
+            created_label = self._execute(self.service.users().labels().create(
                 userId='me', body=label
-            ).execute()
+            ))
             
             logger.info(f"Label '{name}' created successfully")
             return created_label
@@ -242,10 +339,11 @@ class GmailAPI:
             logger.error(f"Failed to create label '{name}': {e}")
             raise GmailAPIError(f"Failed to create label: {e}")
     
+    @track_gmail("list_labels")
     def list_labels(self) -> List[Dict]:
         """List all labels"""
         try:
-            results = self.service.users().labels().list(userId='me').execute()
+            results = self._execute(self.service.users().labels().list(userId='me'))
             labels = results.get('labels', [])
             logger.info(f"Retrieved {len(labels)} labels")
             return labels
@@ -254,6 +352,7 @@ class GmailAPI:
             logger.error(f"Failed to list labels: {e}")
             raise GmailAPIError(f"Failed to list labels: {e}")
     
+    @track_gmail("modify")
     def modify_message_labels(self, message_id: str, add_labels: List[str] = None,
                              remove_labels: List[str] = None, user_id: str = 'me') -> Dict:
         """Modify labels on a message"""
@@ -267,9 +366,9 @@ class GmailAPI:
             if not body:
                 raise ValueError("Must specify either add_labels or remove_labels")
             
-            result = self.service.users().messages().modify(
+            result = self._execute(self.service.users().messages().modify(
                 userId=user_id, id=message_id, body=body
-            ).execute()
+            ))
             
             logger.info(f"Modified labels for message {message_id}")
             return result
@@ -278,12 +377,13 @@ class GmailAPI:
             logger.error(f"Failed to modify labels for message {message_id}: {e}")
             raise GmailAPIError(f"Failed to modify message labels: {e}")
     
+    @track_gmail("trash")
     def trash_message(self, message_id: str, user_id: str = 'me') -> Dict:
         """Move message to trash"""
         try:
-            result = self.service.users().messages().trash(
+            result = self._execute(self.service.users().messages().trash(
                 userId=user_id, id=message_id
-            ).execute()
+            ))
             
             logger.info(f"Message {message_id} moved to trash")
             return result
@@ -292,8 +392,10 @@ class GmailAPI:
             logger.error(f"Failed to trash message {message_id}: {e}")
             raise GmailAPIError(f"Failed to trash message: {e}")
     
+    @track_gmail("batch_trash")
     def batch_trash_messages(self, message_ids: List[str], user_id: str = 'me') -> None:
         """Trash multiple messages in batch"""
+        record_batch_size("gmail_batch_trash", len(message_ids))
         try:
             batch = self.service.new_batch_http_request()
             for message_id in message_ids:
@@ -306,56 +408,21 @@ class GmailAPI:
             logger.error(f"Failed to batch trash messages: {e}")
             raise GmailAPIError(f"Failed to batch trash messages: {e}")
     
+    @track_gmail("create_draft")
     def create_draft(self, to: Union[str, List[str]], subject: str, body: str,
                     body_type: str = 'plain', cc: str = None, bcc: str = None,
                     attachment_paths: List[Union[str, Path]] = None) -> Dict:
         """Create email draft"""
         try:
-            message = MIMEMultipart()
-            
-            # Handle multiple recipients
-            if isinstance(to, list):
-                message['To'] = ', '.join(to)
-            else:
-                message['To'] = to
-            
-            message['Subject'] = subject
-            
-            if cc:
-                message['Cc'] = cc
-            if bcc:
-                message['Bcc'] = bcc
-            
-            if body_type.lower() not in ['plain', 'html']:
-                raise ValueError("body_type must be either 'plain' or 'html'")
-            
-            message.attach(MIMEText(body, body_type.lower()))
-            
-            # Handle attachments
-            if attachment_paths:
-                for attachment_path in attachment_paths:
-                    attachment_path = Path(attachment_path)
-                    
-                    if not attachment_path.exists():
-                        raise FileNotFoundError(f"Attachment not found: {attachment_path}")
-                    
-                    with open(attachment_path, "rb") as attachment:
-                        part = MIMEBase("application", "octet-stream")
-                        part.set_payload(attachment.read())
-                    
-                    encoders.encode_base64(part)
-                    part.add_header(
-                        "Content-Disposition",
-                        f"attachment; filename={attachment_path.name}"
-                    )
-                    message.attach(part)
+            raw_message = self.message_builder.build_raw(
+                to, subject, body, body_type, cc=cc, bcc=bcc,
+                attachment_paths=attachment_paths
+            )
             
-            raw_message = base64.urlsafe_b64encode(message.as_bytes()).decode('utf-8')
-            
-            draft = self.service.users().drafts().create(
+            draft = self._execute(self.service.users().drafts().create(
                 userId='me',
                 body={'message': {'raw': raw_message}}
-            ).execute()
+            ), retry_on=is_rejected)
             
             logger.info(f"Draft created successfully. Draft ID: {draft['id']}")
             return draft
@@ -364,13 +431,14 @@ class GmailAPI:
             logger.error(f"Failed to create draft: {e}")
             raise GmailAPIError(f"Failed to create draft: {e}")
     
+    @track_gmail("send_draft")
     def send_draft(self, draft_id: str) -> Dict:
         """Send a draft email"""
         try:
-            sent_message = self.service.users().drafts().send(
+            sent_message = self._execute(self.service.users().drafts().send(
                 userId='me',
                 body={'id': draft_id}
-            ).execute()
+            ), retry_on=is_rejected)
             
             logger.info(f"Draft {draft_id} sent successfully")
             return sent_message
@@ -379,16 +447,18 @@ class GmailAPI:
             logger.error(f"Failed to send draft {draft_id}: {e}")
             raise GmailAPIError(f"Failed to send draft: {e}")
     
-    def get_thread_messages(self, thread_id: str, user_id: str = 'me') -> List[Dict]:
-        """Get all messages in a thread"""
+    @track_gmail("thread")
+    def get_thread_messages(self, thread_id: str, user_id: str = 'me', include_body: bool = True) -> List[Dict]:
+        """Get all messages in a thread; include_body=False fetches headers and snippets only"""
         try:
-            thread = self.service.users().threads().get(
-                userId=user_id, id=thread_id
-            ).execute()
+            thread = self._execute(self.service.users().threads().get(
+                userId=user_id, id=thread_id, format='full' if include_body else 'metadata',
+                metadataHeaders=None if include_body else METADATA_HEADERS
+            ))
             
             processed_messages = []
             for msg in thread['messages']:
-                headers = {h['name'].lower(): h['value'] for h in msg['payload']['headers']}
+                headers = {h['name'].lower(): h['value'] for h in msg['payload'].get('headers', [])}
                 
                 processed_messages.append({
                     'id': msg['id'],
@@ -396,7 +466,7 @@ class GmailAPI:
                     'from': headers.get('from', 'Unknown Sender'),
                     'to': headers.get('to', 'Unknown Recipient'),
                     'date': headers.get('date', 'Unknown Date'),
-                    'body': self._extract_body(msg['payload']),
+                    'body': self._extract_body(msg['payload'], msg['id'], user_id) if include_body else None,
                     'snippet': msg.get('snippet', ''),
                     'labels': msg.get('labelIds', [])
                 })
@@ -408,24 +478,44 @@ class GmailAPI:
             logger.error(f"Failed to get thread messages for {thread_id}: {e}")
             raise GmailAPIError(f"Failed to get thread messages: {e}")
     
+    @track_gmail("attachment")
     def download_attachment(self, message_id: str, attachment_id: str, 
                           filename: str, target_dir: str = '.', user_id: str = 'me') -> str:
-        """Download a specific attachment"""
+        """
+        Download a specific attachment.
+        
+        The response is streamed and decoded chunk by chunk straight to disk,
+        so memory stays flat however large the attachment is. Instances built
+        from a bare service object (the backward-compatible helpers) fetch the
+        encoded attachment whole but still decode and write it in chunks.
+        With an attachment store, identical attachments are stored once.
+        """
         try:
             target_dir = Path(target_dir)
             target_dir.mkdir(parents=True, exist_ok=True)
             
-            attachment = self.service.users().messages().attachments().get(
-                userId=user_id, messageId=message_id, id=attachment_id
-            ).execute()
-            
-            file_data = base64.urlsafe_b64decode(attachment['data'].encode('UTF-8'))
-            file_path = target_dir / filename
-            
-            with open(file_path, 'wb') as f:
-                f.write(file_data)
-            
-            logger.info(f"Attachment saved to: {file_path}")
+            session = self.session
+            if session is not None:
+                response = session.get(
+                    ATTACHMENT_URL.format(user_id=user_id, message_id=message_id, attachment_id=attachment_id),
+                    stream=True, timeout=60
+                )
+                with response:
+                    response.raise_for_status()
+                    encoded = iter_json_string_field(response.iter_content(CHUNK_SIZE), 'data')
+                    file_path, digest, size = save_stream(
+                        iter_base64url_decoded(encoded), target_dir / filename, self.attachment_store
+                    )
+            else:
+                attachment = self._execute(self.service.users().messages().attachments().get(
+                    userId=user_id, messageId=message_id, id=attachment_id
+                ))
+                file_path, digest, size = save_stream(
+                    iter_base64url_decoded(iter_chunks(attachment.pop('data'))),
+                    target_dir / filename, self.attachment_store
+                )
+            
+            logger.info(f"Attachment saved to: {file_path} ({size} bytes, sha256 {digest[:12]})")
             return str(file_path)
             
         except Exception as e:
@@ -1,49 +1,93 @@
 import os
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
-from google.oauth2.credentials import Credentials
-from google.auth.transport.requests import Request
 
 
 #will be responsible for createion of different services of goolge 
-def create_services(client_secret_file, api_name, api_version, scopes, prefix = ''):
-    CLIENT_SECRET_FILE = client_secret_file
-    API_SERVICE_NAME = api_name
-    API_VERSION = api_version
-
-    SCOPES = scopes
+def load_credentials(client_secret_file, api_name, api_version, scopes, prefix = ''):
+    """Loads (refreshing or running the OAuth flow if needed) and caches user credentials."""
+    # The Google client libraries are slow to import, so they load on first use
+    from google_auth_oauthlib.flow import InstalledAppFlow
+    from google.oauth2.credentials import Credentials
+    from google.auth.transport.requests import Request
 
     creds = None
-    working_dir = os.getcwd()
-    token_dir_name = 'token files'
-    token_file_name = f'token_{API_SERVICE_NAME}_{API_VERSION}{prefix}.json'
-    token_dir_path = os.path.join(working_dir, token_dir_name)
-    token_file_path = os.path.join(token_dir_path, token_file_name)
+    token_file_path = token_path(api_name, api_version, prefix)
 
     # Ensure the token directory exists
-    if not os.path.exists(token_dir_path):
-        os.makedirs(token_dir_path, exist_ok=True)
+    os.makedirs(os.path.dirname(token_file_path), exist_ok=True)
     
     if os.path.exists(token_file_path):
-        creds = Credentials.from_authorized_user_file(token_file_path, SCOPES)
+        creds = Credentials.from_authorized_user_file(token_file_path, scopes)
 
     if not creds or not creds.valid:
         if creds and creds.expired and creds.refresh_token:
             creds.refresh(Request())
         else:
-            flow = InstalledAppFlow.from_client_secrets_file(CLIENT_SECRET_FILE, SCOPES)
+            flow = InstalledAppFlow.from_client_secrets_file(client_secret_file, scopes)
             creds = flow.run_local_server(port=0)
         with open(token_file_path, 'w') as token:
             token.write(creds.to_json())
 
+    return creds
+
+
+def token_path(api_name, api_version, prefix = ''):
+    token_dir_path = os.path.join(os.getcwd(), 'token files')
+    return os.path.join(token_dir_path, f'token_{api_name}_{api_version}{prefix}.json')
+
+
+def authorized_http(creds, timeout = 60):
+    """
+    Returns a new httplib2 transport authorized with the credentials.
+    httplib2.Http is not thread-safe, so each thread needs its own; a
+    transport keeps its connections alive between requests.
+    """
+    import google_auth_httplib2
+    import httplib2
+
+    return google_auth_httplib2.AuthorizedHttp(creds, http=httplib2.Http(timeout=timeout))
+
+
+def authorized_session(creds):
+    """
+    Returns a requests session authorized with the credentials, for calls
+    whose responses should be streamed rather than parsed whole. Like
+    httplib2 transports, sessions should not be shared between threads.
+    """
+    from google.auth.transport.requests import AuthorizedSession
+
+    return AuthorizedSession(creds)
+
+
+def build_service(api_name, api_version, creds = None, http = None, discovery_doc = None):
+    """
+    Builds a service object. Pass `discovery_doc` (see `discovery_document`)
+    to build further copies without fetching the discovery document again.
+    """
+    from googleapiclient.discovery import build, build_from_document
+
+    if http is None:
+        http = authorized_http(creds)
+    if discovery_doc is not None:
+        return build_from_document(discovery_doc, http=http)
+    return build(api_name, api_version, http=http, static_discovery=False)
+
+
+def discovery_document(service):
+    """Returns the discovery document a service was built from."""
+    return service._rootDesc
+
+
+def create_services(client_secret_file, api_name, api_version, scopes, prefix = ''):
+    creds = load_credentials(client_secret_file, api_name, api_version, scopes, prefix)
 
     try:
-        service = build(API_SERVICE_NAME, API_VERSION, credentials=creds, static_discovery=False)
-        print(API_SERVICE_NAME, API_VERSION, 'service created sucessfully')
+        service = build_service(api_name, api_version, creds)
+        print(api_name, api_version, 'service created sucessfully')
         return service
     except Exception as e:
         print(e)
-        print(f'Failed to create services instance for {API_SERVICE_NAME}')
+        print(f'Failed to create services instance for {api_name}')
+        token_file_path = token_path(api_name, api_version, prefix)
         if os.path.exists(token_file_path):
             os.remove(token_file_path)
         return None
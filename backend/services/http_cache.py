@@ -0,0 +1,128 @@
+import hashlib
+import logging
+import os
+from typing import Any, Dict, Optional
+
+from fastapi import Request, Response
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Clients may cache responses but must revalidate them (with If-None-Match) before each use
+CACHE_CONTROL = "no-cache"
+# Set ETAG_VERSION_CHECK=false to skip the version query and only hash response bodies
+ETAG_VERSION_CHECK = os.getenv("ETAG_VERSION_CHECK", "true").lower() == "true"
+
+
+def make_etag(*parts: Any) -> str:
+    """A weak ETag derived from `parts`; weak because gzip may re-encode the body."""
+    digest = hashlib.sha1("|".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+    return f'W/"{digest[:27]}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: Optional[str]) -> bool:
+    """Weak comparison of an ETag against an If-None-Match header."""
+    if not if_none_match or not etag:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag.removeprefix("W/") in candidates
+
+
+def versioned_etag(db, table: str, filters: Optional[Dict[str, Any]] = None, *extra: Any) -> Optional[str]:
+    """
+    ETag for a list of `table` rows matching `filters`, from the table's cheap
+    version token (row count and latest update) instead of the rows themselves.
+    `extra` adds request parameters that change the response, e.g. paging.
+    Returns None when the version is unavailable.
+    """
+    if not ETAG_VERSION_CHECK:
+        return None
+    version = db.get_table_version(table, filters)
+    if version is None:
+        return None
+    return make_etag(table, sorted((filters or {}).items()), version, *extra)
+
+
+def not_modified(request: Request, etag: Optional[str]) -> Optional[Response]:
+    """A 304 response when the request's If-None-Match matches `etag`, otherwise None."""
+    if not etag_matches(request.headers.get("if-none-match"), etag):
+        return None
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+
+
+def with_etag(result: Any, response: Response, etag: Optional[str]) -> Any:
+    """
+    Sets the ETag on a route's result: directly when it is a Response,
+    otherwise on the injected `response` FastAPI merges into the serialized one.
+    """
+    target = result if isinstance(result, Response) else response
+    if etag:
+        target.headers["ETag"] = etag
+    target.headers["Cache-Control"] = CACHE_CONTROL
+    return result
+
+
+class ConditionalGetMiddleware:
+    """
+    Answers conditional GETs with 304 Not Modified.
+
+    Responses that carry an ETag (set by routes from a version token) are
+    compared as-is. Other successful JSON responses sent in a single body
+    message get a weak ETag hashed from the body, which saves bandwidth but not
+    the work of building them. Streaming responses pass through untouched.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["method"] not in ("GET", "HEAD"):
+            await self.app(scope, receive, send)
+            return
+
+        if_none_match = Headers(scope=scope).get("if-none-match")
+        start: Optional[Message] = None
+        answered = False
+
+        async def send_conditional(message: Message):
+            nonlocal start, answered
+            if answered:
+                return  # rest of a body already answered with 304
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                if message["status"] != 200 or not headers.get("content-type", "").startswith("application/json"):
+                    await send(message)
+                    return
+                # Hold the start message until the body shows whether this is a single-message response
+                start = message
+                return
+            if start is None:
+                await send(message)
+                return
+
+            held, start = start, None
+            headers = MutableHeaders(raw=held["headers"])
+            if message.get("more_body", False) and "etag" not in headers:
+                await send(held)
+                await send(message)
+                return
+            etag = headers.get("etag") or make_etag(hashlib.sha1(message.get("body", b"")).hexdigest())
+            headers["ETag"] = etag
+            if "cache-control" not in headers:
+                headers["Cache-Control"] = CACHE_CONTROL
+            if etag_matches(if_none_match, etag):
+                for header in ("content-length", "content-type"):
+                    del headers[header]
+                await send({"type": "http.response.start", "status": 304, "headers": held["headers"]})
+                await send({"type": "http.response.body", "body": b""})
+                answered = True
+                return
+            await send(held)
+            await send(message)
+
+        await self.app(scope, receive, send_conditional)
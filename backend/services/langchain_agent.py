@@ -1,12 +1,15 @@
+import asyncio
 import logging
 import os
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional, Tuple
 
 from dotenv import load_dotenv
-from langchain_core.output_parsers import JsonOutputParser
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_google_genai import ChatGoogleGenerativeAI
+
+from services.llm_router import LLMRouter
+from services.metrics import track_llm
+from services.resilience import RetryPolicy, call_with_retry, call_with_retry_async, get_breaker
+from services.template_engine import TemplateEngine, build_template_context
 
 # Load environment variables from .env file
 load_dotenv()
@@ -16,10 +19,68 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+SEGMENT_FIELDS = ("position", "company")
+OTHER_SEGMENT = ("other",)
+
+
+class LLMGenerationError(Exception):
+    """Raised when the model fails to produce usable content; nothing is sent in its place."""
+    pass
+
+
+def segment_key(lead: Dict[str, Any], segment_by: List[str]) -> Tuple[str, ...]:
+    """
+    Builds the segment key of a lead from the given fields.
+    Fields are lead columns ('position', 'company') or 'custom_data.<name>'.
+    """
+    key = []
+    for field in segment_by:
+        if field.startswith("custom_data."):
+            value = (lead.get("custom_data") or {}).get(field.split(".", 1)[1])
+        else:
+            value = lead.get(field)
+        key.append(str(value).strip().lower() if value not in (None, "") else "")
+    return tuple(key)
+
+
+def _chat_prompt(template: str, partial_variables: Dict[str, Any]):
+    """Builds a ChatPromptTemplate; langchain is imported on first use to keep startup fast."""
+    from langchain_core.prompts import ChatPromptTemplate
+    return ChatPromptTemplate.from_template(template=template, partial_variables=partial_variables)
+
+
+def group_leads_into_segments(leads: List[Dict[str, Any]], segment_by: List[str],
+                              max_segments: Optional[int] = None) -> Dict[Tuple[str, ...], List[Dict[str, Any]]]:
+    """
+    Groups leads by their segment key.
+
+    When there are more than `max_segments` groups, the largest ones keep their
+    own segment and the rest are merged into a single catch-all segment, which
+    caps the number of LLM calls a campaign can make.
+    """
+    segments: Dict[Tuple[str, ...], List[Dict[str, Any]]] = {}
+    for lead in leads:
+        segments.setdefault(segment_key(lead, segment_by), []).append(lead)
+
+    if max_segments and len(segments) > max_segments:
+        ranked = sorted(segments.items(), key=lambda item: len(item[1]), reverse=True)
+        kept = dict(ranked[:max_segments - 1])
+        kept[OTHER_SEGMENT] = [lead for _, group in ranked[max_segments - 1:] for lead in group]
+        segments = kept
+    return segments
+
+
 class LangChainAgent:
     """
     An agent that uses LangChain and a Google Gemini model to perform
     tasks like generating and evaluating email content.
+
+    Model calls go through the 'gemini' circuit breaker and are retried on
+    transient errors (429, 5xx, timeouts) with jittered exponential backoff.
+    The model of each task, and whether slow calls are hedged, is decided by
+    an LLMRouter configured from the environment (see LLMRouter.from_env).
+    When a generation still fails, LLMGenerationError is raised instead of
+    returning placeholder content that could be sent to a lead.
     """
 
     def __init__(self):
@@ -32,20 +93,40 @@ class LangChainAgent:
             logger.error("GEMINI_API_KEY not found in environment variables.")
             raise ValueError("GEMINI_API_KEY is not set.")
 
-        # Initialize the ChatGoogleGenerativeAI model
-        # Model: gemini-1.5-flash-001 is a fast, multimodal model.
-        # Temperature: 0.7 strikes a balance between creativity and predictability.
-        #   - Lower (e.g., 0.2) would be more deterministic and less "creative".
-        #   - Higher (e.g., 1.0) would be more random and potentially less coherent.
-        self.model = ChatGoogleGenerativeAI(
-            model="gemini-1.5-flash",
-            api_key=api_key,
-            temperature=0.7,
-            convert_system_message_to_human=True # Helps with some models
-        )
+        # Imported here rather than at module level: langchain and the Gemini SDK
+        # take most of a second to import and are only needed once an agent exists.
+        from langchain_core.output_parsers import JsonOutputParser
+
+        self.api_key = api_key
+        # Chooses the model per task (e.g. a cheaper one for follow-ups) and hedges slow calls
+        self.router = LLMRouter.from_env()
+        self._models: Dict[str, Any] = {}
+        self.model = self._model(self.router.default_model)
         
         # Initialize a parser to get structured JSON output
         self.parser = JsonOutputParser()
+        self.breaker = get_breaker("gemini")
+        self.retry_policy = RetryPolicy.from_env()
+
+    def _model(self, name: str):
+        """The ChatGoogleGenerativeAI client of a model, created on first use."""
+        model = self._models.get(name)
+        if model is None:
+            from langchain_google_genai import ChatGoogleGenerativeAI
+
+            # Temperature: 0.7 strikes a balance between creativity and predictability.
+            #   - Lower (e.g., 0.2) would be more deterministic and less "creative".
+            #   - Higher (e.g., 1.0) would be more random and potentially less coherent.
+            model = self._models[name] = ChatGoogleGenerativeAI(
+                model=name,
+                api_key=self.api_key,
+                temperature=0.7,
+                convert_system_message_to_human=True, # Helps with some models
+                # Retries are done by call_with_retry, which also feeds the circuit breaker
+                max_retries=1,
+                timeout=float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+            )
+        return model
 
     def _load_prompt_template(self, file_name: str) -> str:
         """Loads a prompt template from the 'prompts' directory."""
@@ -54,6 +135,17 @@ class LangChainAgent:
             raise FileNotFoundError(f"Prompt file not found: {prompt_path}")
         return prompt_path.read_text()
 
+    async def _ainvoke(self, task: str, prompt, inputs: Dict[str, Any]) -> Any:
+        """
+        Runs a prompt on the task's model through the Gemini circuit breaker,
+        retrying transient errors, and parses the JSON reply. Each attempt may
+        be hedged by the router; token usage is recorded per model.
+        """
+        call = lambda model: (prompt | self._model(model)).ainvoke(inputs)
+        message = await call_with_retry_async(lambda: self.router.invoke(task, call), self.breaker, self.retry_policy)
+        return self.parser.invoke(message)
+
+    @track_llm("cold_email")
     async def generate_cold_email(self, context: Dict[str, Any]) -> Dict[str, str]:
         """
         Generates a personalized cold email subject and body.
@@ -65,26 +157,125 @@ class LangChainAgent:
 
         Returns:
             A dictionary with "subject" and "body" keys.
+
+        Raises:
+            LLMGenerationError: If no usable email could be generated.
         """
         logger.info(f"Generating cold email for lead: {context.get('lead_name')}")
         try:
             prompt_template_str = self._load_prompt_template("cold_email_prompt.txt")
-            prompt = ChatPromptTemplate.from_template(
+            prompt = _chat_prompt(
                 template=prompt_template_str,
                 partial_variables={"format_instructions": self.parser.get_format_instructions()}
             )
             
-            chain = prompt | self.model | self.parser
-            response =  await chain.ainvoke(context)
+            response = await self._ainvoke("cold_email", prompt, context)
+            if not response.get("subject") or not response.get("body"):
+                raise ValueError("Response is missing 'subject' or 'body'.")
             
             logger.info("Successfully generated and parsed cold email.")
             return response
         except Exception as e:
             logger.error(f"Failed to generate cold email: {e}")
-            # Fallback in case of an error
-            return {"subject": "Following up", "body": "I hope you are having a great week."}
+            raise LLMGenerationError(f"Failed to generate cold email: {e}") from e
+
+    @track_llm("segment")
+    async def generate_segment_template(self, context: Dict[str, Any]) -> Dict[str, str]:
+        """
+        Generates one cold email template for a segment of similar leads.
 
-    def generate_followup_email(self, context: Dict[str, Any]) -> Dict[str, str]:
+        Args:
+            context: A dictionary describing the segment.
+                     Expected keys: segment_description, sample_leads,
+                                    campaign_objective, campaign_tone.
+
+        Returns:
+            A dictionary with "subject" and "body" templates containing
+            placeholders such as {lead_first_name} and {lead_company}.
+        """
+        logger.info(f"Generating segment template for: {context.get('segment_description')}")
+        prompt_template_str = self._load_prompt_template("segment_prompt.txt")
+        prompt = _chat_prompt(
+            template=prompt_template_str,
+            partial_variables={"format_instructions": self.parser.get_format_instructions()}
+        )
+
+        response = await self._ainvoke("segment", prompt, context)
+        if not response.get("subject") or not response.get("body"):
+            raise ValueError("Segment template response is missing 'subject' or 'body'.")
+
+        logger.info("Successfully generated and parsed segment template.")
+        return response
+
+    async def generate_segment_emails(self, leads: List[Dict[str, Any]], campaign: Dict[str, Any],
+                                      segment_by: Optional[List[str]] = None,
+                                      max_segments: Optional[int] = None,
+                                      custom_context: Optional[Dict[str, Any]] = None,
+                                      template_engine: Optional[TemplateEngine] = None,
+                                      concurrency: int = 4) -> Dict[str, Dict[str, str]]:
+        """
+        Generates emails for many leads with one LLM call per segment.
+
+        Leads are grouped by `segment_by`, a template is generated for each
+        segment and then rendered locally for every lead in it.
+
+        Args:
+            leads: Lead records to generate emails for.
+            campaign: The campaign record (objective, tone).
+            segment_by: Lead fields to group by. Defaults to position and company.
+            max_segments: Upper bound on segments, and therefore on LLM calls.
+            custom_context: Extra placeholder values shared by all leads.
+            template_engine: Engine used to render the segment templates.
+            concurrency: Maximum number of segment generations in flight.
+
+        Returns:
+            A dictionary mapping lead ID to its "subject" and "body". Leads whose
+            segment failed to generate are left out so the caller can fall back
+            to per-lead generation.
+        """
+        segment_by = segment_by or list(SEGMENT_FIELDS)
+        template_engine = template_engine or TemplateEngine()
+        segments = group_leads_into_segments(leads, segment_by, max_segments)
+        logger.info(f"Generating emails for {len(leads)} leads in {len(segments)} segments by {segment_by}")
+
+        semaphore = asyncio.Semaphore(concurrency)
+        results: Dict[str, Dict[str, str]] = {}
+
+        async def generate_for_segment(key: Tuple[str, ...], members: List[Dict[str, Any]]):
+            if key == OTHER_SEGMENT:
+                description = "Leads not covered by the other segments; keep the email broadly applicable."
+            else:
+                description = ", ".join(f"{field}: {value or 'unknown'}" for field, value in zip(segment_by, key))
+            samples = "\n".join(
+                f"- {lead.get('position') or 'Unknown role'} at {lead.get('company') or 'unknown company'}"
+                for lead in members[:5]
+            )
+            context = {
+                "segment_description": description,
+                "sample_leads": samples,
+                "campaign_objective": campaign.get("objective"),
+                "campaign_tone": campaign.get("tone", "professional"),
+            }
+            try:
+                async with semaphore:
+                    generated = await self.generate_segment_template(context)
+                template = {
+                    "id": f"segment:{campaign.get('id')}:{'|'.join(key)}",
+                    "subject_template": generated["subject"],
+                    "body_template": generated["body"],
+                }
+                for lead in members:
+                    lead_context = build_template_context(lead, campaign, custom_context)
+                    results[str(lead["id"])] = template_engine.render_template(template, lead_context)
+            except Exception as e:
+                logger.error(f"Failed to generate segment {key} ({len(members)} leads): {e}")
+
+        await asyncio.gather(*(generate_for_segment(key, members) for key, members in segments.items()))
+        logger.info(f"Segment generation covered {len(results)}/{len(leads)} leads.")
+        return results
+
+    @track_llm("followup")
+    async def generate_followup_email(self, context: Dict[str, Any]) -> Dict[str, str]:
         """
         Generates a follow-up email based on the initial outreach.
 
@@ -95,24 +286,29 @@ class LangChainAgent:
 
         Returns:
             A dictionary with "subject" and "body" keys.
+
+        Raises:
+            LLMGenerationError: If no usable email could be generated.
         """
         logger.info(f"Generating follow-up email for lead: {context.get('lead_name')}")
         try:
             prompt_template_str = self._load_prompt_template("followup_prompt.txt")
-            prompt = ChatPromptTemplate.from_template(
+            prompt = _chat_prompt(
                 template=prompt_template_str,
                 partial_variables={"format_instructions": self.parser.get_format_instructions()}
             )
 
-            chain = prompt | self.model | self.parser
-            response = chain.invoke(context)
+            response = await self._ainvoke("followup", prompt, context)
+            if not response.get("subject") or not response.get("body"):
+                raise ValueError("Response is missing 'subject' or 'body'.")
             
             logger.info("Successfully generated and parsed follow-up email.")
             return response
         except Exception as e:
             logger.error(f"Failed to generate follow-up email: {e}")
-            return {"subject": "Quick Follow-up", "body": "Just checking in on my previous email."}
+            raise LLMGenerationError(f"Failed to generate follow-up email: {e}") from e
 
+    @track_llm("eval")
     def evaluate_email_quality(self, email_text: str, goal: str) -> Dict[str, Any]:
         """
         Evaluates the quality of a given email against a specific goal.
@@ -127,16 +323,18 @@ class LangChainAgent:
         logger.info("Evaluating email quality...")
         try:
             prompt_template_str = self._load_prompt_template("eval_prompt.txt")
-            prompt = ChatPromptTemplate.from_template(
+            prompt = _chat_prompt(
                 template=prompt_template_str,
                 partial_variables={"format_instructions": self.parser.get_format_instructions()}
             )
 
-            chain = prompt | self.model | self.parser
-            response = chain.invoke({"email_text": email_text, "goal": goal})
+            inputs = {"email_text": email_text, "goal": goal}
+            call = lambda model: (prompt | self._model(model)).invoke(inputs)
+            message = call_with_retry(lambda: self.router.invoke_sync("eval", call), self.breaker, self.retry_policy)
+            response = self.parser.invoke(message)
             
             logger.info(f"Email evaluation complete. Score: {response.get('score')}")
             return response
         except Exception as e:
             logger.error(f"Failed to evaluate email quality: {e}")
-            return {"score": 0, "feedback": "Could not evaluate the email due to an error."}
\ No newline at end of file
+            raise LLMGenerationError(f"Failed to evaluate email quality: {e}") from e
\ No newline at end of file
@@ -0,0 +1,165 @@
+import logging
+import os
+from abc import ABC, abstractmethod
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class LeaderLease(ABC):
+    """
+    A lock that at most one process holds at a time.
+
+    `acquire` is non-blocking and is called periodically: it takes the lease
+    when it is free and renews it when already held, returning whether this
+    process is the leader afterwards.
+    """
+
+    def __init__(self):
+        self.holder_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    @abstractmethod
+    def acquire(self) -> bool:
+        """Takes or renews the lease; returns whether this process holds it."""
+
+    @abstractmethod
+    def release(self):
+        """Gives the lease up if this process holds it."""
+
+
+class NullLease(LeaderLease):
+    """Every process is the leader; for single-process deployments."""
+
+    def acquire(self) -> bool:
+        return True
+
+    def release(self):
+        pass
+
+
+class FileLease(LeaderLease):
+    """
+    An exclusive flock on a local file. The kernel releases it when the holding
+    process exits, so a crashed leader is replaced on the next acquire attempt.
+    Only coordinates processes on the same host.
+    """
+
+    def __init__(self, path: str = "scheduler.lock"):
+        super().__init__()
+        self.path = path
+        self._fd: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def acquire(self) -> bool:
+        import fcntl
+
+        with self._lock:
+            if self._fd is not None:
+                return True
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                os.close(fd)
+                return False
+            os.ftruncate(fd, 0)
+            os.write(fd, self.holder_id.encode())
+            self._fd = fd
+            return True
+
+    def release(self):
+        import fcntl
+
+        with self._lock:
+            if self._fd is None:
+                return
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+
+
+class SQLiteLease(LeaderLease):
+    """
+    A time-limited lease row in a SQLite database. The holder renews it before
+    `ttl` seconds pass; once it expires any other process may take it over.
+    """
+
+    def __init__(self, db_path: str = "scheduler_lease.db", name: str = "scheduler", ttl: float = 60):
+        super().__init__()
+        self.db_path = db_path
+        self.name = name
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS leases ("
+                "name TEXT PRIMARY KEY, holder TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # A connection's own context manager only commits; it must be closed explicitly
+        conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def acquire(self) -> bool:
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    "INSERT INTO leases (name, holder, expires_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT(name) DO UPDATE SET holder = excluded.holder, expires_at = excluded.expires_at "
+                    "WHERE leases.holder = excluded.holder OR leases.expires_at < ?",
+                    (self.name, self.holder_id, now + self.ttl, now)
+                )
+                holder = conn.execute("SELECT holder FROM leases WHERE name = ?", (self.name,)).fetchone()[0]
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return holder == self.holder_id
+
+    def release(self):
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM leases WHERE name = ? AND holder = ?", (self.name, self.holder_id))
+
+
+def create_lease_from_env(shared_jobstore: bool = False) -> LeaderLease:
+    """
+    Builds the scheduler's leader lease from SCHEDULER_LEADER_LOCK:
+    'file' (SCHEDULER_LOCK_FILE), 'sqlite' (SCHEDULER_LEASE_DB,
+    SCHEDULER_LEASE_TTL) or 'none' to make every process a leader.
+
+    A lease is only safe with a job store shared between workers: a follower
+    is paused, so jobs it keeps in its own memory would never run. The default
+    is therefore 'file' with a shared job store and 'none' without one, and an
+    explicit lease without a shared job store is refused.
+    """
+    kind = os.getenv("SCHEDULER_LEADER_LOCK", "file" if shared_jobstore else "none").lower()
+    if kind == "none":
+        return NullLease()
+    if not shared_jobstore:
+        raise ValueError(
+            f"SCHEDULER_LEADER_LOCK '{kind}' requires SCHEDULER_JOBSTORE_URL: jobs scheduled by a "
+            "paused follower would otherwise stay in its memory and never run."
+        )
+    if kind == "file":
+        return FileLease(os.getenv("SCHEDULER_LOCK_FILE", "scheduler.lock"))
+    if kind == "sqlite":
+        return SQLiteLease(
+            db_path=os.getenv("SCHEDULER_LEASE_DB", "scheduler_lease.db"),
+            ttl=float(os.getenv("SCHEDULER_LEASE_TTL", "60")),
+        )
+    raise ValueError(f"Unknown SCHEDULER_LEADER_LOCK '{kind}'. Use 'file', 'sqlite' or 'none'.")
@@ -0,0 +1,217 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, TypeVar
+
+from services.metrics import LLM_HEDGES, LLM_MODEL_LATENCY, LLM_TOKENS
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+DEFAULT_MODEL = "gemini-1.5-flash"
+# Generation tasks, as labelled in the LLM metrics
+LLM_TASKS = ("cold_email", "followup", "segment", "eval")
+
+
+class LatencyWindow:
+    """The most recent `size` latencies of one model, for quantile estimates."""
+
+    def __init__(self, size: int = 500):
+        self._samples: Deque[float] = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def quantile(self, q: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+class LLMRouter:
+    """
+    Picks the model for each generation task, optionally hedges slow calls,
+    and keeps per-model latency and token counts to inform both.
+
+    Routes map a task ('cold_email', 'followup', 'segment', 'eval') to a model
+    name; tasks without a route use `default_model`. With hedging enabled, a
+    call still running after the model's recent `hedge_quantile` latency gets a
+    duplicate request and the first response wins. That fires on roughly
+    (1 - hedge_quantile) of calls, and `hedge_max_rate` caps it regardless, so
+    the tail shortens for a few percent more tokens.
+    """
+
+    def __init__(self, default_model: str = DEFAULT_MODEL, routes: Optional[Dict[str, str]] = None,
+                 hedge_enabled: bool = False, hedge_quantile: float = 0.95, hedge_min_samples: int = 20,
+                 hedge_max_rate: float = 0.1, window: int = 500):
+        """
+        Args:
+            default_model: Model for tasks without a route.
+            routes: Model per task.
+            hedge_enabled: Whether slow calls get a hedged duplicate.
+            hedge_quantile: Latency quantile of the model after which the hedge fires.
+            hedge_min_samples: Calls a model needs before its quantile is trusted; no hedging until then.
+            hedge_max_rate: Maximum fraction of calls that may be hedged.
+            window: Recent calls per model kept for the quantile.
+        """
+        self.default_model = default_model
+        self.routes = dict(routes or {})
+        self.hedge_enabled = hedge_enabled
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_max_rate = hedge_max_rate
+        self.window = window
+        self._latencies: Dict[str, LatencyWindow] = {}
+        self._counts: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "LLMRouter":
+        """
+        Reads LLM_MODEL (default model), LLM_MODEL_<TASK> (e.g. LLM_MODEL_FOLLOWUP),
+        LLM_HEDGE_ENABLED (default false), LLM_HEDGE_QUANTILE (0.95),
+        LLM_HEDGE_MIN_SAMPLES (20) and LLM_HEDGE_MAX_RATE (0.1).
+        """
+        routes = {task: os.getenv(f"LLM_MODEL_{task.upper()}") for task in LLM_TASKS}
+        return cls(
+            default_model=os.getenv("LLM_MODEL", DEFAULT_MODEL),
+            routes={task: model for task, model in routes.items() if model},
+            hedge_enabled=os.getenv("LLM_HEDGE_ENABLED", "false").lower() == "true",
+            hedge_quantile=float(os.getenv("LLM_HEDGE_QUANTILE", "0.95")),
+            hedge_min_samples=int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20")),
+            hedge_max_rate=float(os.getenv("LLM_HEDGE_MAX_RATE", "0.1")),
+        )
+
+    def model_for(self, task: str) -> str:
+        return self.routes.get(task, self.default_model)
+
+    def _stats_of(self, model: str) -> Dict[str, int]:
+        with self._lock:
+            if model not in self._latencies:
+                self._latencies[model] = LatencyWindow(self.window)
+                self._counts[model] = {"calls": 0, "hedged": 0, "hedge_wins": 0, "input_tokens": 0, "output_tokens": 0}
+            return self._counts[model]
+
+    def hedge_delay(self, model: str) -> Optional[float]:
+        """Seconds after which a call to `model` is hedged, or None to not hedge it."""
+        if not self.hedge_enabled:
+            return None
+        counts = self._stats_of(model)
+        latencies = self._latencies[model]
+        if len(latencies) < self.hedge_min_samples:
+            return None
+        if counts["hedged"] >= self.hedge_max_rate * max(counts["calls"], 1):
+            return None
+        return latencies.quantile(self.hedge_quantile)
+
+    def observe(self, model: str, task: str, seconds: float, result: Any = None):
+        """Records a completed call's latency and, from a chat message's usage_metadata, its tokens."""
+        counts = self._stats_of(model)
+        self._latencies[model].add(seconds)
+        LLM_MODEL_LATENCY.labels(model=model, task=task).observe(seconds)
+        usage = getattr(result, "usage_metadata", None) or {}
+        with self._lock:
+            counts["input_tokens"] += usage.get("input_tokens", 0)
+            counts["output_tokens"] += usage.get("output_tokens", 0)
+        for direction in ("input", "output"):
+            if usage.get(f"{direction}_tokens"):
+                LLM_TOKENS.labels(model=model, task=task, direction=direction).inc(usage[f"{direction}_tokens"])
+
+    async def _timed(self, model: str, task: str, call: Callable[[str], Awaitable[T]]) -> T:
+        started = time.perf_counter()
+        try:
+            result = await call(model)
+        except asyncio.CancelledError:
+            # The losing call of a hedge: it took at least this long, which keeps the tail estimate honest
+            self._latencies[model].add(time.perf_counter() - started)
+            raise
+        self.observe(model, task, time.perf_counter() - started, result)
+        return result
+
+    async def invoke(self, task: str, call: Callable[[str], Awaitable[T]]) -> T:
+        """
+        Runs `call(model)` with the task's model, hedging it when it is slower
+        than usual. Raises the last error only if every request failed.
+        """
+        model = self.model_for(task)
+        counts = self._stats_of(model)
+        with self._lock:
+            counts["calls"] += 1
+        delay = self.hedge_delay(model)
+        first = asyncio.ensure_future(self._timed(model, task, call))
+        if delay is None:
+            return await first
+
+        done, _ = await asyncio.wait({first}, timeout=delay)
+        if done:
+            return first.result()
+
+        with self._lock:
+            counts["hedged"] += 1
+        LLM_HEDGES.labels(model=model, outcome="fired").inc()
+        logger.info(f"Hedging {task} call to {model} after {delay:.2f}s")
+        second = asyncio.ensure_future(self._timed(model, task, call))
+        pending, error = {first, second}, None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for finished in done:
+                    if finished.exception() is None:
+                        if finished is second:
+                            with self._lock:
+                                counts["hedge_wins"] += 1
+                            LLM_HEDGES.labels(model=model, outcome="won").inc()
+                        return finished.result()
+                    error = finished.exception()
+            raise error
+        finally:
+            for unfinished in pending:
+                unfinished.cancel()
+
+    def invoke_sync(self, task: str, call: Callable[[str], T]) -> T:
+        """Runs `call(model)` with the task's model, without hedging, and records it."""
+        model = self.model_for(task)
+        counts = self._stats_of(model)
+        with self._lock:
+            counts["calls"] += 1
+        started = time.perf_counter()
+        result = call(model)
+        self.observe(model, task, time.perf_counter() - started, result)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        """Routes, hedging settings and, per model, call counts, latency quantiles and tokens."""
+        models = {}
+        for model in list(self._counts):
+            latencies = self._latencies[model]
+            models[model] = {
+                **self._counts[model],
+                "p50_seconds": latencies.quantile(0.5),
+                "p95_seconds": latencies.quantile(0.95),
+                "p99_seconds": latencies.quantile(0.99),
+                "hedge_delay_seconds": self.hedge_delay(model),
+            }
+        return {
+            "default_model": self.default_model,
+            "routes": {task: self.model_for(task) for task in LLM_TASKS},
+            "hedging": {
+                "enabled": self.hedge_enabled,
+                "quantile": self.hedge_quantile,
+                "min_samples": self.hedge_min_samples,
+                "max_rate": self.hedge_max_rate,
+            },
+            "models": models,
+        }
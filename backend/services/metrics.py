@@ -0,0 +1,168 @@
+import functools
+import inspect
+import logging
+import time
+from datetime import datetime
+from typing import Any, Callable
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+from services.request_timing import record_stage
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Buckets sized for remote calls: LLM generations take seconds, DB queries tens of milliseconds
+LLM_BUCKETS = (0.25, 0.5, 1, 2, 3, 5, 8, 13, 21, 34, 60)
+REMOTE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+LAG_BUCKETS = (0.1, 0.5, 1, 5, 15, 30, 60, 300, 900, 3600)
+BATCH_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+
+LLM_LATENCY = Histogram(
+    "coldemail_llm_generation_seconds", "LLM generation latency", ["prompt"], buckets=LLM_BUCKETS
+)
+LLM_FAILURES = Counter(
+    "coldemail_llm_generation_failures_total", "LLM generations that raised an error", ["prompt"]
+)
+GMAIL_LATENCY = Histogram(
+    "coldemail_gmail_request_seconds", "Gmail API request latency", ["operation"], buckets=REMOTE_BUCKETS
+)
+GMAIL_ERRORS = Counter(
+    "coldemail_gmail_errors_total", "Gmail API errors by HTTP status", ["operation", "status"]
+)
+GMAIL_RATE_LIMITED = Counter(
+    "coldemail_gmail_rate_limited_total", "Gmail API responses with status 429", ["operation"]
+)
+BATCH_SIZE = Histogram(
+    "coldemail_batch_size", "Items per batch operation", ["operation"], buckets=BATCH_BUCKETS
+)
+DB_LATENCY = Histogram(
+    "coldemail_supabase_query_seconds", "Supabase query latency", ["method"], buckets=REMOTE_BUCKETS
+)
+DB_FAILURES = Counter(
+    "coldemail_supabase_query_failures_total", "Supabase queries that raised an error", ["method"]
+)
+SCHEDULER_LAG = Histogram(
+    "coldemail_scheduler_job_lag_seconds", "Actual job start minus scheduled run time", ["job"], buckets=LAG_BUCKETS
+)
+BULK_QUEUE_DEPTH = Gauge(
+    "coldemail_bulk_queue_depth", "Leads waiting to be processed by in-flight bulk jobs"
+)
+REPLIES_CLASSIFIED = Counter(
+    "coldemail_replies_classified_total", "Inbound bounces and auto-replies matched to a lead", ["kind"]
+)
+SENDS_AVOIDED = Counter(
+    "coldemail_sends_avoided_total", "Queued sends and follow-ups cancelled before they went out", ["reason"]
+)
+DEPENDENCY_RETRIES = Counter(
+    "coldemail_dependency_retries_total", "Calls to Gemini or Gmail retried after a transient error", ["dependency"]
+)
+CIRCUIT_STATE = Gauge(
+    "coldemail_circuit_state", "Circuit breaker state per dependency: 0 closed, 1 half-open, 2 open", ["dependency"]
+)
+LLM_MODEL_LATENCY = Histogram(
+    "coldemail_llm_model_call_seconds", "Latency of single LLM calls per model and task", ["model", "task"],
+    buckets=LLM_BUCKETS
+)
+LLM_TOKENS = Counter(
+    "coldemail_llm_tokens_total", "LLM tokens used per model and task", ["model", "task", "direction"]
+)
+LLM_HEDGES = Counter(
+    "coldemail_llm_hedged_requests_total", "Hedged LLM requests fired, and those that beat the original", ["model", "outcome"]
+)
+LOG_BUFFER_FLUSH_LATENCY = Histogram(
+    "coldemail_email_log_flush_seconds", "Email log write-behind flush latency", buckets=REMOTE_BUCKETS
+)
+
+
+def _timed(histogram: Histogram, failures: Counter = None, on_error: Callable[[Exception], None] = None,
+           stage: str = None):
+    """
+    Builds a decorator that observes call latency, for both sync and async functions.
+    When a stage is given the latency is also added to the current request's Server-Timing.
+    """
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                except Exception as e:
+                    if failures is not None:
+                        failures.inc()
+                    if on_error is not None:
+                        on_error(e)
+                    raise
+                finally:
+                    elapsed = time.perf_counter() - started
+                    histogram.observe(elapsed)
+                    if stage:
+                        record_stage(stage, elapsed)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                if failures is not None:
+                    failures.inc()
+                if on_error is not None:
+                    on_error(e)
+                raise
+            finally:
+                elapsed = time.perf_counter() - started
+                histogram.observe(elapsed)
+                if stage:
+                    record_stage(stage, elapsed)
+        return wrapper
+    return decorator
+
+
+def track_db_query(func):
+    """Records latency and failures of a SupabaseClient method, labelled by method name."""
+    method = func.__name__
+    return _timed(DB_LATENCY.labels(method=method), DB_FAILURES.labels(method=method), stage="db")(func)
+
+
+def track_llm(prompt: str):
+    """Records latency of an LLM generation, labelled by prompt."""
+    return _timed(LLM_LATENCY.labels(prompt=prompt), LLM_FAILURES.labels(prompt=prompt), stage="llm")
+
+
+def http_status_of(error: Exception) -> Any:
+    """Returns the HTTP status of a googleapiclient or requests HTTPError, or None."""
+    resp = getattr(error, "resp", None)
+    response = getattr(error, "response", None)
+    status = (getattr(resp, "status", None) or getattr(error, "status_code", None)
+              or getattr(response, "status_code", None))
+    return int(status) if status else None
+
+
+def track_gmail(operation: str):
+    """Records latency, errors and 429s of a GmailAPI call."""
+    def on_error(error: Exception):
+        cause = error.__cause__ or error.__context__ or error
+        status = http_status_of(cause) or http_status_of(error)
+        GMAIL_ERRORS.labels(operation=operation, status=str(status or "unknown")).inc()
+        if status == 429:
+            GMAIL_RATE_LIMITED.labels(operation=operation).inc()
+    return _timed(GMAIL_LATENCY.labels(operation=operation), on_error=on_error, stage="gmail")
+
+
+def record_batch_size(operation: str, size: int):
+    BATCH_SIZE.labels(operation=operation).observe(size)
+
+
+def record_scheduler_lag(job: str, scheduled_run_time: datetime):
+    """Observes how late a job started compared to its scheduled run time."""
+    now = datetime.now(scheduled_run_time.tzinfo)
+    SCHEDULER_LAG.labels(job=job).observe(max((now - scheduled_run_time).total_seconds(), 0.0))
+
+
+def render_latest() -> tuple:
+    """Returns the exposition payload and its content type."""
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,139 @@
+import base64
+import logging
+import os
+import threading
+from collections import OrderedDict
+from email import encoders
+from email.mime.base import MIMEBase
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from pathlib import Path
+from typing import List, Optional, Tuple, Union
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class AttachmentCache:
+    """
+    Size-bounded LRU cache of serialized, base64-encoded attachment parts.
+
+    Entries are keyed by resolved path, modification time and size, so an
+    attachment that changes on disk is re-read on its next use.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple[str, int, int], bytes]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_part(self, path: Path) -> bytes:
+        """Returns the serialized MIME part for a file, building it only on a cache miss."""
+        stat = path.stat()
+        key = (str(path.resolve()), stat.st_mtime_ns, stat.st_size)
+
+        with self._lock:
+            part_bytes = self._entries.get(key)
+            if part_bytes is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return part_bytes
+            self.misses += 1
+
+        part = MIMEBase("application", "octet-stream")
+        part.set_payload(path.read_bytes())
+        encoders.encode_base64(part)
+        part.add_header("Content-Disposition", f"attachment; filename={path.name}")
+        part_bytes = part.as_bytes()
+
+        if len(part_bytes) <= self.max_bytes:
+            with self._lock:
+                if key not in self._entries:
+                    self._entries[key] = part_bytes
+                    self._size += len(part_bytes)
+                while self._size > self.max_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self._size -= len(evicted)
+        return part_bytes
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+class MimeMessageBuilder:
+    """
+    Builds outgoing messages for the Gmail API.
+
+    Messages without attachments are emitted as a single text part. Messages
+    with attachments are flattened without them and the cached, already
+    serialized attachment parts are spliced in before the closing boundary,
+    so large payloads never go through the line-by-line email generator.
+    """
+
+    def __init__(self, attachment_cache: Optional[AttachmentCache] = None):
+        self.attachment_cache = attachment_cache or AttachmentCache()
+
+    @classmethod
+    def from_env(cls) -> "MimeMessageBuilder":
+        """Builds a builder whose cache size comes from GMAIL_ATTACHMENT_CACHE_MB (default 64)."""
+        max_mb = float(os.getenv("GMAIL_ATTACHMENT_CACHE_MB", "64"))
+        return cls(AttachmentCache(max_bytes=int(max_mb * 1024 * 1024)))
+
+    def build(self, to: Union[str, List[str]], subject: str, body: str,
+              body_type: str = 'plain', cc: str = None, bcc: str = None,
+              attachment_paths: List[Union[str, Path]] = None) -> bytes:
+        """Builds the message and returns its RFC 822 bytes"""
+        if body_type.lower() not in ['plain', 'html']:
+            raise ValueError("body_type must be either 'plain' or 'html'")
+
+        parts = []
+        for attachment_path in attachment_paths or []:
+            attachment_path = Path(attachment_path)
+            if not attachment_path.exists():
+                raise FileNotFoundError(f"Attachment not found: {attachment_path}")
+            parts.append(self.attachment_cache.get_part(attachment_path))
+
+        text_part = MIMEText(body, body_type.lower())
+        if parts:
+            message = MIMEMultipart()
+            message.attach(text_part)
+        else:
+            message = text_part
+
+        # Handle multiple recipients
+        message['To'] = ', '.join(to) if isinstance(to, list) else to
+        message['Subject'] = subject
+        if cc:
+            message['Cc'] = cc
+        if bcc:
+            message['Bcc'] = bcc
+
+        if not parts:
+            return message.as_bytes()
+
+        flattened = message.as_bytes()
+        boundary = message.get_boundary().encode('ascii')
+        closing = b'\n--' + boundary + b'--\n'
+        head = flattened[:flattened.rindex(closing)]
+        separator = b'\n--' + boundary + b'\n'
+        return head + separator + separator.join(parts) + closing
+
+    def build_raw(self, *args, **kwargs) -> str:
+        """Builds the message and returns it as the urlsafe base64 'raw' string the API expects"""
+        return base64.urlsafe_b64encode(self.build(*args, **kwargs)).decode('utf-8')
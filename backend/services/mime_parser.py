@@ -0,0 +1,118 @@
+import base64
+import binascii
+import codecs
+import logging
+from email.message import Message
+from typing import Any, Callable, Dict, Iterator, Optional
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BODY_PLACEHOLDER = '<Text body not available>'
+
+
+def _header(part: Dict[str, Any], name: str) -> str:
+    name = name.lower()
+    for header in part.get('headers') or []:
+        if header.get('name', '').lower() == name:
+            return header.get('value', '')
+    return ''
+
+
+def is_attachment(part: Dict[str, Any]) -> bool:
+    """A part that carries a file rather than message text."""
+    if part.get('filename'):
+        return True
+    return _header(part, 'Content-Disposition').strip().lower().startswith('attachment')
+
+
+def iter_parts(payload: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """Yields every part of a Gmail message payload, depth first and in document order."""
+    stack = [payload]
+    while stack:
+        part = stack.pop()
+        yield part
+        stack.extend(reversed(part.get('parts') or []))
+
+
+def has_attachments(payload: Dict[str, Any]) -> bool:
+    """Whether any part of the payload, at any depth, is an attachment."""
+    return any(is_attachment(part) for part in iter_parts(payload))
+
+
+def find_body_part(payload: Dict[str, Any], prefer: str = 'text/plain') -> Optional[Dict[str, Any]]:
+    """
+    Chooses the part that holds the message text, at any nesting depth
+    (e.g. Outlook's multipart/mixed > multipart/related > multipart/alternative).
+
+    Attachments, including forwarded text files and message/rfc822 parts, are
+    skipped. The first inline text/plain or text/html part is taken, whichever
+    matches `prefer`, falling back to the other type. Nothing is decoded here.
+    """
+    fallback = None
+    stack = [payload]
+    while stack:
+        part = stack.pop()
+        mime_type = (part.get('mimeType') or '').lower()
+        if mime_type == 'message/rfc822' or (part is not payload and is_attachment(part)):
+            continue
+        if mime_type.startswith('multipart/'):
+            stack.extend(reversed(part.get('parts') or []))
+            continue
+        body = part.get('body') or {}
+        if mime_type not in ('text/plain', 'text/html') or not (body.get('data') or body.get('attachmentId')):
+            continue
+        if mime_type == prefer:
+            return part
+        if fallback is None:
+            fallback = part
+    return fallback
+
+
+def part_charset(part: Dict[str, Any], default: str = 'utf-8') -> str:
+    """The charset declared in a part's Content-Type header, if Python knows it."""
+    content_type = _header(part, 'Content-Type')
+    if not content_type:
+        return default
+    message = Message()
+    message['Content-Type'] = content_type
+    charset = message.get_content_charset()
+    if not charset:
+        return default
+    try:
+        return codecs.lookup(charset).name
+    except LookupError:
+        logger.warning(f"Unknown charset '{charset}', decoding as {default}")
+        return default
+
+
+def decode_data(data: str, charset: str = 'utf-8') -> str:
+    """Decodes Gmail's base64url body data into text; undecodable bytes are replaced."""
+    raw = base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+    return raw.decode(charset, errors='replace')
+
+
+def extract_body(payload: Dict[str, Any], prefer: str = 'text/plain',
+                 fetch_attachment: Optional[Callable[[str], str]] = None) -> str:
+    """
+    Returns the text of the best body part of a `format='full'` payload,
+    decoding only that part in its declared charset.
+
+    Gmail moves large bodies out of the payload and leaves an attachmentId;
+    `fetch_attachment(attachment_id)` returns the base64url data for those.
+    """
+    part = find_body_part(payload, prefer)
+    if part is None:
+        return BODY_PLACEHOLDER
+    body = part.get('body') or {}
+    try:
+        data = body.get('data')
+        if data is None:
+            if fetch_attachment is None:
+                return BODY_PLACEHOLDER
+            data = fetch_attachment(body['attachmentId'])
+        return decode_data(data, part_charset(part))
+    except (binascii.Error, ValueError) as e:
+        logger.warning(f"Failed to decode email body: {e}")
+        return BODY_PLACEHOLDER
@@ -0,0 +1,204 @@
+import logging
+import os
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from services.metrics import SENDS_AVOIDED
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Outbox entry statuses: claimed by a sender, queued into a send slot, delivered to Gmail,
+# or free to be claimed again
+OUTBOX_PENDING = "pending"
+OUTBOX_SCHEDULED = "scheduled"
+OUTBOX_SENT = "sent"
+OUTBOX_FAILED = "failed"
+
+
+def idempotency_key(lead_id: Any, campaign_id: Any, step: str, variant: Optional[str] = None,
+                    scope: Optional[str] = None) -> str:
+    """
+    The key under which at most one email is sent: one per lead, campaign, step and content
+    variant. A `scope` (e.g. a launch ID) sets apart sends meant to go out again, such as a
+    relaunch to leads that were already contacted, from retries of an earlier send.
+    """
+    key = f"{lead_id}:{campaign_id}:{step}:{variant or 'generated'}"
+    return f"{key}:{scope}" if scope else key
+
+
+@dataclass
+class OutboxClaim:
+    """The outcome of claiming a send. `token` is set only when this caller may send."""
+    key: str
+    entry: Dict[str, Any]
+    token: Optional[str] = None
+
+    @property
+    def claimed(self) -> bool:
+        return self.token is not None
+
+    @property
+    def sent(self) -> bool:
+        return self.entry.get("status") == OUTBOX_SENT
+
+    def columns(self) -> Dict[str, Any]:
+        """Email log columns that record the claim a queued email is sent under."""
+        return {"outbox_key": self.key, "outbox_claim_token": self.token}
+
+    @classmethod
+    def from_email_log(cls, email_log: Dict[str, Any]) -> Optional["OutboxClaim"]:
+        """The claim recorded on an email log row by `columns`, or None."""
+        if not email_log.get("outbox_key") or not email_log.get("outbox_claim_token"):
+            return None
+        return cls(key=email_log["outbox_key"], entry={}, token=email_log["outbox_claim_token"])
+
+
+class Outbox:
+    """
+    Makes sends idempotent across retries of requests and scheduler jobs.
+
+    Before generating and sending an email, a sender claims the outbox entry
+    for its idempotency key. The claim is a single conditional write, so of
+    any number of concurrent attempts exactly one gets it; the others see the
+    entry as in progress or, once it is marked sent, as done and skip the send.
+    Bulk sends claim a page of leads in one call. A claim that failed is
+    released for the next retry, one whose sender died is taken over after
+    `claim_ttl` seconds, and one queued into a send slot is kept until the
+    scheduled send completes or releases it.
+    """
+
+    def __init__(self, db_client, claim_ttl: float = 600):
+        """
+        Args:
+            db_client: An instance of SupabaseClient, or a BufferedSupabaseClient to write
+                       completions and releases behind with the email logs of a bulk run.
+            claim_ttl: Seconds after which a pending claim is considered abandoned. It must
+                       exceed the longest generate-and-send, or a slow send may be repeated.
+        """
+        self.db = db_client
+        self.claim_ttl = claim_ttl
+
+    @classmethod
+    def from_env(cls, db_client) -> "Outbox":
+        """An outbox whose claims expire after OUTBOX_CLAIM_TTL_SECONDS (default 600)."""
+        return cls(db_client, claim_ttl=float(os.getenv("OUTBOX_CLAIM_TTL_SECONDS", "600")))
+
+    def bind(self, db_client) -> "Outbox":
+        """The same outbox writing through another client, e.g. a bulk run's BufferedSupabaseClient."""
+        return Outbox(db_client, claim_ttl=self.claim_ttl)
+
+    def claim(self, lead_id: Any, campaign_id: Any, step: str, variant: Optional[str] = None,
+              scope: Optional[str] = None) -> OutboxClaim:
+        """
+        Claims the right to send the email identified by lead, campaign, step and variant.
+        Check `claimed` on the result: when False the email was already sent (`sent`)
+        or another attempt is sending it right now, and the caller must not send.
+        """
+        return self.claim_many([lead_id], campaign_id, step, variant, scope)[str(lead_id)]
+
+    def claim_many(self, lead_ids: List[Any], campaign_id: Any, step: str, variant: Optional[str] = None,
+                   scope: Optional[str] = None) -> Dict[str, OutboxClaim]:
+        """
+        Claims the sends of several leads with one conditional write (and one read of
+        the entries it could not claim). Returns the claims keyed by str(lead_id).
+        """
+        now = datetime.now(timezone.utc)
+        token = uuid.uuid4().hex
+        entries = {
+            str(lead_id): {
+                "idempotency_key": idempotency_key(lead_id, campaign_id, step, variant, scope),
+                "lead_id": lead_id,
+                "campaign_id": campaign_id,
+                "step": step,
+                "variant": variant or "generated",
+                "status": OUTBOX_PENDING,
+                "claim_token": token,
+                "claimed_at": now.isoformat(),
+            }
+            for lead_id in lead_ids
+        }
+        if not entries:
+            return {}
+        stale_before = (now - timedelta(seconds=self.claim_ttl)).isoformat()
+        claimed = {
+            row["idempotency_key"]: row for row in self.db.claim_outbox_entries(list(entries.values()), stale_before)
+        }
+        missed = [entry["idempotency_key"] for entry in entries.values() if entry["idempotency_key"] not in claimed]
+        existing = {row["idempotency_key"]: row for row in self.db.get_outbox_entries(missed)} if missed else {}
+
+        claims = {}
+        for lead_id, entry in entries.items():
+            key = entry["idempotency_key"]
+            if key in claimed:
+                claims[lead_id] = OutboxClaim(key=key, entry=claimed[key], token=token)
+                continue
+            found = existing.get(key, {})
+            SENDS_AVOIDED.labels(reason="duplicate").inc()
+            logger.info(f"Skipping send {key}: already {found.get('status', OUTBOX_PENDING)}.")
+            claims[lead_id] = OutboxClaim(key=key, entry=found)
+        return claims
+
+    def renew(self, claims: Dict[str, OutboxClaim]) -> Dict[str, OutboxClaim]:
+        """
+        Restarts the TTL of claims held for a while before use, e.g. through a pause
+        for an open circuit. A claim that expired and was taken over in the meantime
+        comes back without its token, so the caller skips that send.
+        """
+        now = datetime.now(timezone.utc).isoformat()
+        tokens = {claim.token for claim in claims.values() if claim.claimed}
+        renewed = set()
+        for token in tokens:
+            keys = [claim.key for claim in claims.values() if claim.token == token]
+            renewed.update(row["idempotency_key"] for row in self.db.renew_outbox_entries(keys, token, now))
+        result = {}
+        for lead_id, claim in claims.items():
+            if claim.claimed and claim.key not in renewed:
+                logger.warning(f"Claim on send {claim.key} expired and was taken over; skipping it.")
+                claim = OutboxClaim(key=claim.key, entry={"status": OUTBOX_PENDING})
+            result[lead_id] = claim
+        return result
+
+    def _update(self, claim: OutboxClaim, update: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        return self.db.update_outbox_entry(claim.key, claim.token, update)
+
+    def complete(self, claim: OutboxClaim, email_log_id: Any = None, gmail_message_id: Optional[str] = None,
+                 gmail_thread_id: Optional[str] = None, subject: Optional[str] = None):
+        """
+        Marks a claimed send as delivered, so retries short-circuit. Called after
+        Gmail accepted the email, so a failure here is logged rather than raised.
+        """
+        update = {
+            "status": OUTBOX_SENT,
+            "sent_at": datetime.now(timezone.utc).isoformat(),
+            "email_log_id": str(email_log_id) if email_log_id is not None else None,
+            "gmail_message_id": gmail_message_id,
+            "gmail_thread_id": gmail_thread_id,
+            "subject": subject,
+            "error_message": None,
+        }
+        try:
+            if self._update(claim, update) is None:
+                logger.warning(f"Claim on send {claim.key} expired before it completed; it may be sent again.")
+        except Exception as e:
+            logger.error(f"Failed to mark send {claim.key} as sent: {e}")
+
+    def schedule(self, claim: OutboxClaim, email_log_id: Any):
+        """
+        Marks a claimed send as queued into a send slot. Scheduled entries do not
+        expire, since the slot may be days away; the scheduled send completes or releases them.
+        """
+        try:
+            self._update(claim, {"status": OUTBOX_SCHEDULED, "email_log_id": str(email_log_id)})
+        except Exception as e:
+            logger.error(f"Failed to mark send {claim.key} as scheduled; it can be retried in {self.claim_ttl:.0f}s: {e}")
+
+    def release(self, claim: OutboxClaim, error: str):
+        """Gives up a claim whose send failed, so that the next retry may claim it."""
+        try:
+            self._update(claim, {"status": OUTBOX_FAILED, "error_message": error})
+        except Exception as e:
+            logger.error(f"Failed to release send {claim.key}; it can be retried in {self.claim_ttl:.0f}s: {e}")
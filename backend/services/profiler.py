@@ -0,0 +1,190 @@
+import cProfile
+import functools
+import inspect
+import io
+import logging
+import os
+import pstats
+import random
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+PROFILE_SUFFIX = ".prof"
+_SAFE_NAME = re.compile(r"^[A-Za-z0-9_.-]+\.prof$")
+
+
+class ProfilerError(Exception):
+    """Custom exception for profile storage errors."""
+    pass
+
+
+class Profiler:
+    """
+    Opt-in cProfile sampling for hot endpoints and background jobs.
+
+    Functions decorated with `profile(name)` are profiled for a random
+    `sample_rate` fraction of calls while profiling is enabled. Each captured
+    profile is written to `directory` as a pstats dump, and the oldest files
+    are pruned once `max_files` or `max_total_mb` is exceeded.
+
+    cProfile follows the calling thread, so for async functions the profile
+    also contains whatever else the event loop ran while the call was awaiting.
+    """
+
+    def __init__(self, enabled: bool = False, sample_rate: float = 0.1, directory: str = "profiles",
+                 max_files: int = 50, max_total_mb: float = 200, min_duration_ms: float = 0):
+        """
+        Args:
+            enabled: Whether any profiling happens at all.
+            sample_rate: Fraction of calls (0-1) that are profiled.
+            directory: Where profile files are stored.
+            max_files: Maximum number of profile files kept.
+            max_total_mb: Maximum total size of kept profile files.
+            min_duration_ms: Profiles of calls faster than this are discarded.
+        """
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.directory = Path(directory)
+        self.max_files = max_files
+        self.max_total_bytes = int(max_total_mb * 1024 * 1024)
+        self.min_duration_ms = min_duration_ms
+        self._active = threading.local()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "Profiler":
+        """Builds a profiler from the PROFILING_* environment variables (disabled by default)."""
+        return cls(
+            enabled=os.getenv("PROFILING_ENABLED", "false").lower() == "true",
+            sample_rate=float(os.getenv("PROFILING_SAMPLE_RATE", "0.1")),
+            directory=os.getenv("PROFILING_DIR", "profiles"),
+            max_files=int(os.getenv("PROFILING_MAX_FILES", "50")),
+            max_total_mb=float(os.getenv("PROFILING_MAX_TOTAL_MB", "200")),
+            min_duration_ms=float(os.getenv("PROFILING_MIN_DURATION_MS", "0")),
+        )
+
+    def _should_sample(self) -> bool:
+        # Only one cProfile may be active per thread, so nested targets are skipped
+        if not self.enabled or getattr(self._active, "profiling", False):
+            return False
+        return random.random() < self.sample_rate
+
+    def profile(self, name: str):
+        """Decorator that samples calls of a sync or async function into profile files."""
+        def decorator(func):
+            if inspect.iscoroutinefunction(func):
+                @functools.wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    if not self._should_sample():
+                        return await func(*args, **kwargs)
+                    profile, started = self._begin()
+                    try:
+                        return await func(*args, **kwargs)
+                    finally:
+                        self._end(name, profile, started)
+                return async_wrapper
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self._should_sample():
+                    return func(*args, **kwargs)
+                profile, started = self._begin()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self._end(name, profile, started)
+            return wrapper
+        return decorator
+
+    def _begin(self):
+        self._active.profiling = True
+        profile = cProfile.Profile()
+        started = time.perf_counter()
+        profile.enable()
+        return profile, started
+
+    def _end(self, name: str, profile: cProfile.Profile, started: float):
+        profile.disable()
+        self._active.profiling = False
+        duration_ms = (time.perf_counter() - started) * 1000
+        if duration_ms < self.min_duration_ms:
+            return
+        try:
+            self._save(name, profile, duration_ms)
+        except Exception as e:
+            # Profiling must never break the call it observes
+            logger.error(f"Failed to save profile for {name}: {e}")
+
+    def _save(self, name: str, profile: cProfile.Profile, duration_ms: float):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+        path = self.directory / f"{stamp}_{name}_{int(duration_ms)}ms{PROFILE_SUFFIX}"
+        profile.dump_stats(str(path))
+        logger.info(f"Saved profile {path.name} ({duration_ms:.0f} ms)")
+        self._prune()
+
+    def _prune(self):
+        """Deletes the oldest profiles beyond the file count and total size limits."""
+        with self._lock:
+            files = sorted(self.directory.glob(f"*{PROFILE_SUFFIX}"), key=lambda p: p.name, reverse=True)
+            total = 0
+            for index, path in enumerate(files):
+                try:
+                    total += path.stat().st_size
+                    if index >= self.max_files or total > self.max_total_bytes:
+                        path.unlink()
+                except FileNotFoundError:
+                    continue
+
+    def list_profiles(self) -> List[Dict[str, Any]]:
+        """Returns stored profiles, newest first."""
+        if not self.directory.exists():
+            return []
+        profiles = []
+        for path in sorted(self.directory.glob(f"*{PROFILE_SUFFIX}"), key=lambda p: p.name, reverse=True):
+            stamp, _, rest = path.stem.partition("_")
+            target, _, duration = rest.rpartition("_")
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            profiles.append({
+                "name": path.name,
+                "target": target,
+                "duration_ms": int(duration.rstrip("ms")) if duration.rstrip("ms").isdigit() else None,
+                "created_at": datetime.fromtimestamp(stat.st_mtime, timezone.utc).isoformat(),
+                "size_bytes": stat.st_size,
+            })
+        return profiles
+
+    def get_profile_path(self, name: str) -> Path:
+        """Resolves a stored profile by file name, refusing anything outside the profile directory."""
+        if not _SAFE_NAME.match(name):
+            raise ProfilerError(f"Invalid profile name: {name}")
+        path = self.directory / name
+        if not path.is_file():
+            raise ProfilerError(f"Profile {name} not found")
+        return path
+
+    def render_text(self, name: str, sort: str = "cumulative", limit: int = 50) -> str:
+        """Returns a pstats text report of a stored profile."""
+        path = self.get_profile_path(name)
+        output = io.StringIO()
+        try:
+            stats = pstats.Stats(str(path), stream=output)
+            stats.strip_dirs().sort_stats(sort).print_stats(limit)
+        except KeyError as e:
+            raise ProfilerError(f"Invalid sort key: {e}")
+        return output.getvalue()
+
+
+# Shared instance used by the decorators on routes and jobs
+profiler = Profiler.from_env()
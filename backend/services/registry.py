@@ -0,0 +1,95 @@
+import asyncio
+import logging
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+STARTING = "starting"
+READY = "ready"
+DISABLED = "disabled"
+FAILED = "failed"
+
+
+class ServiceNotReadyError(Exception):
+    """Raised when a service is requested before it has finished initializing."""
+    pass
+
+
+class ServiceRegistry:
+    """
+    Builds the application's shared services after startup instead of at import.
+
+    Each service is registered with a factory and the names of the services it
+    depends on. `warm_up` runs every factory in a worker thread as soon as its
+    dependencies are ready, so independent services (database, Gmail, LLM)
+    initialize concurrently and a blocking OAuth flow never stalls the event loop.
+    A factory returning None marks its service as disabled.
+    """
+
+    def __init__(self):
+        self._factories: Dict[str, Tuple[Callable[..., Any], Tuple[str, ...]]] = {}
+        self._instances: Dict[str, Any] = {}
+        self._status: Dict[str, Dict[str, Any]] = {}
+        self._done: Dict[str, asyncio.Event] = {}
+
+    def register(self, name: str, factory: Callable[..., Any], depends_on: Tuple[str, ...] = ()):
+        """Registers a factory; it is called with the instances of `depends_on` in order."""
+        self._factories[name] = (factory, tuple(depends_on))
+        self._status[name] = {"status": PENDING}
+
+    async def warm_up(self):
+        """Initializes all registered services, concurrently where dependencies allow."""
+        self._done = {name: asyncio.Event() for name in self._factories}
+        started = time.perf_counter()
+        await asyncio.gather(*(self._start(name) for name in self._factories))
+        logger.info(f"Service warm-up finished in {time.perf_counter() - started:.2f}s: {self.summary()}")
+
+    async def _start(self, name: str):
+        factory, depends_on = self._factories[name]
+        try:
+            for dependency in depends_on:
+                await self._done[dependency].wait()
+                if self._status[dependency]["status"] not in (READY, DISABLED):
+                    raise ServiceNotReadyError(f"dependency '{dependency}' is {self._status[dependency]['status']}")
+
+            self._status[name] = {"status": STARTING}
+            started = time.perf_counter()
+            instance = await asyncio.to_thread(factory, *(self._instances[d] for d in depends_on))
+            self._instances[name] = instance
+            self._status[name] = {
+                "status": READY if instance is not None else DISABLED,
+                "init_ms": round((time.perf_counter() - started) * 1000, 1),
+            }
+            logger.info(f"Service '{name}' {self._status[name]['status']} in {self._status[name]['init_ms']} ms")
+        except Exception as e:
+            logger.error(f"Failed to initialize service '{name}': {e}")
+            self._status[name] = {"status": FAILED, "error": str(e)}
+        finally:
+            self._done[name].set()
+
+    def get(self, name: str) -> Any:
+        """Returns a ready (or disabled, as None) service, or raises ServiceNotReadyError."""
+        status = self._status.get(name, {}).get("status")
+        if status == READY:
+            return self._instances[name]
+        if status == DISABLED:
+            return None
+        raise ServiceNotReadyError(f"Service '{name}' is not available (status: {status or 'unknown'})")
+
+    def get_if_ready(self, name: str) -> Optional[Any]:
+        """Returns the service when it is ready, otherwise None."""
+        return self._instances.get(name) if self._status.get(name, {}).get("status") == READY else None
+
+    def is_ready(self) -> bool:
+        return all(s["status"] in (READY, DISABLED) for s in self._status.values())
+
+    def summary(self) -> Dict[str, str]:
+        return {name: s["status"] for name, s in self._status.items()}
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        """Per-service status, including init time or the initialization error."""
+        return {name: dict(s) for name, s in self._status.items()}
@@ -0,0 +1,161 @@
+import functools
+import inspect
+import logging
+import os
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Optional
+
+from fastapi.routing import APIRoute
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Stages reported in the Server-Timing header, in display order
+SERVICE_STAGES = ("db", "llm", "gmail")
+STAGES = SERVICE_STAGES + ("serialize", "app")
+STAGE_DESCRIPTIONS = {
+    "db": "Database",
+    "llm": "LLM generation",
+    "gmail": "Gmail API",
+    "serialize": "Request parsing, response validation and encoding",
+    "app": "Other application time",
+}
+
+
+class RequestTimings:
+    """Per-request accumulator of time spent in each stage."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+        self.endpoint_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float):
+        # Service calls may run on threadpool workers, so updates are locked
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+            self.counts[stage] = self.counts.get(stage, 0) + 1
+
+    def breakdown(self, total: float) -> Dict[str, float]:
+        """Returns milliseconds per stage, with unattributed time reported as 'app'."""
+        with self._lock:
+            stages = dict(self.stages)
+        accounted = sum(stages.values())
+        stages["app"] = max(total - accounted, 0.0)
+        return {stage: round(stages.get(stage, 0.0) * 1000, 2) for stage in STAGES if stage in stages}
+
+    def header(self, total: float) -> str:
+        parts = []
+        for stage, ms in self.breakdown(total).items():
+            desc = STAGE_DESCRIPTIONS[stage]
+            if stage in SERVICE_STAGES and self.counts.get(stage):
+                desc = f"{desc} ({self.counts[stage]} calls)"
+            parts.append(f'{stage};dur={ms};desc="{desc}"')
+        parts.append(f'total;dur={round(total * 1000, 2)}')
+        return ", ".join(parts)
+
+
+_current: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+
+def record_stage(stage: str, seconds: float):
+    """Adds time to a stage of the current request; a no-op outside a request."""
+    timings = _current.get()
+    if timings is not None:
+        timings.add(stage, seconds)
+
+
+def _timed_endpoint(endpoint: Callable) -> Callable:
+    """Wraps a route endpoint so its own run time is known to the route handler."""
+    if inspect.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def async_wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                timings = _current.get()
+                if timings is not None:
+                    timings.endpoint_seconds += time.perf_counter() - started
+        return async_wrapper
+
+    @functools.wraps(endpoint)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return endpoint(*args, **kwargs)
+        finally:
+            timings = _current.get()
+            if timings is not None:
+                timings.endpoint_seconds += time.perf_counter() - started
+    return wrapper
+
+
+class TimedRoute(APIRoute):
+    """
+    APIRoute that attributes the time FastAPI spends around the endpoint
+    (body parsing, response_model validation, JSON encoding) to 'serialize'.
+    """
+
+    def __init__(self, path: str, endpoint: Callable[..., Any], **kwargs):
+        super().__init__(path, _timed_endpoint(endpoint), **kwargs)
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+
+        async def timed_handler(request):
+            started = time.perf_counter()
+            response = await handler(request)
+            timings = _current.get()
+            if timings is not None:
+                # Service calls happen inside the endpoint, so they are already excluded here
+                overhead = time.perf_counter() - started - timings.endpoint_seconds
+                timings.add("serialize", max(overhead, 0.0))
+            return response
+
+        return timed_handler
+
+
+class ServerTimingMiddleware:
+    """
+    ASGI middleware that times every request, adds a Server-Timing header
+    with the per-stage breakdown and logs requests slower than a threshold.
+    """
+
+    def __init__(self, app, slow_request_ms: Optional[float] = None):
+        self.app = app
+        if slow_request_ms is None:
+            slow_request_ms = float(os.getenv("SLOW_REQUEST_MS", "1000"))
+        self.slow_request_ms = slow_request_ms
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = _current.set(timings)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                total = time.perf_counter() - timings.started
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", timings.header(total).encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            total = time.perf_counter() - timings.started
+            if total * 1000 >= self.slow_request_ms:
+                logger.warning(
+                    f"Slow request {scope.get('method')} {scope.get('path')} took "
+                    f"{total * 1000:.1f} ms: {timings.breakdown(total)}"
+                )
@@ -0,0 +1,320 @@
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Iterable, Iterator, Optional, TypeVar
+
+from services.metrics import CIRCUIT_STATE, DEPENDENCY_RETRIES, http_status_of
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Statuses worth retrying: the dependency is overloaded or briefly unavailable
+TRANSIENT_STATUSES = frozenset({408, 429, 500, 502, 503, 504})
+# Statuses after which the request is known not to have been acted on
+REJECTED_STATUSES = frozenset({429, 503})
+# Exception classes (anywhere in the MRO) that signal timeouts and dropped
+# connections across httplib2, requests, httpx and the Google SDKs
+TIMEOUT_ERROR_NAMES = frozenset({
+    "TimeoutError", "Timeout", "ReadTimeout", "ConnectionError", "RemoteDisconnected", "DeadlineExceeded",
+})
+TRANSIENT_ERROR_NAMES = TIMEOUT_ERROR_NAMES | {
+    "ConnectTimeout", "ServiceUnavailable", "ResourceExhausted", "InternalServerError", "TooManyRequests",
+}
+
+CIRCUIT_STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose circuit breaker is open."""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} is unavailable (circuit open); retry in {retry_after:.1f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+def iter_causes(error: BaseException) -> Iterator[BaseException]:
+    """The error followed by the exceptions it wraps (explicitly or while handling them)."""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        yield error
+        error = error.__cause__ or error.__context__
+
+
+def status_of(error: BaseException) -> Optional[int]:
+    """The HTTP status of an error, including the Google SDKs' integer `code`."""
+    status = http_status_of(error)
+    code = getattr(error, "code", None)
+    if status is None and isinstance(code, int) and 100 <= code < 600:
+        status = code
+    return status
+
+
+def is_transient(error: BaseException) -> bool:
+    """Whether an error (or one it wraps) is a 408/429/5xx response, a timeout or a dropped connection."""
+    for cause in iter_causes(error):
+        if isinstance(cause, CircuitOpenError):
+            return False
+        if status_of(cause) in TRANSIENT_STATUSES:
+            return True
+        if isinstance(cause, (TimeoutError, ConnectionError, asyncio.TimeoutError)):
+            return True
+        if any(cls.__name__ in TRANSIENT_ERROR_NAMES for cls in type(cause).__mro__):
+            return True
+    return False
+
+
+def is_rejected(error: BaseException) -> bool:
+    """
+    Whether the dependency refused the request (429, 503), so that repeating
+    it cannot duplicate its effect. Used for non-idempotent calls like sends.
+    """
+    return any(status_of(cause) in REJECTED_STATUSES for cause in iter_causes(error))
+
+
+def is_ambiguous(error: BaseException) -> bool:
+    """
+    Whether a failed request may nonetheless have been carried out, because it
+    timed out or lost its connection before a response arrived.
+    """
+    for cause in iter_causes(error):
+        if isinstance(cause, (TimeoutError, ConnectionError, asyncio.TimeoutError)):
+            return True
+        if any(cls.__name__ in TIMEOUT_ERROR_NAMES for cls in type(cause).__mro__):
+            return True
+    return False
+
+
+def circuit_open_cause(error: BaseException) -> Optional[CircuitOpenError]:
+    """The CircuitOpenError an error was raised from, if any."""
+    return next((cause for cause in iter_causes(error) if isinstance(cause, CircuitOpenError)), None)
+
+
+def should_retry_later(error: BaseException, sending: bool = False) -> bool:
+    """
+    Whether a failed job should run again later because a dependency is down
+    rather than because of the request itself. A send is only repeated when
+    it was refused or never attempted, never after a timeout that may have gone through.
+    """
+    if circuit_open_cause(error) is not None or is_rejected(error):
+        return True
+    return not sending and is_transient(error)
+
+
+def retry_after_of(error: BaseException) -> Optional[float]:
+    """Seconds from a Retry-After header on the error's response, if it has one."""
+    for cause in iter_causes(error):
+        headers = getattr(cause, "resp", None) or getattr(getattr(cause, "response", None), "headers", None)
+        try:
+            value = headers.get("retry-after") or headers.get("Retry-After")
+            return float(value) if value else None
+        except (AttributeError, TypeError, ValueError):
+            continue
+    return None
+
+
+@dataclass
+class RetryPolicy:
+    """Exponential backoff with full jitter: attempt n waits uniform(0, min(max_delay, base_delay * 2**n))."""
+    max_attempts: int = 4
+    base_delay: float = 0.5
+    max_delay: float = 8.0
+
+    @classmethod
+    def from_env(cls) -> "RetryPolicy":
+        """RETRY_MAX_ATTEMPTS (default 4), RETRY_BASE_DELAY_SECONDS (0.5) and RETRY_MAX_DELAY_SECONDS (8)."""
+        return cls(
+            max_attempts=int(os.getenv("RETRY_MAX_ATTEMPTS", "4")),
+            base_delay=float(os.getenv("RETRY_BASE_DELAY_SECONDS", "0.5")),
+            max_delay=float(os.getenv("RETRY_MAX_DELAY_SECONDS", "8")),
+        )
+
+    def backoff(self, attempt: int, error: Optional[BaseException] = None) -> float:
+        """Seconds to wait before retry number `attempt` (0-based), at least the server's Retry-After."""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        retry_after = retry_after_of(error) if error is not None else None
+        return max(delay, min(retry_after, self.max_delay)) if retry_after else delay
+
+
+class CircuitBreaker:
+    """
+    Stops calls to a dependency after `failure_threshold` consecutive transient
+    failures. While open, calls fail fast with CircuitOpenError; after
+    `recovery_timeout` seconds one probe call is let through (half-open),
+    which closes the circuit on success and reopens it on failure.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, recovery_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        CIRCUIT_STATE.labels(dependency=name).set(0)
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at < self.recovery_timeout:
+            return "open"
+        return "half_open"
+
+    def retry_after(self) -> float:
+        """Seconds until calls may be attempted again; 0 unless the circuit is open."""
+        if self._opened_at is None:
+            return 0.0
+        return max(0.0, self.recovery_timeout - (time.monotonic() - self._opened_at))
+
+    def before_call(self):
+        """Raises CircuitOpenError unless a call may go ahead now."""
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return
+            if state == "half_open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                CIRCUIT_STATE.labels(dependency=self.name).set(CIRCUIT_STATES["half_open"])
+                return
+            raise CircuitOpenError(self.name, self.retry_after() or self.recovery_timeout)
+
+    def record_success(self):
+        with self._lock:
+            if self._opened_at is not None:
+                logger.info(f"{self.name} circuit closed; calls resume.")
+            self._failures = 0
+            self._opened_at = None
+            self._probe_in_flight = False
+            CIRCUIT_STATE.labels(dependency=self.name).set(CIRCUIT_STATES["closed"])
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probe_in_flight or self._failures >= self.failure_threshold:
+                if self._opened_at is None or self._probe_in_flight:
+                    logger.warning(
+                        f"{self.name} circuit opened after {self._failures} consecutive failures; "
+                        f"pausing calls for {self.recovery_timeout:.0f}s."
+                    )
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
+                CIRCUIT_STATE.labels(dependency=self.name).set(CIRCUIT_STATES["open"])
+
+    def record_abandoned(self):
+        """
+        Ends a call that was cancelled before it had an outcome (a client disconnect, the
+        losing request of a hedge). Its probe slot is freed so the next call can probe again.
+        """
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_result(self, error: Optional[BaseException]):
+        """Counts a call's outcome. Errors that are the caller's fault (e.g. 400) do not open the circuit."""
+        if error is not None and is_transient(error):
+            self.record_failure()
+        else:
+            self.record_success()
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """
+    The process-wide circuit breaker of a dependency ('gemini', 'gmail'), configured
+    by CIRCUIT_FAILURE_THRESHOLD (default 5) and CIRCUIT_RECOVERY_SECONDS (default 30).
+    """
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = _breakers[name] = CircuitBreaker(
+                name,
+                failure_threshold=int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5")),
+                recovery_timeout=float(os.getenv("CIRCUIT_RECOVERY_SECONDS", "30")),
+            )
+        return breaker
+
+
+def call_with_retry(func: Callable[[], T], breaker: CircuitBreaker, policy: RetryPolicy,
+                    retry_on: Callable[[BaseException], bool] = is_transient) -> T:
+    """
+    Calls `func` through `breaker`, retrying errors matched by `retry_on` with
+    backoff. The last error is raised once attempts run out or the circuit opens.
+    The backoff sleeps the calling thread, so async code runs this in a worker thread.
+    """
+    attempt = 0
+    while True:
+        breaker.before_call()
+        try:
+            result = func()
+        except Exception as e:
+            breaker.record_result(e)
+            attempt += 1
+            if attempt >= policy.max_attempts or not retry_on(e) or breaker.state != "closed":
+                raise
+            delay = policy.backoff(attempt - 1, e)
+            DEPENDENCY_RETRIES.labels(dependency=breaker.name).inc()
+            logger.warning(f"{breaker.name} call failed ({e}); retry {attempt} in {delay:.2f}s")
+            time.sleep(delay)
+            continue
+        except BaseException:
+            breaker.record_abandoned()
+            raise
+        breaker.record_success()
+        return result
+
+
+async def call_with_retry_async(func: Callable[[], Awaitable[T]], breaker: CircuitBreaker, policy: RetryPolicy,
+                                retry_on: Callable[[BaseException], bool] = is_transient) -> T:
+    """The asyncio version of call_with_retry; `func` returns a new awaitable per attempt."""
+    attempt = 0
+    while True:
+        breaker.before_call()
+        try:
+            result = await func()
+        except Exception as e:
+            breaker.record_result(e)
+            attempt += 1
+            if attempt >= policy.max_attempts or not retry_on(e) or breaker.state != "closed":
+                raise
+            delay = policy.backoff(attempt - 1, e)
+            DEPENDENCY_RETRIES.labels(dependency=breaker.name).inc()
+            logger.warning(f"{breaker.name} call failed ({e}); retry {attempt} in {delay:.2f}s")
+            await asyncio.sleep(delay)
+            continue
+        except BaseException:
+            # Cancellation is a BaseException and says nothing about the dependency's health
+            breaker.record_abandoned()
+            raise
+        breaker.record_success()
+        return result
+
+
+async def wait_for_circuits(names: Iterable[str], max_wait: Optional[float] = None) -> float:
+    """
+    Sleeps while any of the named circuits is open, so a pipeline pauses
+    instead of failing every remaining item. Returns the seconds waited.
+    """
+    names = tuple(names)
+    waited = 0.0
+    while True:
+        delay = max((get_breaker(name).retry_after() for name in names), default=0.0)
+        if not delay or (max_wait is not None and waited >= max_wait):
+            return waited
+        if max_wait is not None:
+            delay = min(delay, max_wait - waited)
+        open_names = [name for name in names if get_breaker(name).state == "open"]
+        logger.warning(f"Pausing for {delay:.1f}s while {', '.join(open_names)} is unavailable.")
+        await asyncio.sleep(delay)
+        waited += delay
@@ -0,0 +1,246 @@
+import logging
+import math
+import os
+import random
+import threading
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# custom_data keys checked, in order, for a lead's IANA time zone
+TIMEZONE_KEYS = ("timezone", "time_zone", "tz")
+WEEKDAY_NAMES = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+# Outcomes of reserving a slot in the database
+SLOT_RESERVED = "reserved"
+SLOT_TAKEN = "taken"
+SLOT_DAY_FULL = "day_full"
+
+
+class SendWindowError(ValueError):
+    """Raised for an invalid send window or when no slot is available."""
+    pass
+
+
+def parse_weekdays(spec: str) -> Tuple[int, ...]:
+    """Parses 'mon-fri', 'mon,wed,fri' or '0-4' into weekday numbers (Monday is 0)."""
+    def day(token: str) -> int:
+        token = token.strip().lower()[:3]
+        if token.isdigit():
+            return int(token)
+        if token not in WEEKDAY_NAMES:
+            raise SendWindowError(f"Unknown weekday '{token}'")
+        return WEEKDAY_NAMES.index(token)
+
+    days = set()
+    for part in spec.split(","):
+        if "-" in part:
+            first, last = (day(p) for p in part.split("-", 1))
+            days.update(range(first, last + 1))
+        elif part.strip():
+            days.add(day(part))
+    if not days or not all(0 <= d <= 6 for d in days):
+        raise SendWindowError(f"Invalid weekday spec '{spec}'")
+    return tuple(sorted(days))
+
+
+class SendWindow:
+    """A daily local-time window (e.g. 09:00-17:00 on weekdays) during which emails may be sent."""
+
+    def __init__(self, start: time = time(9), end: time = time(17), weekdays: Iterable[int] = range(5)):
+        if end <= start:
+            raise SendWindowError("Send window end must be after its start")
+        self.start = start
+        self.end = end
+        self.weekdays = frozenset(weekdays)
+        self.seconds = (datetime.combine(date.min, end) - datetime.combine(date.min, start)).total_seconds()
+
+    def next_window(self, after: datetime, tz: ZoneInfo) -> Tuple[datetime, datetime]:
+        """Returns the (open, close) UTC bounds of the first window that closes after `after`."""
+        local_day = after.astimezone(tz).date()
+        for offset in range(8):
+            day = local_day + timedelta(days=offset)
+            if day.weekday() not in self.weekdays:
+                continue
+            opens = datetime.combine(day, self.start, tz).astimezone(timezone.utc)
+            closes = datetime.combine(day, self.end, tz).astimezone(timezone.utc)
+            if closes > after:
+                return max(opens, after), closes
+        raise SendWindowError("Send window has no weekdays")
+
+
+class SendSlotAllocator:
+    """
+    Assigns each outgoing email a send time inside the recipient's local send window.
+
+    All slots come from one mailbox, so they share a single UTC timeline of
+    `slot_seconds`-wide buckets holding one email each. The bucket width is the
+    window length divided by the daily limit (but never below `min_interval`),
+    so a full day's capacity is spread evenly over the window instead of
+    going out in a burst at its start. `daily_limit` caps slots per UTC day.
+
+    With a `db_client` every slot is also reserved in its 'send_slots' table,
+    so that API workers and restarts share one timeline and one daily limit;
+    all of them must use the same window settings. Without one, slots live in
+    memory and each process spreads only its own sends.
+    """
+
+    def __init__(self, window: SendWindow, default_timezone: str = "UTC", daily_limit: int = 500,
+                 min_interval: float = 10.0, jitter: float = 0.5, horizon_days: int = 30, db_client=None):
+        """
+        Args:
+            window: Local-time window applied in each lead's time zone.
+            default_timezone: Time zone for leads without a valid custom_data timezone.
+            daily_limit: Maximum sends per UTC day for the mailbox.
+            min_interval: Minimum seconds between two sends.
+            jitter: Fraction of a slot by which send times are randomly offset.
+            horizon_days: How far ahead to search before giving up.
+            db_client: Database client whose 'send_slots' table holds the reservations, or None.
+        """
+        self.window = window
+        self.default_timezone = ZoneInfo(default_timezone)
+        self.daily_limit = daily_limit
+        self.slot_seconds = max(min_interval, window.seconds / daily_limit)
+        self.jitter = jitter
+        self.horizon_days = horizon_days
+        self.db = db_client
+        self._loaded = False
+        self._lock = threading.Lock()
+        # Taken bucket -> next bucket to try, compressed as slots fill up
+        self._taken: Dict[int, int] = {}
+        self._per_day: Dict[date, int] = {}
+        self._rng = random.Random()
+        self._unknown_zones = set()
+
+    @classmethod
+    def from_env(cls, db_client=None) -> Optional["SendSlotAllocator"]:
+        """
+        Builds an allocator from the SEND_WINDOW_* settings, or None unless
+        SEND_WINDOW_ENABLED=true. Follow-ups keep their plain delay while it is off.
+        """
+        if os.getenv("SEND_WINDOW_ENABLED", "false").lower() != "true":
+            return None
+        window = SendWindow(
+            start=time.fromisoformat(os.getenv("SEND_WINDOW_START", "09:00")),
+            end=time.fromisoformat(os.getenv("SEND_WINDOW_END", "17:00")),
+            weekdays=parse_weekdays(os.getenv("SEND_WINDOW_DAYS", "mon-fri")),
+        )
+        return cls(
+            window,
+            default_timezone=os.getenv("SEND_WINDOW_DEFAULT_TIMEZONE", "UTC"),
+            daily_limit=int(os.getenv("GMAIL_DAILY_SEND_LIMIT", "500")),
+            min_interval=float(os.getenv("GMAIL_MIN_SEND_INTERVAL", "10")),
+            jitter=float(os.getenv("SEND_SLOT_JITTER", "0.5")),
+            db_client=db_client,
+        )
+
+    def lead_timezone(self, lead: Optional[Dict[str, Any]]) -> ZoneInfo:
+        """The lead's time zone from custom_data, falling back to the default."""
+        custom_data = (lead or {}).get("custom_data") or {}
+        for key in TIMEZONE_KEYS:
+            name = custom_data.get(key)
+            if not name:
+                continue
+            name = str(name).strip()
+            if name in self._unknown_zones:
+                break
+            try:
+                return ZoneInfo(name)
+            except (ZoneInfoNotFoundError, ValueError):
+                logger.warning(f"Unknown time zone '{name}' (lead {(lead or {}).get('id')}); using default.")
+                self._unknown_zones.add(name)
+                break
+        return self.default_timezone
+
+    def allocate(self, lead: Optional[Dict[str, Any]], earliest: Optional[datetime] = None) -> datetime:
+        """Reserves and returns the first free send time (UTC) at or after `earliest` within the lead's window."""
+        now = datetime.now(timezone.utc)
+        if earliest is None:
+            earliest = now
+        elif earliest.tzinfo is None:
+            earliest = earliest.astimezone(timezone.utc)
+        cursor = max(earliest, now)
+        limit = cursor + timedelta(days=self.horizon_days)
+        tz = self.lead_timezone(lead)
+
+        with self._lock:
+            self._load(now)
+            self._prune(now)
+            while cursor < limit:
+                opens, closes = self.window.next_window(cursor, tz)
+                bucket = self._free_bucket(math.ceil(opens.timestamp() / self.slot_seconds))
+                while bucket * self.slot_seconds < closes.timestamp():
+                    start = datetime.fromtimestamp(bucket * self.slot_seconds, timezone.utc)
+                    if self._per_day.get(start.date(), 0) < self.daily_limit:
+                        outcome = self._reserve(bucket, start.date())
+                        if outcome == SLOT_RESERVED:
+                            self._taken[bucket] = bucket + 1
+                            self._per_day[start.date()] = self._per_day.get(start.date(), 0) + 1
+                            offset = self._rng.uniform(0, self.jitter * self.slot_seconds)
+                            return start + timedelta(seconds=offset)
+                        if outcome == SLOT_TAKEN:
+                            # Reserved by another worker since the timeline was loaded
+                            self._taken[bucket] = bucket + 1
+                            bucket = self._free_bucket(bucket + 1)
+                            continue
+                        self._per_day[start.date()] = self.daily_limit
+                    # This UTC day is full; continue from the next one
+                    next_day = datetime.combine(start.date() + timedelta(days=1), time(), timezone.utc)
+                    bucket = self._free_bucket(math.ceil(next_day.timestamp() / self.slot_seconds))
+                cursor = closes
+        raise SendWindowError(f"No free send slot within {self.horizon_days} days")
+
+    def allocate_many(self, leads: List[Dict[str, Any]], earliest: Optional[datetime] = None) -> List[datetime]:
+        return [self.allocate(lead, earliest) for lead in leads]
+
+    def _reserve(self, bucket: int, day: date) -> str:
+        """Reserves the bucket in the database, if there is one."""
+        if self.db is None:
+            return SLOT_RESERVED
+        return self.db.reserve_send_slot(bucket, day.isoformat(), self.daily_limit)
+
+    def _load(self, now: datetime):
+        """Takes in the future slots other workers and earlier runs reserved, on first use."""
+        if self.db is None or self._loaded:
+            return
+        after, page_size = int(now.timestamp() / self.slot_seconds) - 1, 1000
+        while True:
+            page = self.db.get_send_slots_page(after_bucket=after, limit=page_size)
+            for row in page:
+                slot_date = date.fromisoformat(row["slot_date"])
+                self._taken[row["bucket"]] = row["bucket"] + 1
+                self._per_day[slot_date] = self._per_day.get(slot_date, 0) + 1
+            if len(page) < page_size:
+                break
+            after = page[-1]["bucket"]
+        self._loaded = True
+
+    def _free_bucket(self, bucket: int) -> int:
+        """First untaken bucket at or after `bucket`, compressing the chain of taken ones it walked."""
+        path = []
+        while bucket in self._taken:
+            path.append(bucket)
+            bucket = self._taken[bucket]
+        for taken in path:
+            self._taken[taken] = bucket
+        return bucket
+
+    def _prune(self, now: datetime):
+        """Drops past slots so memory stays bounded by the number of future reservations."""
+        if len(self._taken) < 10_000:
+            return
+        current = int(now.timestamp() / self.slot_seconds)
+        self._taken = {b: n for b, n in self._taken.items() if b >= current}
+        self._per_day = {d: c for d, c in self._per_day.items() if d >= now.date()}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "slot_seconds": round(self.slot_seconds, 2),
+                "daily_limit": self.daily_limit,
+                "reserved": len(self._taken),
+                "per_day": {d.isoformat(): c for d, c in sorted(self._per_day.items())},
+            }
@@ -0,0 +1,759 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from services.metrics import track_db_query
+from services.supabase_client import SupabaseClientError
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+# Known columns per table. Keys outside this list are kept in the 'extra'
+# JSON column, so callers can store the same shapes they send to Supabase.
+# Foreign keys are INTEGER so IDs passed as strings still match.
+TABLES: Dict[str, Dict[str, Tuple[str, ...]]] = {
+    "leads": {
+        "columns": ("name", "email", "company", "position", "linkedin_url", "status", "custom_data"),
+        "json": ("custom_data",),
+        "integer": (),
+    },
+    "campaigns": {
+        "columns": ("name", "objective", "tone", "status", "personalization_mode", "segment_by", "max_segments"),
+        "json": ("segment_by",),
+        "integer": ("max_segments",),
+    },
+    "emails": {
+        "columns": ("lead_id", "campaign_id", "subject", "body", "status", "email_type", "generated_at",
+                    "sent_at", "opened_at", "replied_at", "error_message", "gmail_message_id",
+                    "gmail_thread_id"),
+        "json": (),
+        "integer": ("lead_id", "campaign_id"),
+    },
+    "templates": {
+        "columns": ("name", "subject_template", "body_template", "type"),
+        "json": (),
+        "integer": (),
+    },
+    "suppressions": {
+        "columns": ("email", "domain", "reason", "active", "note"),
+        "json": (),
+        "integer": ("active",),
+    },
+    "outbox": {
+        "columns": ("idempotency_key", "lead_id", "campaign_id", "step", "variant", "status", "claim_token",
+                    "claimed_at", "email_log_id", "gmail_message_id", "gmail_thread_id", "subject",
+                    "error_message", "sent_at"),
+        "json": (),
+        "integer": ("lead_id", "campaign_id"),
+    },
+    "send_slots": {
+        "columns": ("bucket", "slot_date"),
+        "json": (),
+        "integer": ("bucket",),
+    },
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS {table} (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    {columns},
+    extra TEXT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+"""
+
+INDEXES = (
+    "CREATE INDEX IF NOT EXISTS idx_emails_campaign ON emails (campaign_id)",
+    "CREATE INDEX IF NOT EXISTS idx_emails_lead_campaign_created ON emails (lead_id, campaign_id, created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_emails_status ON emails (status)",
+    "CREATE INDEX IF NOT EXISTS idx_emails_thread ON emails (gmail_thread_id)",
+    "CREATE INDEX IF NOT EXISTS idx_leads_status ON leads (status)",
+    "CREATE INDEX IF NOT EXISTS idx_suppressions_email ON suppressions (email)",
+    "CREATE INDEX IF NOT EXISTS idx_suppressions_domain ON suppressions (domain)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_outbox_key ON outbox (idempotency_key)",
+    # Lead lookups by email are case-insensitive, which a BINARY index cannot serve
+    "DROP INDEX IF EXISTS idx_leads_email",
+    "CREATE INDEX IF NOT EXISTS idx_leads_email_nocase ON leads (email COLLATE NOCASE)",
+    "CREATE INDEX IF NOT EXISTS idx_leads_created ON leads (created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_campaigns_created ON campaigns (created_at)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_send_slots_bucket ON send_slots (bucket)",
+    "CREATE INDEX IF NOT EXISTS idx_send_slots_date ON send_slots (slot_date)",
+)
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class SQLiteClient:
+    """
+    A local SQLite implementation of the SupabaseClient interface.
+
+    Select it with DB_BACKEND=sqlite to run the API, benchmarks or load tests
+    without network access. Errors are raised as SupabaseClientError so the
+    routers handle both backends the same way.
+    """
+
+    def __init__(self, db_path: Optional[str] = None):
+        """
+        Opens (and if needed creates) the database at `db_path`,
+        defaulting to the SQLITE_DB_PATH environment variable or 'coldemail.db'.
+        """
+        self.db_path = db_path or os.getenv("SQLITE_DB_PATH", "coldemail.db")
+        self._lock = threading.RLock()
+        try:
+            self.conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+            self.conn.row_factory = sqlite3.Row
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self._create_schema()
+            logger.info(f"SQLite client initialized at {self.db_path}.")
+        except sqlite3.Error as e:
+            logger.error(f"Failed to initialize SQLite client: {e}")
+            raise SupabaseClientError(f"Failed to initialize SQLite client: {e}")
+
+    def _create_schema(self):
+        with self._lock:
+            for table, spec in TABLES.items():
+                columns = [f"{c} {'INTEGER' if c in spec['integer'] else 'TEXT'}" for c in spec["columns"]]
+                self.conn.execute(SCHEMA.format(table=table, columns=",\n    ".join(columns)))
+            for statement in INDEXES:
+                self.conn.execute(statement)
+
+    # --- Row helpers ---
+
+    def _encode(self, table: str, row: Dict[str, Any]) -> Dict[str, Any]:
+        spec = TABLES[table]
+        encoded: Dict[str, Any] = {}
+        extra: Dict[str, Any] = {}
+        for key, value in row.items():
+            if key in ("id", "created_at", "updated_at"):
+                continue
+            if key in spec["columns"]:
+                encoded[key] = json.dumps(value) if key in spec["json"] and value is not None else value
+            else:
+                extra[key] = value
+        if extra:
+            encoded["extra"] = json.dumps(extra, default=str)
+        return encoded
+
+    def _decode(self, table: str, record: sqlite3.Row) -> Dict[str, Any]:
+        spec = TABLES[table]
+        row = dict(record)
+        extra = row.pop("extra", None)
+        for key in spec["json"]:
+            if row.get(key) is not None:
+                row[key] = json.loads(row[key])
+        if extra:
+            row.update(json.loads(extra))
+        return row
+
+    def _select(self, table: str, where: str = "", params: Iterable[Any] = (),
+                order_by: str = "", limit: Optional[int] = None, offset: int = 0) -> List[Dict[str, Any]]:
+        sql = f"SELECT * FROM {table}"
+        if where:
+            sql += f" WHERE {where}"
+        if order_by:
+            sql += f" ORDER BY {order_by}"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)} OFFSET {int(offset)}"
+        with self._lock:
+            records = self.conn.execute(sql, tuple(params)).fetchall()
+        return [self._decode(table, record) for record in records]
+
+    def _get(self, table: str, row_id: Any) -> Optional[Dict[str, Any]]:
+        rows = self._select(table, "id = ?", (row_id,))
+        return rows[0] if rows else None
+
+    def _insert_many(self, table: str, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Inserts rows in one transaction and returns them with their new IDs."""
+        if not rows:
+            return []
+        columns = TABLES[table]["columns"] + ("extra", "created_at", "updated_at")
+        now = _now()
+        values = []
+        for row in rows:
+            encoded = self._encode(table, row)
+            created_at = row.get("created_at") or now
+            values.append(tuple(encoded.get(c) for c in columns[:-2]) + (created_at, created_at))
+        sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self.conn.executemany(sql, values)
+                last_id = self.conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        # AUTOINCREMENT IDs are contiguous within a single writer transaction
+        first_id = last_id - len(rows) + 1
+        return [
+            dict(row, id=first_id + i, created_at=value[-2], updated_at=value[-1])
+            for i, (row, value) in enumerate(zip(rows, values))
+        ]
+
+    def _update(self, table: str, row_id: Any, update_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        # Held across the read-merge-write so concurrent updates do not lose fields
+        with self._lock:
+            current = self._get(table, row_id)
+            if current is None:
+                return None
+            encoded = self._encode(table, {**current, **update_data})
+            columns = TABLES[table]["columns"]
+            assignments = [f"{column} = ?" for column in columns] + ["extra = ?", "updated_at = ?"]
+            params = [encoded.get(column) for column in columns] + [encoded.get("extra"), _now(), row_id]
+            self.conn.execute(f"UPDATE {table} SET {', '.join(assignments)} WHERE id = ?", params)
+            return self._get(table, row_id)
+
+    # --- SupabaseClient interface ---
+
+    @track_db_query
+    def get_lead(self, lead_id: str) -> Optional[Dict[str, Any]]:
+        """Fetches a single lead by its ID."""
+        try:
+            return self._get("leads", lead_id)
+        except sqlite3.Error as e:
+            logger.error(f"Error fetching lead with ID {lead_id}: {e}")
+            raise SupabaseClientError(f"Error fetching lead: {e}")
+
+    @track_db_query
+    def get_campaign(self, campaign_id: str) -> Optional[Dict[str, Any]]:
+        """Fetches a single campaign by its ID."""
+        try:
+            return self._get("campaigns", campaign_id)
+        except sqlite3.Error as e:
+            logger.error(f"Error fetching campaign with ID {campaign_id}: {e}")
+            raise SupabaseClientError(f"Error fetching campaign: {e}")
+
+    @track_db_query
+    def log_email_activity(self, email_log: Dict[str, Any]) -> int:
+        """Logs a generated or sent email and returns the new row's ID."""
+        try:
+            return self._insert_many("emails", [email_log])[0]["id"]
+        except sqlite3.Error as e:
+            logger.error(f"Error logging email activity for lead {email_log.get('lead_id')}: {e}")
+            raise SupabaseClientError(f"Error logging email activity: {e}")
+
+    @track_db_query
+    def bulk_insert_email_logs(self, email_logs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Inserts several email logs in one transaction, returning rows in input order."""
+        try:
+            return self._insert_many("emails", email_logs)
+        except sqlite3.Error as e:
+            logger.error(f"Error during bulk email log insert of {len(email_logs)} rows: {e}")
+            raise SupabaseClientError(f"Error during bulk email log insert: {e}")
+
+    @track_db_query
+    def update_email_status(self, email_id: str, update_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Updates the status or other details of an email log by its ID."""
+        try:
+            updated = self._update("emails", email_id, update_data)
+        except sqlite3.Error as e:
+            logger.error(f"Error updating email status for email ID {email_id}: {e}")
+            raise SupabaseClientError(f"Error updating email status: {e}")
+        if updated is None:
+            raise SupabaseClientError(f"Failed to update email log ID {email_id}, no data returned.")
+        return updated
+
+    @track_db_query
+    def bulk_update_email_status(self, email_ids: List[Any], update_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Applies the same update to several email logs in one transaction; returns the updated rows."""
+        if not email_ids:
+            return []
+        updated = []
+        try:
+            with self._lock:
+                self.conn.execute("BEGIN IMMEDIATE")
+                try:
+                    for email_id in email_ids:
+                        row = self._update("emails", email_id, update_data)
+                        if row is not None:
+                            updated.append(row)
+                    self.conn.execute("COMMIT")
+                except Exception:
+                    self.conn.execute("ROLLBACK")
+                    raise
+        except sqlite3.Error as e:
+            logger.error(f"Error updating {len(email_ids)} email logs: {e}")
+            raise SupabaseClientError(f"Error updating email logs: {e}")
+        return updated
+
+    @track_db_query
+    def get_email_status(self, email_id: str) -> Optional[Dict[str, Any]]:
+        """Retrieves the full record for a single email by its ID."""
+        return self._get("emails", email_id)
+
+    @track_db_query
+    def get_campaign_emails(self, campaign_id: str, skip: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
+        """Retrieves emails for a campaign, with pagination."""
+        try:
+            return self._select("emails", "campaign_id = ?", (campaign_id,), "id", limit, skip)
+        except sqlite3.Error as e:
+            logger.error(f"Error fetching emails for campaign {campaign_id}: {e}")
+            raise SupabaseClientError(f"Error fetching campaign emails: {e}")
+
+    @track_db_query
+    def get_campaign_emails_page(self, campaign_id: str, after_id: int = 0, limit: int = 1000) -> List[Dict[str, Any]]:
+        """Retrieves one page of a campaign's emails in ID order, starting after `after_id`."""
+        try:
+            return self._select("emails", "campaign_id = ? AND id > ?", (campaign_id, after_id), "id", limit)
+        except sqlite3.Error as e:
+            logger.error(f"Error fetching emails for campaign {campaign_id} after {after_id}: {e}")
+            raise SupabaseClientError(f"Error fetching campaign emails: {e}")
+
+    @track_db_query
+    def get_lead_emails(self, lead_id: str) -> List[Dict[str, Any]]:
+        """Retrieves all emails sent to a specific lead."""
+        try:
+            return self._select("emails", "lead_id = ?", (lead_id,), "id")
+        except sqlite3.Error as e:
+            logger.error(f"Error fetching emails for lead {lead_id}: {e}")
+            raise SupabaseClientError(f"Error fetching lead emails: {e}")
+
+    @track_db_query
+    def create_email_template(self, template_data: Dict[str, Any]) -> int:
+        """Creates a new email template and returns its ID."""
+        try:
+            return self._insert_many("templates", [template_data])[0]["id"]
+        except sqlite3.Error as e:
+            logger.error(f"Error creating email template: {e}")
+            raise SupabaseClientError(f"Error creating template: {e}")
+
+    @track_db_query
+    def get_email_templates(self) -> List[Dict[str, Any]]:
+        """Retrieves all email templates."""
+        try:
+            return self._select("templates", order_by="id")
+        except sqlite3.Error as e:
+            logger.error(f"Error fetching email templates: {e}")
+            raise SupabaseClientError(f"Error fetching templates: {e}")
+
+    @track_db_query
+    def get_email_template(self, template_id: str) -> Optional[Dict[str, Any]]:
+        """Fetches a single email template by its ID."""
+        try:
+            return self._get("templates", template_id)
+        except sqlite3.Error as e:
+            logger.error(f"Error fetching template with ID {template_id}: {e}")
+            raise SupabaseClientError(f"Error fetching template: {e}")
+
+    @track_db_query
+    def get_latest_email_for_lead_campaign(self, lead_id: str, campaign_id: str) -> Optional[Dict[str, Any]]:
+        """Fetches the most recent email log for a lead-campaign combination."""
+        try:
+            rows = self._select(
+                "emails", "lead_id = ? AND campaign_id = ?", (lead_id, campaign_id),
+                "created_at DESC, id DESC", 1
+            )
+        except sqlite3.Error as e:
+            logger.error(f"Error fetching latest email for lead {lead_id}: {e}")
+            raise SupabaseClientError(f"Error fetching latest email: {e}")
+        if not rows:
+            logger.warning(f"No email log found for lead {lead_id} in campaign {campaign_id}")
+            return None
+        return rows[0]
+
+    @track_db_query
+    def get_email_by_thread_id(self, thread_id: str) -> Optional[Dict[str, Any]]:
+        """Fetches the most recent email log sent in a Gmail thread, or None."""
+        try:
+            rows = self._select("emails", "gmail_thread_id = ?", (thread_id,), "created_at DESC, id DESC", 1)
+        except sqlite3.Error as e:
+            logger.error(f"Error fetching email for thread {thread_id}: {e}")
+            raise SupabaseClientError(f"Error fetching email by thread: {e}")
+        return rows[0] if rows else None
+
+    @track_db_query
+    def get_all_leads(self) -> List[Dict[str, Any]]:
+        """Retrieves all leads, newest first."""
+        try:
+            return self._select("leads", order_by="created_at DESC, id DESC")
+        except sqlite3.Error as e:
+            logger.error(f"Error fetching all leads: {e}")
+            raise SupabaseClientError(f"Error fetching all leads: {e}")
+
+    @track_db_query
+    def get_leads_by_ids(self, lead_ids: List[str]) -> List[Dict[str, Any]]:
+        """Retrieves several leads by ID in a single query."""
+        if not lead_ids:
+            return []
+        try:
+            placeholders = ", ".join("?" * len(lead_ids))
+            return self._select("leads", f"id IN ({placeholders})", lead_ids)
+        except sqlite3.Error as e:
+            logger.error(f"Error fetching {len(lead_ids)} leads by ID: {e}")
+            raise SupabaseClientError(f"Error fetching leads by ID: {e}")
+
+    @track_db_query
+    def get_leads_page(self, after_id: int = 0, limit: int = 1000, status: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Retrieves one page of leads in ID order, starting after `after_id`, optionally filtered by status."""
+        where, params = "id > ?", [after_id]
+        if status:
+            where += " AND status = ?"
+            params.append(status)
+        try:
+            return self._select("leads", where, params, "id", limit)
+        except sqlite3.Error as e:
+            logger.error(f"Error fetching leads after {after_id}: {e}")
+            raise SupabaseClientError(f"Error fetching leads: {e}")
+
+    @track_db_query
+    def get_leads_by_status(self, status: str) -> List[Dict[str, Any]]:
+        """Retrieves all leads that match a given status, newest first."""
+        try:
+            return self._select("leads", "status = ?", (status,), "created_at DESC, id DESC")
+        except sqlite3.Error as e:
+            logger.error(f"Error fetching leads with status {status}: {e}")
+            raise SupabaseClientError(f"Error fetching leads by status: {e}")
+
+    @track_db_query
+    def get_table_version(self, table: str, filters: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        """Returns the count and latest updated_at of the rows of `table` matching `filters`."""
+        filters = filters or {}
+        if table not in TABLES or not set(filters) <= set(TABLES[table]["columns"]) | {"id"}:
+            raise SupabaseClientError(f"Cannot version table {table} by {sorted(filters)}")
+        where = " AND ".join(f"{column} = ?" for column in filters) or "1"
+        try:
+            with self._lock:
+                count, latest = self.conn.execute(
+                    f"SELECT COUNT(*), MAX(updated_at) FROM {table} WHERE {where}", tuple(filters.values())
+                ).fetchone()
+            return f"{count}:{latest}"
+        except sqlite3.Error as e:
+            logger.error(f"Error reading the version of table {table}: {e}")
+            raise SupabaseClientError(f"Error reading table version: {e}")
+
+    @track_db_query
+    def select_lead_ids(self, statuses: Optional[List[str]] = None, tags: Optional[List[str]] = None,
+                        after_id: int = 0, limit: int = 500, exclude_campaign_id: Optional[str] = None) -> List[int]:
+        """
+        Returns one page of lead IDs with one of `statuses` and all of `tags`, in ID order,
+        leaving out leads that already have an email in `exclude_campaign_id`.
+        """
+        where, params = self._selector_filters(statuses, tags)
+        where.append("id > ?")
+        params.append(after_id)
+        if exclude_campaign_id is not None:
+            where.append("NOT EXISTS (SELECT 1 FROM emails WHERE emails.lead_id = leads.id AND emails.campaign_id = ?)")
+            params.append(exclude_campaign_id)
+        sql = f"SELECT id FROM leads WHERE {' AND '.join(where)} ORDER BY id LIMIT {int(limit)}"
+        try:
+            with self._lock:
+                return [record[0] for record in self.conn.execute(sql, params).fetchall()]
+        except sqlite3.Error as e:
+            logger.error(f"Error selecting lead IDs after {after_id}: {e}")
+            raise SupabaseClientError(f"Error selecting lead IDs: {e}")
+
+    @staticmethod
+    def _selector_filters(statuses: Optional[List[str]], tags: Optional[List[str]]) -> Tuple[List[str], List[Any]]:
+        where, params = [], []
+        if statuses:
+            where.append(f"status IN ({', '.join('?' * len(statuses))})")
+            params.extend(statuses)
+        for tag in tags or ():
+            where.append("EXISTS (SELECT 1 FROM json_each(leads.custom_data, '$.tags') WHERE value = ?)")
+            params.append(tag)
+        return where, params
+
+    @track_db_query
+    def count_contacted_leads(self, campaign_id: str, statuses: Optional[List[str]] = None,
+                              tags: Optional[List[str]] = None) -> int:
+        """Counts the leads matching a selector that already have an email in the campaign."""
+        where, params = self._selector_filters(statuses, tags)
+        where.append("EXISTS (SELECT 1 FROM emails WHERE emails.lead_id = leads.id AND emails.campaign_id = ?)")
+        params.append(campaign_id)
+        try:
+            with self._lock:
+                return self.conn.execute(f"SELECT COUNT(*) FROM leads WHERE {' AND '.join(where)}", params).fetchone()[0]
+        except sqlite3.Error as e:
+            logger.error(f"Error counting contacted leads for campaign {campaign_id}: {e}")
+            raise SupabaseClientError(f"Error counting contacted leads: {e}")
+
+    @track_db_query
+    def get_lead_by_email(self, email: str) -> Optional[Dict[str, Any]]:
+        """Fetches the lead with the given email address (case-insensitive), or None."""
+        try:
+            rows = self._select("leads", "email = ? COLLATE NOCASE", (email,), "id", 1)
+        except sqlite3.Error as e:
+            logger.error(f"Error fetching lead with email {email}: {e}")
+            raise SupabaseClientError(f"Error fetching lead by email: {e}")
+        return rows[0] if rows else None
+
+    @track_db_query
+    def update_lead(self, lead_id: str, update_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Updates a lead; returns the updated row, or None if it does not exist."""
+        try:
+            return self._update("leads", lead_id, update_data)
+        except sqlite3.Error as e:
+            logger.error(f"Error updating lead {lead_id}: {e}")
+            raise SupabaseClientError(f"Error updating lead: {e}")
+
+    @track_db_query
+    def bulk_insert_leads(self, leads_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Inserts a list of leads in a single transaction."""
+        try:
+            inserted = self._insert_many("leads", leads_data)
+        except sqlite3.Error as e:
+            logger.error(f"Error during bulk lead insert: {e}")
+            raise SupabaseClientError(f"Error during bulk lead insert: {e}")
+        if not inserted:
+            raise SupabaseClientError("Bulk insert failed, no data returned.")
+        return inserted
+
+    @track_db_query
+    def create_campaign(self, campaign_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Creates a new campaign."""
+        try:
+            return self._insert_many("campaigns", [campaign_data])[0]
+        except sqlite3.Error as e:
+            logger.error(f"Error creating campaign: {e}")
+            raise SupabaseClientError(f"Error creating campaign: {e}")
+
+    @track_db_query
+    def get_all_campaigns(self) -> List[Dict[str, Any]]:
+        """Retrieves all campaigns, newest first."""
+        try:
+            return self._select("campaigns", order_by="created_at DESC, id DESC")
+        except sqlite3.Error as e:
+            logger.error(f"Error fetching all campaigns: {e}")
+            raise SupabaseClientError(f"Error fetching all campaigns: {e}")
+
+    @track_db_query
+    def update_campaign(self, campaign_id: int, update_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Updates an existing campaign by its ID."""
+        try:
+            return self._update("campaigns", campaign_id, update_data)
+        except sqlite3.Error as e:
+            logger.error(f"Error updating campaign {campaign_id}: {e}")
+            raise SupabaseClientError(f"Error updating campaign: {e}")
+
+    @track_db_query
+    def delete_campaign(self, campaign_id: int) -> Optional[Dict[str, Any]]:
+        """Deletes a campaign and its emails, returning the deleted campaign."""
+        try:
+            campaign = self._get("campaigns", campaign_id)
+            if campaign is None:
+                return None
+            with self._lock:
+                self.conn.execute("BEGIN IMMEDIATE")
+                try:
+                    self.conn.execute("DELETE FROM emails WHERE campaign_id = ?", (campaign_id,))
+                    self.conn.execute("DELETE FROM campaigns WHERE id = ?", (campaign_id,))
+                    self.conn.execute("COMMIT")
+                except Exception:
+                    self.conn.execute("ROLLBACK")
+                    raise
+            return campaign
+        except sqlite3.Error as e:
+            logger.error(f"Error deleting campaign {campaign_id}: {e}")
+            raise SupabaseClientError(f"Error deleting campaign: {e}")
+
+    @track_db_query
+    def add_suppressions(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Appends rows to the suppression log."""
+        try:
+            return self._insert_many("suppressions", rows)
+        except sqlite3.Error as e:
+            logger.error(f"Error adding {len(rows)} suppressions: {e}")
+            raise SupabaseClientError(f"Error adding suppressions: {e}")
+
+    @track_db_query
+    def get_suppressions_page(self, after_id: int = 0, limit: int = 5000) -> List[Dict[str, Any]]:
+        """Retrieves one page of suppression rows in ID order, starting after `after_id`."""
+        try:
+            return self._select("suppressions", "id > ?", (after_id,), "id", limit)
+        except sqlite3.Error as e:
+            logger.error(f"Error fetching suppressions after {after_id}: {e}")
+            raise SupabaseClientError(f"Error fetching suppressions: {e}")
+
+    @track_db_query
+    def get_latest_suppression(self, email: str = None, domain: str = None) -> Optional[Dict[str, Any]]:
+        """Fetches the most recent suppression row for an email or a domain, or None."""
+        column, value = ("email", email) if email else ("domain", domain)
+        try:
+            rows = self._select("suppressions", f"{column} = ?", (value,), "id DESC", 1)
+        except sqlite3.Error as e:
+            logger.error(f"Error fetching suppression for {value}: {e}")
+            raise SupabaseClientError(f"Error fetching suppression: {e}")
+        return rows[0] if rows else None
+
+    @track_db_query
+    def claim_outbox_entries(self, entries: List[Dict[str, Any]], stale_before: str) -> List[Dict[str, Any]]:
+        """
+        Atomically claims the outbox entries for the entries' idempotency keys: inserts them,
+        or takes over existing entries that failed or whose pending claim is older than
+        `stale_before`. Returns the claimed rows; keys that are missing were sent or claimed
+        by another sender.
+        """
+        if not entries:
+            return []
+        now = _now()
+        claimed = []
+        try:
+            with self._lock:
+                # One conditional upsert per key in one write transaction, so the claims are
+                # atomic across processes sharing the file too
+                self.conn.execute("BEGIN IMMEDIATE")
+                try:
+                    for entry in entries:
+                        encoded = self._encode("outbox", entry)
+                        columns = list(encoded) + ["created_at", "updated_at"]
+                        cursor = self.conn.execute(
+                            f"INSERT INTO outbox ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+                            "ON CONFLICT(idempotency_key) DO UPDATE SET status = excluded.status, "
+                            "claim_token = excluded.claim_token, claimed_at = excluded.claimed_at, "
+                            "error_message = NULL, updated_at = excluded.updated_at "
+                            "WHERE outbox.status = 'failed' OR (outbox.status = 'pending' AND outbox.claimed_at < ?)",
+                            list(encoded.values()) + [now, now, stale_before]
+                        )
+                        if cursor.rowcount:
+                            claimed.append(entry["idempotency_key"])
+                    self.conn.execute("COMMIT")
+                except Exception:
+                    self.conn.execute("ROLLBACK")
+                    raise
+                if not claimed:
+                    return []
+                return self._select("outbox", f"idempotency_key IN ({', '.join('?' * len(claimed))})", claimed)
+        except sqlite3.Error as e:
+            logger.error(f"Error claiming {len(entries)} outbox entries: {e}")
+            raise SupabaseClientError(f"Error claiming outbox entries: {e}")
+
+    @track_db_query
+    def get_outbox_entries(self, keys: List[str]) -> List[Dict[str, Any]]:
+        """Fetches the outbox entries for a list of idempotency keys."""
+        if not keys:
+            return []
+        try:
+            return self._select("outbox", f"idempotency_key IN ({', '.join('?' * len(keys))})", list(keys))
+        except sqlite3.Error as e:
+            logger.error(f"Error fetching {len(keys)} outbox entries: {e}")
+            raise SupabaseClientError(f"Error fetching outbox entries: {e}")
+
+    @track_db_query
+    def renew_outbox_entries(self, keys: List[str], claim_token: str, claimed_at: str) -> List[Dict[str, Any]]:
+        """Moves the claim time of pending entries still held by `claim_token`; returns the renewed rows."""
+        if not keys:
+            return []
+        placeholders = ', '.join('?' * len(keys))
+        try:
+            with self._lock:
+                self.conn.execute(
+                    f"UPDATE outbox SET claimed_at = ?, updated_at = ? "
+                    f"WHERE idempotency_key IN ({placeholders}) AND claim_token = ? AND status = 'pending'",
+                    [claimed_at, _now(), *keys, claim_token]
+                )
+                return self._select(
+                    "outbox", f"idempotency_key IN ({placeholders}) AND claim_token = ? AND status = 'pending'",
+                    [*keys, claim_token]
+                )
+        except sqlite3.Error as e:
+            logger.error(f"Error renewing {len(keys)} outbox entries: {e}")
+            raise SupabaseClientError(f"Error renewing outbox entries: {e}")
+
+    @track_db_query
+    def update_outbox_entries(self, updates: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Applies several outbox entry updates in one transaction, each holding its
+        idempotency_key and claim_token and applied only while that token holds the
+        entry. Returns the updated rows.
+        """
+        if not updates:
+            return []
+        now = _now()
+        updated = []
+        try:
+            with self._lock:
+                self.conn.execute("BEGIN IMMEDIATE")
+                try:
+                    for update in updates:
+                        data = {k: v for k, v in update.items() if k not in ("idempotency_key", "claim_token")}
+                        encoded = self._encode("outbox", data)
+                        assignments = [f"{column} = ?" for column in encoded] + ["updated_at = ?"]
+                        cursor = self.conn.execute(
+                            f"UPDATE outbox SET {', '.join(assignments)} WHERE idempotency_key = ? AND claim_token = ?",
+                            list(encoded.values()) + [now, update["idempotency_key"], update["claim_token"]]
+                        )
+                        if cursor.rowcount:
+                            updated.append(update["idempotency_key"])
+                    self.conn.execute("COMMIT")
+                except Exception:
+                    self.conn.execute("ROLLBACK")
+                    raise
+                if not updated:
+                    return []
+                return self._select("outbox", f"idempotency_key IN ({', '.join('?' * len(updated))})", updated)
+        except sqlite3.Error as e:
+            logger.error(f"Error updating {len(updates)} outbox entries: {e}")
+            raise SupabaseClientError(f"Error updating outbox entries: {e}")
+
+    @track_db_query
+    def update_outbox_entry(self, key: str, claim_token: str, update_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Updates an outbox entry only while `claim_token` still holds it; None when it was taken over."""
+        encoded = self._encode("outbox", update_data)
+        assignments = [f"{column} = ?" for column in encoded] + ["updated_at = ?"]
+        try:
+            with self._lock:
+                cursor = self.conn.execute(
+                    f"UPDATE outbox SET {', '.join(assignments)} WHERE idempotency_key = ? AND claim_token = ?",
+                    list(encoded.values()) + [_now(), key, claim_token]
+                )
+                if cursor.rowcount == 0:
+                    return None
+                return self._select("outbox", "idempotency_key = ?", (key,))[0]
+        except sqlite3.Error as e:
+            logger.error(f"Error updating outbox entry {key}: {e}")
+            raise SupabaseClientError(f"Error updating outbox entry: {e}")
+
+    # --- Send slots ---
+
+    @track_db_query
+    def reserve_send_slot(self, bucket: int, slot_date: str, daily_limit: int) -> str:
+        """
+        Reserves a send slot bucket for every process sharing the database: 'reserved',
+        'taken' when another process holds it, or 'day_full' when `slot_date` already
+        has `daily_limit` slots. Count and insert run in one write transaction.
+        """
+        now = _now()
+        try:
+            with self._lock:
+                self.conn.execute("BEGIN IMMEDIATE")
+                try:
+                    count = self.conn.execute(
+                        "SELECT COUNT(*) FROM send_slots WHERE slot_date = ?", (slot_date,)
+                    ).fetchone()[0]
+                    if count >= daily_limit:
+                        outcome = "day_full"
+                    else:
+                        cursor = self.conn.execute(
+                            "INSERT INTO send_slots (bucket, slot_date, created_at, updated_at) VALUES (?, ?, ?, ?) "
+                            "ON CONFLICT(bucket) DO NOTHING",
+                            (bucket, slot_date, now, now)
+                        )
+                        outcome = "reserved" if cursor.rowcount else "taken"
+                    self.conn.execute("COMMIT")
+                except Exception:
+                    self.conn.execute("ROLLBACK")
+                    raise
+            return outcome
+        except sqlite3.Error as e:
+            logger.error(f"Error reserving send slot {bucket}: {e}")
+            raise SupabaseClientError(f"Error reserving send slot: {e}")
+
+    @track_db_query
+    def get_send_slots_page(self, after_bucket: int = 0, limit: int = 1000) -> List[Dict[str, Any]]:
+        """Returns one page of reserved send slots with a bucket above `after_bucket`, in bucket order."""
+        try:
+            rows = self._select("send_slots", "bucket > ?", (after_bucket,), "bucket", limit)
+        except sqlite3.Error as e:
+            logger.error(f"Error fetching send slots after {after_bucket}: {e}")
+            raise SupabaseClientError(f"Error fetching send slots: {e}")
+        return [{"bucket": row["bucket"], "slot_date": row["slot_date"]} for row in rows]
@@ -0,0 +1,62 @@
+import json
+import logging
+from typing import Any, AsyncIterator, Dict, Iterator, Union
+
+from fastapi.responses import StreamingResponse
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Supported progress stream formats and their media types
+STREAM_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "sse": "text/event-stream",
+}
+STREAM_FORMAT_PATTERN = "^(ndjson|sse)$"
+
+Events = Union[Iterator[Dict[str, Any]], AsyncIterator[Dict[str, Any]]]
+
+
+def encode_event(event: Dict[str, Any], format: str = "ndjson") -> str:
+    """
+    Encodes one event as an NDJSON line or a Server-Sent Event.
+    The event's 'type' becomes the SSE event name.
+    """
+    data = json.dumps(event, default=str)
+    if format == "sse":
+        return f"event: {event.get('type', 'message')}\ndata: {data}\n\n"
+    return data + "\n"
+
+
+def stream_events(events: Events, format: str = "ndjson") -> StreamingResponse:
+    """
+    Streams progress events to the client as they are produced.
+
+    `events` may be a sync iterator (run in the threadpool, so blocking database
+    calls are fine) or an async iterator. An exception raised mid-stream can no
+    longer change the status code, so it is reported as a final 'error' event.
+    """
+    if hasattr(events, "__aiter__"):
+        async def body():
+            try:
+                async for event in events:
+                    yield encode_event(event, format)
+            except Exception as e:
+                logger.error(f"Progress stream aborted: {e}")
+                yield encode_event({"type": "error", "error": str(e)}, format)
+    else:
+        def body():
+            try:
+                for event in events:
+                    yield encode_event(event, format)
+            except Exception as e:
+                logger.error(f"Progress stream aborted: {e}")
+                yield encode_event({"type": "error", "error": str(e)}, format)
+
+    return StreamingResponse(
+        body(),
+        media_type=STREAM_MEDIA_TYPES[format],
+        # Keep proxies from buffering the stream until it ends
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,8 +1,13 @@
 import logging
 import os
-from typing import Any, Dict, List, Optional
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
 from dotenv import load_dotenv
-from supabase import Client, create_client
+
+from services.metrics import track_db_query
+
+if TYPE_CHECKING:
+    from supabase import Client
 
 # Load environment variables from .env file
 load_dotenv()
@@ -12,6 +17,11 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+def _touched(update_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Update data stamped with updated_at, which get_table_version relies on."""
+    return {**update_data, 'updated_at': datetime.now(timezone.utc).isoformat()}
+
+
 class SupabaseClientError(Exception):
     """Custom exception for Supabase client errors."""
     pass
@@ -35,12 +45,15 @@ class SupabaseClient:
             raise ValueError("Supabase credentials not found in environment variables.")
 
         try:
-            self.client: Client = create_client(supabase_url, supabase_key)
+            # Imported lazily: the supabase SDK pulls in httpx, postgrest and realtime
+            from supabase import create_client
+            self.client: "Client" = create_client(supabase_url, supabase_key)
             logger.info("Supabase client initialized successfully.")
         except Exception as e:
             logger.error(f"Failed to initialize Supabase client: {e}")
             raise SupabaseClientError(f"Failed to initialize Supabase client: {e}")
 
+    @track_db_query
     def get_lead(self, lead_id: str) -> Optional[Dict[str, Any]]:
         """
         Fetches a single lead by its ID.
@@ -53,6 +66,7 @@ class SupabaseClient:
             logger.error(f"Error fetching lead with ID {lead_id}: {e}")
             raise SupabaseClientError(f"Error fetching lead: {e}")
 
+    @track_db_query
     def get_campaign(self, campaign_id: str) -> Optional[Dict[str, Any]]:
         """
         Fetches a single campaign by its ID.
@@ -65,6 +79,7 @@ class SupabaseClient:
             logger.error(f"Error fetching campaign with ID {campaign_id}: {e}")
             raise SupabaseClientError(f"Error fetching campaign: {e}")
 
+    @track_db_query
     def log_email_activity(self, email_log: Dict[str, Any]) -> str:
         """
         Logs a generated or sent email to the database.
@@ -82,13 +97,29 @@ class SupabaseClient:
             logger.error(f"Error logging email activity for lead {email_log.get('lead_id')}: {e}")
             raise SupabaseClientError(f"Error logging email activity: {e}")
 
+    @track_db_query
+    def bulk_insert_email_logs(self, email_logs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Inserts several email logs in a single request.
+        Returns the inserted rows in the same order as `email_logs`.
+        """
+        try:
+            response = self.client.table('emails').insert(email_logs).execute()
+            if not response.data:
+                raise SupabaseClientError("Bulk email log insert failed, no data returned.")
+            return response.data
+        except Exception as e:
+            logger.error(f"Error during bulk email log insert of {len(email_logs)} rows: {e}")
+            raise SupabaseClientError(f"Error during bulk email log insert: {e}")
+
+    @track_db_query
     def update_email_status(self, email_id: str, update_data: Dict[str, Any]) -> Dict[str, Any]:
         """
         Updates the status or other details of an email log by its ID.
         Assumes your table is named 'emails'.
         """
         try:
-            response = self.client.table('emails').update(update_data).eq('id', email_id).execute()
+            response = self.client.table('emails').update(_touched(update_data)).eq('id', email_id).execute()
             if not response.data:
                 raise SupabaseClientError(f"Failed to update email log ID {email_id}, no data returned.")
             return response.data[0]
@@ -96,6 +127,22 @@ class SupabaseClient:
             logger.error(f"Error updating email status for email ID {email_id}: {e}")
             raise SupabaseClientError(f"Error updating email status: {e}")
 
+    @track_db_query
+    def bulk_update_email_status(self, email_ids: List[Any], update_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Applies the same update to several email logs in one request.
+        Returns the updated rows; IDs without a row are skipped.
+        """
+        if not email_ids:
+            return []
+        try:
+            response = self.client.table('emails').update(_touched(update_data)).in_('id', email_ids).execute()
+            return response.data
+        except Exception as e:
+            logger.error(f"Error updating {len(email_ids)} email logs: {e}")
+            raise SupabaseClientError(f"Error updating email logs: {e}")
+
+    @track_db_query
     def get_email_status(self, email_id: str) -> Optional[Dict[str, Any]]:
         """
         Retrieves the full record for a single email by its ID.
@@ -103,6 +150,7 @@ class SupabaseClient:
         """
         return self.client.table('emails').select('*').eq('id', email_id).single().execute().data
 
+    @track_db_query
     def get_campaign_emails(self, campaign_id: str, skip: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
         """
         Retrieves all emails associated with a specific campaign, with pagination.
@@ -114,6 +162,23 @@ class SupabaseClient:
             logger.error(f"Error fetching emails for campaign {campaign_id}: {e}")
             raise SupabaseClientError(f"Error fetching campaign emails: {e}")
 
+    @track_db_query
+    def get_campaign_emails_page(self, campaign_id: str, after_id: int = 0, limit: int = 1000) -> List[Dict[str, Any]]:
+        """
+        Retrieves one page of a campaign's emails in ascending ID order, starting after `after_id`.
+        Keyset paging keeps deep pages as cheap as the first for exports.
+        """
+        try:
+            response = (
+                self.client.table('emails').select('*').eq('campaign_id', campaign_id).gt('id', after_id)
+                .order('id').limit(limit).execute()
+            )
+            return response.data
+        except Exception as e:
+            logger.error(f"Error fetching emails for campaign {campaign_id} after {after_id}: {e}")
+            raise SupabaseClientError(f"Error fetching campaign emails: {e}")
+
+    @track_db_query
     def get_lead_emails(self, lead_id: str) -> List[Dict[str, Any]]:
         """
         Retrieves all emails sent to a specific lead.
@@ -127,6 +192,7 @@ class SupabaseClient:
 
     # --- Template Management ---
 
+    @track_db_query
     def create_email_template(self, template_data: Dict[str, Any]) -> str:
         """
         Creates a new email template in the database.
@@ -141,6 +207,7 @@ class SupabaseClient:
             logger.error(f"Error creating email template: {e}")
             raise SupabaseClientError(f"Error creating template: {e}")
 
+    @track_db_query
     def get_email_templates(self) -> List[Dict[str, Any]]:
         """
         Retrieves all email templates from the database.
@@ -152,6 +219,19 @@ class SupabaseClient:
             logger.error(f"Error fetching email templates: {e}")
             raise SupabaseClientError(f"Error fetching templates: {e}")
         
+    @track_db_query
+    def get_email_template(self, template_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Fetches a single email template by its ID.
+        """
+        try:
+            response = self.client.table('templates').select('*').eq('id', template_id).single().execute()
+            return response.data
+        except Exception as e:
+            logger.error(f"Error fetching template with ID {template_id}: {e}")
+            raise SupabaseClientError(f"Error fetching template: {e}")
+
+    @track_db_query
     def get_latest_email_for_lead_campaign(self, lead_id: str, campaign_id: str) -> Optional[Dict[str, Any]]:
         """
         Fetches the most recent email log for a specific lead-campaign combination.
@@ -177,6 +257,25 @@ class SupabaseClient:
         
 
         
+    @track_db_query
+    def get_email_by_thread_id(self, thread_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Fetches the most recent email log sent in a Gmail thread, or None.
+        Replies, bounces and auto-replies land in the thread of the email they answer.
+        """
+        try:
+            response = self.client.table('emails') \
+                .select('*') \
+                .eq('gmail_thread_id', thread_id) \
+                .order('created_at', desc=True) \
+                .limit(1) \
+                .execute()
+            return response.data[0] if response.data else None
+        except Exception as e:
+            logger.error(f"Error fetching email for thread {thread_id}: {e}")
+            raise SupabaseClientError(f"Error fetching email by thread: {e}")
+
+    @track_db_query
     def get_all_leads(self) -> List[Dict[str, Any]]:
         """
         Retrieves all leads from the database, ordered by creation date.
@@ -188,6 +287,38 @@ class SupabaseClient:
             logger.error(f"Error fetching all leads: {e}")
             raise SupabaseClientError(f"Error fetching all leads: {e}")
 
+    @track_db_query
+    def get_leads_by_ids(self, lead_ids: List[str]) -> List[Dict[str, Any]]:
+        """
+        Retrieves several leads by ID in a single query.
+        Missing IDs are simply absent from the result.
+        """
+        if not lead_ids:
+            return []
+        try:
+            response = self.client.table('leads').select('*').in_('id', lead_ids).execute()
+            return response.data
+        except Exception as e:
+            logger.error(f"Error fetching {len(lead_ids)} leads by ID: {e}")
+            raise SupabaseClientError(f"Error fetching leads by ID: {e}")
+
+    @track_db_query
+    def get_leads_page(self, after_id: int = 0, limit: int = 1000, status: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Retrieves one page of leads in ascending ID order, starting after `after_id`,
+        optionally filtered by status.
+        """
+        try:
+            query = self.client.table('leads').select('*').gt('id', after_id)
+            if status:
+                query = query.eq('status', status)
+            response = query.order('id').limit(limit).execute()
+            return response.data
+        except Exception as e:
+            logger.error(f"Error fetching leads after {after_id}: {e}")
+            raise SupabaseClientError(f"Error fetching leads: {e}")
+
+    @track_db_query
     def get_leads_by_status(self, status: str) -> List[Dict[str, Any]]:
         """
         Retrieves all leads that match a given status.
@@ -199,6 +330,33 @@ class SupabaseClient:
             logger.error(f"Error fetching leads with status {status}: {e}")
             raise SupabaseClientError(f"Error fetching leads by status: {e}")
 
+    @track_db_query
+    def get_lead_by_email(self, email: str) -> Optional[Dict[str, Any]]:
+        """
+        Fetches the lead with the given email address (case-insensitive), or None.
+        """
+        # Escape LIKE wildcards; '_' is common in addresses
+        pattern = email.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        try:
+            response = self.client.table('leads').select('*').ilike('email', pattern).limit(1).execute()
+            return response.data[0] if response.data else None
+        except Exception as e:
+            logger.error(f"Error fetching lead with email {email}: {e}")
+            raise SupabaseClientError(f"Error fetching lead by email: {e}")
+
+    @track_db_query
+    def update_lead(self, lead_id: str, update_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Updates a lead, e.g. its status. Returns the updated row, or None if it does not exist.
+        """
+        try:
+            response = self.client.table('leads').update(_touched(update_data)).eq('id', lead_id).execute()
+            return response.data[0] if response.data else None
+        except Exception as e:
+            logger.error(f"Error updating lead {lead_id}: {e}")
+            raise SupabaseClientError(f"Error updating lead: {e}")
+
+    @track_db_query
     def bulk_insert_leads(self, leads_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """
         Inserts a list of leads into the database in a single transaction.
@@ -218,6 +376,7 @@ class SupabaseClient:
 
     # Add these methods inside the SupabaseClient class
 
+    @track_db_query
     def create_campaign(self, campaign_data: Dict[str, Any]) -> Dict[str, Any]:
         """
         Creates a new campaign in the database.
@@ -232,6 +391,7 @@ class SupabaseClient:
             logger.error(f"Error creating campaign: {e}")
             raise SupabaseClientError(f"Error creating campaign: {e}")
 
+    @track_db_query
     def get_all_campaigns(self) -> List[Dict[str, Any]]:
         """
         Retrieves all campaigns from the database.
@@ -243,16 +403,287 @@ class SupabaseClient:
             logger.error(f"Error fetching all campaigns: {e}")
             raise SupabaseClientError(f"Error fetching all campaigns: {e}")
 
+    @track_db_query
     def update_campaign(self, campaign_id: int, update_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """
         Updates an existing campaign by its ID.
         """
         try:
-            response = self.client.table('campaigns').update(update_data).eq('id', campaign_id).execute()
+            response = self.client.table('campaigns').update(_touched(update_data)).eq('id', campaign_id).execute()
             if not response.data:
                 return None
             return response.data[0]
         except Exception as e:
             logger.error(f"Error updating campaign {campaign_id}: {e}")
             raise SupabaseClientError(f"Error updating campaign: {e}")
-    
\ No newline at end of file
+
+    @track_db_query
+    def delete_campaign(self, campaign_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Deletes a campaign by its ID, returning the deleted row.
+        Associated emails are removed by the 'ON DELETE CASCADE' constraint.
+        """
+        try:
+            response = self.client.table('campaigns').delete().eq('id', campaign_id).execute()
+            if not response.data:
+                return None
+            return response.data[0]
+        except Exception as e:
+            logger.error(f"Error deleting campaign {campaign_id}: {e}")
+            raise SupabaseClientError(f"Error deleting campaign: {e}")
+
+    @track_db_query
+    def get_table_version(self, table: str, filters: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        """
+        Returns a cheap version token for the rows of `table` matching `filters`
+        (equality on each column): their count and latest updated_at, fetched in
+        one request that returns at most one row. Relies on updated_at being set
+        on every update, which the update methods of this client do, and on the
+        column defaulting to now() for inserts. Returns None when the table has
+        no updated_at column.
+        """
+        try:
+            query = self.client.table(table).select('updated_at', count='exact')
+            for column, value in (filters or {}).items():
+                query = query.eq(column, value)
+            # NULLS LAST: Postgres sorts NULLs first when descending, which would hide real updates
+            response = query.order('updated_at', desc=True, nullsfirst=False).limit(1).execute()
+            latest = response.data[0]['updated_at'] if response.data else None
+            return f"{response.count}:{latest}"
+        except Exception as e:
+            logger.warning(f"Could not read the version of table {table}: {e}")
+            return None
+
+    @track_db_query
+    def select_lead_ids(self, statuses: Optional[List[str]] = None, tags: Optional[List[str]] = None,
+                        after_id: int = 0, limit: int = 500, exclude_campaign_id: Optional[str] = None) -> List[int]:
+        """
+        Returns one page of lead IDs matching a selector, in ascending ID order.
+        Leads must have one of `statuses` and all of `tags` (custom_data.tags);
+        with `exclude_campaign_id`, leads that already have an email in that
+        campaign are left out by an anti-join in the database.
+        Pass the last ID of a page as `after_id` to fetch the next one.
+        """
+        try:
+            columns = 'id, emails!left(id)' if exclude_campaign_id is not None else 'id'
+            query = self.client.table('leads').select(columns).gt('id', after_id)
+            if statuses:
+                query = query.in_('status', statuses)
+            if tags:
+                query = query.contains('custom_data', {'tags': tags})
+            if exclude_campaign_id is not None:
+                query = query.eq('emails.campaign_id', exclude_campaign_id).is_('emails', 'null')
+            response = query.order('id').limit(limit).execute()
+            return [row['id'] for row in response.data]
+        except Exception as e:
+            logger.error(f"Error selecting lead IDs after {after_id}: {e}")
+            raise SupabaseClientError(f"Error selecting lead IDs: {e}")
+
+    @track_db_query
+    def count_contacted_leads(self, campaign_id: str, statuses: Optional[List[str]] = None,
+                              tags: Optional[List[str]] = None) -> int:
+        """
+        Counts the leads matching a selector (as in select_lead_ids) that already
+        have an email in the campaign. Only the count is returned, not the rows.
+        """
+        try:
+            query = (
+                self.client.table('leads').select('id, emails!inner(id)', count='exact')
+                .eq('emails.campaign_id', campaign_id)
+            )
+            if statuses:
+                query = query.in_('status', statuses)
+            if tags:
+                query = query.contains('custom_data', {'tags': tags})
+            return query.limit(1).execute().count or 0
+        except Exception as e:
+            logger.error(f"Error counting contacted leads for campaign {campaign_id}: {e}")
+            raise SupabaseClientError(f"Error counting contacted leads: {e}")
+
+    @track_db_query
+    def add_suppressions(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Appends rows to the 'suppressions' log (email or domain, reason, active, note).
+        Rows are never updated: a later row for the same email or domain overrides earlier ones.
+        """
+        if not rows:
+            return []
+        try:
+            response = self.client.table('suppressions').insert(rows).execute()
+            return response.data
+        except Exception as e:
+            logger.error(f"Error adding {len(rows)} suppressions: {e}")
+            raise SupabaseClientError(f"Error adding suppressions: {e}")
+
+    @track_db_query
+    def get_suppressions_page(self, after_id: int = 0, limit: int = 5000) -> List[Dict[str, Any]]:
+        """
+        Retrieves one page of suppression rows in ascending ID order, starting after `after_id`.
+        """
+        try:
+            response = self.client.table('suppressions').select('*').gt('id', after_id).order('id').limit(limit).execute()
+            return response.data
+        except Exception as e:
+            logger.error(f"Error fetching suppressions after {after_id}: {e}")
+            raise SupabaseClientError(f"Error fetching suppressions: {e}")
+
+    @track_db_query
+    def get_latest_suppression(self, email: str = None, domain: str = None) -> Optional[Dict[str, Any]]:
+        """
+        Fetches the most recent suppression row for an email or a domain, or None.
+        """
+        column, value = ('email', email) if email else ('domain', domain)
+        try:
+            response = self.client.table('suppressions').select('*').eq(column, value) \
+                .order('id', desc=True).limit(1).execute()
+            return response.data[0] if response.data else None
+        except Exception as e:
+            logger.error(f"Error fetching suppression for {value}: {e}")
+            raise SupabaseClientError(f"Error fetching suppression: {e}")
+
+    @track_db_query
+    def claim_outbox_entries(self, entries: List[Dict[str, Any]], stale_before: str) -> List[Dict[str, Any]]:
+        """
+        Atomically claims the 'outbox' entries for the entries' idempotency keys: inserts
+        them, or takes over existing entries that failed or whose pending claim is older
+        than `stale_before`. The entries share one claim token and claim time. Returns the
+        claimed rows; keys that are missing were sent or claimed by another sender.
+        Requires a unique constraint on outbox.idempotency_key.
+        """
+        if not entries:
+            return []
+        takeover = {
+            'status': entries[0]['status'],
+            'claim_token': entries[0]['claim_token'],
+            'claimed_at': entries[0]['claimed_at'],
+            'error_message': None,
+        }
+        try:
+            response = self.client.table('outbox') \
+                .upsert(entries, on_conflict='idempotency_key', ignore_duplicates=True).execute()
+            claimed = list(response.data)
+            # Each conditional update locks its rows, so only one concurrent takeover matches
+            for status_filter in ('failed', 'stale'):
+                taken = {row['idempotency_key'] for row in claimed}
+                remaining = [entry['idempotency_key'] for entry in entries if entry['idempotency_key'] not in taken]
+                if not remaining:
+                    break
+                query = self.client.table('outbox').update(takeover).in_('idempotency_key', remaining)
+                if status_filter == 'failed':
+                    query = query.eq('status', 'failed')
+                else:
+                    query = query.eq('status', 'pending').lt('claimed_at', stale_before)
+                claimed.extend(query.execute().data)
+            return claimed
+        except Exception as e:
+            logger.error(f"Error claiming {len(entries)} outbox entries: {e}")
+            raise SupabaseClientError(f"Error claiming outbox entries: {e}")
+
+    @track_db_query
+    def get_outbox_entries(self, keys: List[str]) -> List[Dict[str, Any]]:
+        """
+        Fetches the outbox entries for a list of idempotency keys.
+        """
+        if not keys:
+            return []
+        try:
+            response = self.client.table('outbox').select('*').in_('idempotency_key', keys).execute()
+            return response.data
+        except Exception as e:
+            logger.error(f"Error fetching {len(keys)} outbox entries: {e}")
+            raise SupabaseClientError(f"Error fetching outbox entries: {e}")
+
+    @track_db_query
+    def renew_outbox_entries(self, keys: List[str], claim_token: str, claimed_at: str) -> List[Dict[str, Any]]:
+        """
+        Moves the claim time of pending outbox entries still held by `claim_token` to
+        `claimed_at`. Returns the renewed rows; missing keys were taken over.
+        """
+        if not keys:
+            return []
+        try:
+            response = self.client.table('outbox').update({'claimed_at': claimed_at}) \
+                .in_('idempotency_key', keys).eq('claim_token', claim_token).eq('status', 'pending').execute()
+            return response.data
+        except Exception as e:
+            logger.error(f"Error renewing {len(keys)} outbox entries: {e}")
+            raise SupabaseClientError(f"Error renewing outbox entries: {e}")
+
+    @track_db_query
+    def update_outbox_entries(self, updates: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Applies several outbox entry updates, each holding its idempotency_key and
+        claim_token, to the entries that token still holds. PostgREST has no conditional
+        bulk update, so the entries are read and the held ones written back merged in one
+        upsert. A takeover needs a claim older than the outbox claim TTL, far longer than
+        the gap between the two requests. Returns the updated rows.
+        """
+        if not updates:
+            return []
+        try:
+            keys = [update['idempotency_key'] for update in updates]
+            current = {
+                row['idempotency_key']: row
+                for row in self.client.table('outbox').select('*').in_('idempotency_key', keys).execute().data
+            }
+            rows = [
+                {**current[update['idempotency_key']], **update} for update in updates
+                if current.get(update['idempotency_key'], {}).get('claim_token') == update['claim_token']
+            ]
+            if not rows:
+                return []
+            response = self.client.table('outbox').upsert(rows, on_conflict='idempotency_key').execute()
+            return response.data
+        except Exception as e:
+            logger.error(f"Error updating {len(updates)} outbox entries: {e}")
+            raise SupabaseClientError(f"Error updating outbox entries: {e}")
+
+    @track_db_query
+    def update_outbox_entry(self, key: str, claim_token: str, update_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Updates an outbox entry only while `claim_token` still holds it.
+        Returns the updated row, or None when the claim was taken over.
+        """
+        try:
+            response = self.client.table('outbox').update(update_data) \
+                .eq('idempotency_key', key).eq('claim_token', claim_token).execute()
+            return response.data[0] if response.data else None
+        except Exception as e:
+            logger.error(f"Error updating outbox entry {key}: {e}")
+            raise SupabaseClientError(f"Error updating outbox entry: {e}")
+
+    @track_db_query
+    def reserve_send_slot(self, bucket: int, slot_date: str, daily_limit: int) -> str:
+        """
+        Reserves a send slot bucket for every worker sharing the mailbox. Returns
+        'reserved', 'taken' when another worker holds the bucket, or 'day_full' when
+        the UTC day `slot_date` already has `daily_limit` slots. The day count and the
+        insert are two requests, so concurrent reservations may overshoot the limit
+        by a few. Requires a 'send_slots' table with a unique bucket column.
+        """
+        try:
+            counted = self.client.table('send_slots').select('bucket', count='exact') \
+                .eq('slot_date', slot_date).limit(1).execute()
+            if (counted.count or 0) >= daily_limit:
+                return 'day_full'
+            response = self.client.table('send_slots') \
+                .upsert({'bucket': bucket, 'slot_date': slot_date}, on_conflict='bucket', ignore_duplicates=True) \
+                .execute()
+            return 'reserved' if response.data else 'taken'
+        except Exception as e:
+            logger.error(f"Error reserving send slot {bucket}: {e}")
+            raise SupabaseClientError(f"Error reserving send slot: {e}")
+
+    @track_db_query
+    def get_send_slots_page(self, after_bucket: int = 0, limit: int = 1000) -> List[Dict[str, Any]]:
+        """
+        Returns one page of reserved send slots (bucket, slot_date) with a bucket
+        above `after_bucket`, in bucket order. Pass the last bucket of a page to get the next.
+        """
+        try:
+            response = self.client.table('send_slots').select('bucket, slot_date') \
+                .gt('bucket', after_bucket).order('bucket').limit(limit).execute()
+            return response.data
+        except Exception as e:
+            logger.error(f"Error fetching send slots after {after_bucket}: {e}")
+            raise SupabaseClientError(f"Error fetching send slots: {e}")
@@ -0,0 +1,280 @@
+import hashlib
+import logging
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Why an address or domain must not be emailed
+SUPPRESSION_REASONS = ("unsubscribe", "bounce", "manual")
+SUPPRESSION_REASON_PATTERN = "^(unsubscribe|bounce|manual)$"
+# Lead statuses loaded as suppressions, for leads marked before the suppression list existed
+LEAD_STATUS_REASONS = {"unsubscribed": "unsubscribe", "bounced": "bounce"}
+
+
+def normalize_email(email: str) -> str:
+    return (email or "").strip().lower()
+
+
+def normalize_domain(domain: str) -> str:
+    return (domain or "").strip().lower().lstrip("@").rstrip(".")
+
+
+class BloomFilter:
+    """
+    A fixed-size Bloom filter over strings. Membership tests have no false
+    negatives and a false positive rate of about `error_rate` at `capacity` items.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        capacity = max(capacity, 1)
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str) -> Iterable[int]:
+        # Double hashing: k positions from the two halves of one 128-bit digest
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, item: str):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class SuppressionIndex:
+    """
+    In-memory index of addresses and domains that must never be emailed.
+
+    The database keeps suppressions as an append-only log of events (a row
+    suppresses an email or a domain, or lifts it with active=False), so the
+    index refreshes incrementally by reading only the rows after the last ID
+    it has seen. Checks are set lookups: the address, then its domain and
+    parent domains.
+
+    Above `bloom_threshold` suppressed addresses, they are held in a Bloom
+    filter instead of a set; a hit is then confirmed with an exact database
+    lookup (cached), so memory stays small without false suppressions.
+    """
+
+    def __init__(self, db_client, refresh_interval: float = 30.0, bloom_threshold: int = 1_000_000,
+                 page_size: int = 5000, confirm_cache_size: int = 10000):
+        """
+        Args:
+            db_client: An instance of SupabaseClient.
+            refresh_interval: Seconds after which a check first pulls new rows from the database.
+            bloom_threshold: Number of suppressed addresses above which a Bloom filter is used.
+            page_size: Rows fetched per query while loading.
+            confirm_cache_size: Exact lookups remembered in Bloom filter mode.
+        """
+        self.db = db_client
+        self.refresh_interval = refresh_interval
+        self.bloom_threshold = bloom_threshold
+        self.page_size = page_size
+        self.confirm_cache_size = confirm_cache_size
+        self._emails: Dict[str, str] = {}
+        self._bloom: Optional[BloomFilter] = None
+        self._confirmed: "OrderedDict[str, Optional[str]]" = OrderedDict()
+        self._domains: Dict[str, str] = {}
+        self._after_id = 0
+        self._refreshed_at = 0.0
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, db_client) -> "SuppressionIndex":
+        """
+        Builds and loads an index configured by SUPPRESSION_REFRESH_SECONDS (default 30)
+        and SUPPRESSION_BLOOM_THRESHOLD (default 1000000).
+        """
+        index = cls(
+            db_client,
+            refresh_interval=float(os.getenv("SUPPRESSION_REFRESH_SECONDS", "30")),
+            bloom_threshold=int(os.getenv("SUPPRESSION_BLOOM_THRESHOLD", "1000000")),
+        )
+        index.load()
+        return index
+
+    # --- Loading ---
+
+    def load(self):
+        """Builds the index from the whole suppression log and the leads' statuses."""
+        rows: List[Dict[str, Any]] = []
+        after_id = 0
+        while True:
+            page = self.db.get_suppressions_page(after_id=after_id, limit=self.page_size)
+            rows.extend(page)
+            if len(page) < self.page_size:
+                break
+            after_id = page[-1]["id"]
+
+        emails: Dict[str, str] = {}
+        domains: Dict[str, str] = {}
+        for status, reason in LEAD_STATUS_REASONS.items():
+            for lead in self.db.get_leads_by_status(status):
+                if lead.get("email"):
+                    emails[normalize_email(lead["email"])] = reason
+        for row in rows:
+            self._apply_row(row, emails, domains, None)
+
+        bloom = None
+        address_count = len(emails)
+        if address_count > self.bloom_threshold:
+            bloom = BloomFilter(len(emails) * 2)
+            for email in emails:
+                bloom.add(email)
+            emails = {}
+        with self._lock:
+            self._emails, self._domains, self._bloom = emails, domains, bloom
+            self._confirmed.clear()
+            self._after_id = rows[-1]["id"] if rows else 0
+            self._refreshed_at = time.monotonic()
+        logger.info(
+            f"Loaded suppression index: {len(domains)} domains, "
+            + f"{address_count} addresses" + (" in a Bloom filter" if bloom else "")
+        )
+
+    def refresh(self):
+        """Applies the suppression rows added since the last load or refresh."""
+        with self._refresh_lock:
+            self._refresh_locked()
+
+    def _refresh_locked(self):
+        try:
+            while True:
+                page = self.db.get_suppressions_page(after_id=self._after_id, limit=self.page_size)
+                with self._lock:
+                    for row in page:
+                        self._apply_row(row, self._emails, self._domains, self._bloom)
+                    if page:
+                        self._after_id = page[-1]["id"]
+                if len(page) < self.page_size:
+                    break
+        finally:
+            self._refreshed_at = time.monotonic()
+
+    def _apply_row(self, row: Dict[str, Any], emails: Dict[str, str], domains: Dict[str, str],
+                   bloom: Optional[BloomFilter]):
+        active = row.get("active", True) not in (False, 0, "false")
+        if row.get("domain"):
+            target, key = domains, normalize_domain(row["domain"])
+        elif row.get("email"):
+            target, key = emails, normalize_email(row["email"])
+        else:
+            return
+        if bloom is not None and target is emails:
+            if active:
+                bloom.add(key)
+            self._confirmed.pop(key, None)
+        elif active:
+            target[key] = row.get("reason") or "manual"
+        else:
+            target.pop(key, None)
+
+    def _maybe_refresh(self):
+        if time.monotonic() - self._refreshed_at < self.refresh_interval:
+            return
+        # One caller refreshes; the others keep using the current index meanwhile
+        if not self._refresh_lock.acquire(blocking=False):
+            return
+        try:
+            self._refresh_locked()
+        except Exception as e:
+            logger.error(f"Failed to refresh the suppression index: {e}")
+        finally:
+            self._refresh_lock.release()
+
+    # --- Checks ---
+
+    def check(self, email: str) -> Optional[str]:
+        """Returns why `email` must not be contacted ('unsubscribe', 'bounce', 'manual'), or None."""
+        self._maybe_refresh()
+        email = normalize_email(email)
+        domain = email.rpartition("@")[2]
+        labels = domain.split(".")
+        for i in range(len(labels) - 1):
+            reason = self._domains.get(".".join(labels[i:]))
+            if reason:
+                return reason
+        if self._bloom is None:
+            return self._emails.get(email)
+        if email not in self._bloom:
+            return None
+        return self._confirm(email)
+
+    def _confirm(self, email: str) -> Optional[str]:
+        with self._lock:
+            if email in self._confirmed:
+                self._confirmed.move_to_end(email)
+                return self._confirmed[email]
+        row = self.db.get_latest_suppression(email=email)
+        reason = row.get("reason") if row and row.get("active", True) not in (False, 0, "false") else None
+        if row is None:
+            lead = self.db.get_lead_by_email(email)
+            reason = LEAD_STATUS_REASONS.get((lead or {}).get("status"))
+        with self._lock:
+            self._confirmed[email] = reason
+            while len(self._confirmed) > self.confirm_cache_size:
+                self._confirmed.popitem(last=False)
+        return reason
+
+    def is_suppressed(self, email: str) -> bool:
+        return self.check(email) is not None
+
+    def partition(self, leads: Iterable[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Tuple[Dict[str, Any], str]]]:
+        """Splits leads into those that may be emailed and (lead, reason) pairs of suppressed ones."""
+        allowed, suppressed = [], []
+        for lead in leads:
+            reason = self.check(lead.get("email") or "")
+            if reason:
+                suppressed.append((lead, reason))
+            else:
+                allowed.append(lead)
+        return allowed, suppressed
+
+    # --- Changes ---
+
+    def add(self, email: str = None, domain: str = None, reason: str = "manual", note: str = None) -> Dict[str, Any]:
+        """Suppresses an address or a whole domain, effective immediately in this process."""
+        return self._record(email, domain, reason, note, active=True)
+
+    def remove(self, email: str = None, domain: str = None, note: str = None) -> Dict[str, Any]:
+        """Lifts the suppression of an address or domain."""
+        return self._record(email, domain, "manual", note, active=False)
+
+    def _record(self, email: Optional[str], domain: Optional[str], reason: str, note: Optional[str],
+                active: bool) -> Dict[str, Any]:
+        if bool(email) == bool(domain):
+            raise ValueError("Exactly one of email or domain is required.")
+        if reason not in SUPPRESSION_REASONS:
+            raise ValueError(f"Unknown suppression reason '{reason}'.")
+        row = {
+            "email": normalize_email(email) if email else None,
+            "domain": normalize_domain(domain) if domain else None,
+            "reason": reason,
+            "active": active,
+            "note": note,
+        }
+        self.db.add_suppressions([row])
+        # Pick up this row (and any others written meanwhile) without waiting for the interval
+        self.refresh()
+        return row
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "addresses": None if self._bloom is not None else len(self._emails),
+            "domains": len(self._domains),
+            "bloom_filter": self._bloom is not None,
+            "bloom_filter_bytes": len(self._bloom.bits) if self._bloom is not None else 0,
+            "last_row_id": self._after_id,
+        }
@@ -0,0 +1,214 @@
+import logging
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class TemplateSyntaxError(ValueError):
+    """Raised when a stored template cannot be compiled."""
+    pass
+
+
+# Tokens: '{{' / '}}' escapes, '{% tag %}' blocks and '{name}' or '{name|fallback}' placeholders
+_TOKEN_RE = re.compile(
+    r"(?P<open_escape>\{\{)"
+    r"|(?P<close_escape>\}\})"
+    r"|\{%\s*(?P<tag>[^%]*?)\s*%\}"
+    r"|\{(?P<name>[A-Za-z_][A-Za-z0-9_]*)(?:\|(?P<fallback>[^{}]*))?\}"
+)
+_CONDITION_RE = re.compile(r"^(?P<negate>not\s+)?(?P<name>[A-Za-z_][A-Za-z0-9_]*)$")
+
+
+class CompiledTemplate:
+    """
+    A template compiled to a Python function.
+
+    Rendering is a single call into generated code: each placeholder is a
+    dictionary lookup and each conditional a truthiness check, so a render
+    costs a few microseconds.
+    """
+
+    def __init__(self, source: str, render_fn: Callable[[Dict[str, Any]], str], names: List[str]):
+        self.source = source
+        self.names = names
+        self._render = render_fn
+
+    def render(self, context: Dict[str, Any]) -> str:
+        return self._render(context)
+
+
+def compile_template(source: str) -> CompiledTemplate:
+    """
+    Compiles a template string.
+
+    Supported syntax:
+        {lead_name}                    value from the context, '' when missing
+        {lead_company|your team}       value with a fallback for missing or empty values
+        {% if lead_company %} ... {% elif lead_position %} ... {% else %} ... {% endif %}
+        {% if not lead_company %}      negated condition
+        {{ and }}                      literal braces
+    """
+    lines = ["def render(ctx):", "    get = ctx.get", "    out = []", "    append = out.append"]
+    constants: Dict[str, Any] = {}
+    names: List[str] = []
+    # Each open block records whether an 'else' has been seen
+    blocks: List[Dict[str, bool]] = []
+    position = 0
+
+    def indent() -> str:
+        return "    " * (len(blocks) + 1)
+
+    def emit_text(text: str):
+        if text:
+            key = f"_t{len(constants)}"
+            constants[key] = text
+            lines.append(f"{indent()}append({key})")
+
+    def condition(expr: str) -> str:
+        match = _CONDITION_RE.match(expr)
+        if not match:
+            raise TemplateSyntaxError(f"Invalid condition '{expr}'")
+        names.append(match.group("name"))
+        check = f"get({match.group('name')!r})"
+        return f"not {check}" if match.group("negate") else check
+
+    def emit_literal(text: str):
+        if "{%" in text:
+            raise TemplateSyntaxError("Unterminated template tag")
+        emit_text(text)
+
+    for match in _TOKEN_RE.finditer(source):
+        emit_literal(source[position:match.start()])
+        position = match.end()
+
+        if match.group("open_escape"):
+            emit_text("{")
+        elif match.group("close_escape"):
+            emit_text("}")
+        elif match.group("name"):
+            name = match.group("name")
+            names.append(name)
+            fallback = match.group("fallback")
+            if fallback is None:
+                lines.append(f"{indent()}value = get({name!r})")
+                lines.append(f"{indent()}append('' if value is None else str(value))")
+            else:
+                key = f"_t{len(constants)}"
+                constants[key] = fallback
+                lines.append(f"{indent()}value = get({name!r})")
+                lines.append(f"{indent()}append(str(value) if value not in (None, '') else {key})")
+        else:
+            tag = match.group("tag")
+            keyword, _, expr = tag.partition(" ")
+            expr = expr.strip()
+            if keyword == "if":
+                lines.append(f"{indent()}if {condition(expr)}:")
+                blocks.append({"else": False})
+                lines.append(f"{indent()}pass")
+            elif keyword == "elif":
+                if not blocks or blocks[-1]["else"]:
+                    raise TemplateSyntaxError("'elif' without a matching 'if'")
+                blocks.pop()
+                lines.append(f"{indent()}elif {condition(expr)}:")
+                blocks.append({"else": False})
+                lines.append(f"{indent()}pass")
+            elif keyword == "else" and not expr:
+                if not blocks or blocks[-1]["else"]:
+                    raise TemplateSyntaxError("'else' without a matching 'if'")
+                blocks.pop()
+                lines.append(f"{indent()}else:")
+                blocks.append({"else": True})
+                lines.append(f"{indent()}pass")
+            elif keyword == "endif" and not expr:
+                if not blocks:
+                    raise TemplateSyntaxError("'endif' without a matching 'if'")
+                blocks.pop()
+            else:
+                raise TemplateSyntaxError(f"Unknown template tag '{{% {tag} %}}'")
+
+    emit_literal(source[position:])
+    if blocks:
+        raise TemplateSyntaxError("Unclosed 'if' block")
+
+    lines.append("    return ''.join(out)")
+    namespace: Dict[str, Any] = dict(constants)
+    exec("\n".join(lines), namespace)
+    return CompiledTemplate(source, namespace["render"], sorted(set(names)))
+
+
+class TemplateEngine:
+    """
+    Renders stored email templates without calling the LLM.
+    Compiled templates are cached by template ID and source text, so an
+    edited template is recompiled on its next use.
+    """
+
+    def __init__(self, max_cached: int = 512):
+        self.max_cached = max_cached
+        self._cache: "OrderedDict[Tuple[Any, str], CompiledTemplate]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def compile(self, source: str, cache_key: Any = None) -> CompiledTemplate:
+        """Returns a compiled template, compiling only when the source is not cached."""
+        # Keyed on the source itself: str hashes are cached, so repeat lookups are O(1)
+        key = (cache_key, source)
+        with self._lock:
+            compiled = self._cache.get(key)
+            if compiled is not None:
+                self._cache.move_to_end(key)
+                return compiled
+
+        compiled = compile_template(source)
+        with self._lock:
+            self._cache[key] = compiled
+            while len(self._cache) > self.max_cached:
+                self._cache.popitem(last=False)
+        return compiled
+
+    def render_template(self, template: Dict[str, Any], context: Dict[str, Any]) -> Dict[str, str]:
+        """
+        Renders a stored template record for one lead.
+
+        Args:
+            template: A row from the 'templates' table with 'subject_template' and 'body_template'.
+            context: Placeholder values, e.g. lead_name, lead_company, campaign_objective.
+
+        Returns:
+            A dictionary with "subject" and "body" keys.
+        """
+        template_id = template.get("id")
+        subject = self.compile(template.get("subject_template") or "", (template_id, "subject"))
+        body = self.compile(template.get("body_template") or "", (template_id, "body"))
+        return {"subject": subject.render(context), "body": body.render(context)}
+
+
+def build_template_context(lead: Optional[Dict[str, Any]], campaign: Optional[Dict[str, Any]],
+                           custom_context: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Flattens a lead and campaign into the placeholder names templates use.
+    Keys from the lead's custom_data and the request's custom_context are
+    available under their own names.
+    """
+    lead = lead or {}
+    campaign = campaign or {}
+    context: Dict[str, Any] = {}
+    context.update(lead.get("custom_data") or {})
+    context.update(custom_context or {})
+    name = lead.get("name") or ""
+    context.update({
+        "lead_name": name,
+        "lead_first_name": name.split()[0] if name.strip() else "",
+        "lead_email": lead.get("email"),
+        "lead_company": lead.get("company"),
+        "lead_position": lead.get("position"),
+        "lead_linkedin": lead.get("linkedin_url") or lead.get("linkedin"),
+        "campaign_name": campaign.get("name"),
+        "campaign_objective": campaign.get("objective"),
+        "campaign_tone": campaign.get("tone", "professional"),
+    })
+    return context
@@ -9,7 +9,12 @@ import type {
   EmailGenerationRequest,
   EmailSendRequest,
   BulkEmailRequest,
-  EmailResponse
+  EmailResponse,
+  CampaignLaunchRequest,
+  CampaignLaunchStatus,
+  BulkSendResult,
+  BulkSendEvent,
+  CsvUploadEvent
 } from '../types'
 
 const api = axios.create({
@@ -32,6 +37,33 @@ api.interceptors.response.use(
   }
 )
 
+// Reads an NDJSON progress stream, calling onEvent as each event arrives.
+// Uses fetch rather than axios so the body can be read incrementally and
+// long operations are not cut off by the request timeout.
+async function streamNdjson<T>(url: string, init: RequestInit, onEvent: (event: T) => void): Promise<void> {
+  console.log(`API Stream: ${init.method ?? 'GET'} ${url}`)
+  const response = await fetch(`${api.defaults.baseURL}${url}`, init)
+  if (!response.ok || !response.body) {
+    const data = await response.json().catch(() => undefined)
+    // Same shape as axios errors, so callers can read error.response.data.detail
+    throw { response: { status: response.status, data } }
+  }
+
+  const reader = response.body.pipeThrough(new TextDecoderStream()).getReader()
+  let pending = ''
+  for (;;) {
+    const { value, done } = await reader.read()
+    if (done) break
+    pending += value
+    const lines = pending.split('\n')
+    pending = lines.pop() ?? ''
+    for (const line of lines) {
+      if (line.trim()) onEvent(JSON.parse(line))
+    }
+  }
+  if (pending.trim()) onEvent(JSON.parse(pending))
+}
+
 // Leads API
 export const leadsApi = {
   getAll: () => api.get<Lead[]>('/leads'),
@@ -45,6 +77,16 @@ export const leadsApi = {
       },
     })
   },
+  // Server-side streamed export; open the URL to download
+  exportUrl: (params: { format?: 'csv' | 'ndjson'; gzip?: boolean; status?: string } = {}) =>
+    `${api.defaults.baseURL}/leads/export?${new URLSearchParams(
+      Object.entries(params).filter(([, v]) => v !== undefined).map(([k, v]) => [k, String(v)])
+    )}`,
+  uploadCsvStream: (file: File, onEvent: (event: CsvUploadEvent) => void) => {
+    const formData = new FormData()
+    formData.append('file', file)
+    return streamNdjson('/leads/upload/csv/stream', { method: 'POST', body: formData }, onEvent)
+  },
 }
 
 // Campaigns API
@@ -58,6 +100,12 @@ export const campaignsApi = {
   delete: (id: string) => api.delete(`/campaigns/${id}`),
   getEmails: (id: string, skip = 0, limit = 100) => 
     api.get<{ success: boolean; emails: Email[]; count: number }>(`/campaigns/${id}/emails?skip=${skip}&limit=${limit}`),
+  emailsExportUrl: (id: string, format: 'csv' | 'ndjson' = 'csv', gzip = false) =>
+    `${api.defaults.baseURL}/campaigns/${id}/emails/export?format=${format}&gzip=${gzip}`,
+  launch: (id: string, data: CampaignLaunchRequest) =>
+    api.post<CampaignLaunchStatus>(`/campaigns/${id}/launch`, data),
+  getLaunch: (id: string, launchId: string) =>
+    api.get<CampaignLaunchStatus>(`/campaigns/${id}/launches/${launchId}`),
 }
 
 // Templates API
@@ -79,14 +127,14 @@ export const emailsApi = {
     api.post<{
       success: boolean
       message: string
-      results: Array<{
-        lead_id: string
-        success: boolean
-        email_id?: string
-        subject?: string
-        error?: string
-      }>
-    }>('/emails/bulk-send'),
+      results: BulkSendResult[]
+    }>('/emails/bulk-send', data),
+  bulkSendStream: (data: BulkEmailRequest, onEvent: (event: BulkSendEvent) => void) =>
+    streamNdjson('/emails/bulk-send/stream', {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify(data),
+    }, onEvent),
   getStatus: (id: string) => api.get<Email>(`/emails/status/${id}`),
   getLeadEmails: (leadId: string) => 
     api.get<{ success: boolean; emails: Email[]; count: number }>(`/emails/lead/${leadId}/emails`),
@@ -56,6 +56,8 @@ export function getStatusColor(status: string) {
     replied: 'badge-success',
     converted: 'badge-success',
     unsubscribed: 'badge-error',
+    bounced: 'badge-error',
+    ooo: 'badge-warning',
     
     // Email statuses
     generated: 'badge-gray',
@@ -63,6 +65,7 @@ export function getStatusColor(status: string) {
     delivered: 'badge-success',
     opened: 'badge-success',
     failed: 'badge-error',
+    cancelled: 'badge-gray',
   }
   
   return statusColors[status as keyof typeof statusColors] || 'badge-gray'
@@ -82,6 +85,8 @@ export function getStatusIcon(status: string) {
     replied: '💬',
     converted: '🎯',
     unsubscribed: '🚫',
+    bounced: '↩️',
+    ooo: '🏖️',
     
     // Email statuses
     generated: '📝',
@@ -90,6 +95,7 @@ export function getStatusIcon(status: string) {
     opened: '👀',
     replied: '💬',
     failed: '❌',
+    cancelled: '⏹️',
   }
   
   return statusIcons[status as keyof typeof statusIcons] || '❓'
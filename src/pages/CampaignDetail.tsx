@@ -11,18 +11,20 @@ import {
   UserGroupIcon,
   EyeIcon,
   ChatBubbleLeftRightIcon,
+  DocumentArrowDownIcon,
 } from '@heroicons/react/24/outline'
 import { campaignsApi, leadsApi, emailsApi } from '../lib/api'
 import LoadingSpinner from '../components/LoadingSpinner'
 import StatusBadge from '../components/StatusBadge'
 import { formatRelativeTime, formatPercentage } from '../lib/utils'
-import type { Campaign, Lead } from '../types'
+import type { Campaign, Lead, BulkEmailRequest, BulkSendSummary } from '../types'
 
 export default function CampaignDetail() {
   const { id } = useParams<{ id: string }>()
   const [selectedLeads, setSelectedLeads] = useState<string[]>([])
   const [isEditing, setIsEditing] = useState(false)
   const [editData, setEditData] = useState<Partial<Campaign>>({})
+  const [sendProgress, setSendProgress] = useState<{ processed: number; total: number } | null>(null)
   const queryClient = useQueryClient()
 
   const { data: campaign, isLoading: campaignLoading } = useQuery({
@@ -57,15 +59,40 @@ export default function CampaignDetail() {
   })
 
   const bulkSendMutation = useMutation({
-    mutationFn: emailsApi.bulkSend,
-    onSuccess: (response) => {
-      const successCount = response.data.results.filter(r => r.success).length
-      toast.success(`Successfully sent ${successCount} emails`)
+    mutationFn: async (data: BulkEmailRequest) => {
+      let summary: BulkSendSummary | undefined
+      setSendProgress({ processed: 0, total: data.lead_ids.length })
+      await emailsApi.bulkSendStream(data, (event) => {
+        if (event.type === 'result') {
+          setSendProgress({ processed: event.processed, total: event.total })
+        } else if (event.type === 'summary') {
+          summary = event
+        } else {
+          throw new Error(event.error)
+        }
+      })
+      return summary
+    },
+    onSuccess: (summary) => {
+      toast.success(`Successfully sent ${summary?.succeeded ?? 0} emails`)
       queryClient.invalidateQueries({ queryKey: ['campaign-emails', id] })
       setSelectedLeads([])
     },
     onError: (error: any) => {
-      toast.error(error.response?.data?.detail || 'Failed to send emails')
+      toast.error(error.response?.data?.detail || error.message || 'Failed to send emails')
+      queryClient.invalidateQueries({ queryKey: ['campaign-emails', id] })
+    },
+    onSettled: () => setSendProgress(null),
+  })
+
+  const launchMutation = useMutation({
+    mutationFn: () => campaignsApi.launch(id!, { selector: { statuses: ['new'] } }),
+    onSuccess: () => {
+      toast.success('Campaign launched; emails are being sent to new leads')
+      queryClient.invalidateQueries({ queryKey: ['campaign', id] })
+    },
+    onError: (error: any) => {
+      toast.error(error.response?.data?.detail || 'Failed to launch campaign')
     },
   })
 
@@ -95,6 +122,14 @@ export default function CampaignDetail() {
     }
   }
 
+  const handleLaunch = () => {
+    if (!id) return
+
+    if (window.confirm('Send this campaign to every new lead that has not been emailed in it yet?')) {
+      launchMutation.mutate()
+    }
+  }
+
   const toggleLeadSelection = (leadId: string) => {
     setSelectedLeads(prev =>
       prev.includes(leadId)
@@ -192,10 +227,16 @@ export default function CampaignDetail() {
               </button>
             </div>
           ) : (
-            <button onClick={handleEdit} className="btn-secondary">
-              <PencilIcon className="h-4 w-4 mr-2" />
-              Edit
-            </button>
+            <div className="flex space-x-2">
+              <a href={campaignsApi.emailsExportUrl(id!)} className="btn-secondary">
+                <DocumentArrowDownIcon className="h-4 w-4 mr-2" />
+                Export emails
+              </a>
+              <button onClick={handleEdit} className="btn-secondary">
+                <PencilIcon className="h-4 w-4 mr-2" />
+                Edit
+              </button>
+            </div>
           )}
         </div>
       </div>
@@ -310,7 +351,16 @@ export default function CampaignDetail() {
         <div className="card-header">
           <div className="flex items-center justify-between">
             <h3 className="text-lg font-medium text-gray-900">Send Emails to Leads</h3>
-            {selectedLeads.length > 0 && (
+            {selectedLeads.length === 0 ? (
+              <button
+                onClick={handleLaunch}
+                disabled={launchMutation.isPending}
+                className="btn-secondary"
+              >
+                <PlayIcon className="h-4 w-4 mr-2" />
+                Launch to all new leads
+              </button>
+            ) : (
               <button
                 onClick={handleBulkSend}
                 disabled={bulkSendMutation.isPending}
@@ -319,7 +369,7 @@ export default function CampaignDetail() {
                 {bulkSendMutation.isPending ? (
                   <>
                     <LoadingSpinner size="sm" className="mr-2" />
-                    Sending...
+                    Sending{sendProgress ? ` ${sendProgress.processed}/${sendProgress.total}` : ''}...
                   </>
                 ) : (
                   <>
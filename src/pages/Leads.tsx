@@ -11,12 +11,13 @@ import { leadsApi } from '../lib/api'
 import LoadingSpinner from '../components/LoadingSpinner'
 import EmptyState from '../components/EmptyState'
 import StatusBadge from '../components/StatusBadge'
-import { formatRelativeTime, downloadCsv } from '../lib/utils'
-import type { Lead } from '../types'
+import { formatRelativeTime } from '../lib/utils'
+import type { Lead, CsvUploadEvent } from '../types'
 
 export default function Leads() {
   const [statusFilter, setStatusFilter] = useState<string>('all')
   const [dragActive, setDragActive] = useState(false)
+  const [uploadedCount, setUploadedCount] = useState(0)
   const fileInputRef = useRef<HTMLInputElement>(null)
   const queryClient = useQueryClient()
 
@@ -26,16 +27,31 @@ export default function Leads() {
   })
 
   const uploadMutation = useMutation({
-    mutationFn: leadsApi.uploadCsv,
-    onSuccess: (response) => {
+    mutationFn: async (file: File) => {
+      let summary: Extract<CsvUploadEvent, { type: 'summary' }> | undefined
+      setUploadedCount(0)
+      await leadsApi.uploadCsvStream(file, (event) => {
+        if (event.type === 'batch') {
+          setUploadedCount(event.total_uploaded)
+        } else if (event.type === 'summary') {
+          summary = event
+        } else {
+          throw new Error(event.error)
+        }
+      })
+      return summary!
+    },
+    onSuccess: (summary) => {
       queryClient.invalidateQueries({ queryKey: ['leads'] })
-      toast.success(response.data.message)
-      if (response.data.failed_records > 0) {
-        toast.error(`${response.data.failed_records} records failed to upload`)
+      toast.success(summary.message)
+      if (summary.failed_records > 0) {
+        toast.error(`${summary.failed_records} records failed to upload`)
       }
     },
     onError: (error: any) => {
-      toast.error(error.response?.data?.detail || 'Failed to upload leads')
+      // Batches inserted before a failure are kept
+      queryClient.invalidateQueries({ queryKey: ['leads'] })
+      toast.error(error.response?.data?.detail || error.message || 'Failed to upload leads')
     },
   })
 
@@ -79,17 +95,11 @@ export default function Leads() {
       return
     }
     
-    const exportData = leads.data.map(lead => ({
-      name: lead.name,
-      email: lead.email,
-      company: lead.company || '',
-      position: lead.position || '',
-      status: lead.status,
-      created_at: lead.created_at,
+    // The server streams the export, so it covers all leads, not just the loaded ones
+    window.location.assign(leadsApi.exportUrl({
+      status: statusFilter === 'all' ? undefined : statusFilter,
     }))
-    
-    downloadCsv(exportData, `leads-export-${new Date().toISOString().split('T')[0]}.csv`)
-    toast.success('Leads exported successfully')
+    toast.success('Leads export started')
   }
 
   const leadList = leads?.data || []
@@ -171,7 +181,9 @@ export default function Leads() {
               <div className="absolute inset-0 bg-white bg-opacity-75 flex items-center justify-center rounded-lg">
                 <div className="text-center">
                   <LoadingSpinner size="lg" />
-                  <p className="mt-2 text-sm text-gray-600">Uploading leads...</p>
+                  <p className="mt-2 text-sm text-gray-600">
+                    Uploading leads...{uploadedCount > 0 && ` ${uploadedCount} added`}
+                  </p>
                 </div>
               </div>
             )}
@@ -5,7 +5,7 @@ export interface Lead {
   company?: string
   position?: string
   linkedin_url?: string
-  status: 'new' | 'contacted' | 'replied' | 'converted' | 'unsubscribed'
+  status: 'new' | 'contacted' | 'replied' | 'converted' | 'unsubscribed' | 'bounced' | 'ooo'
   custom_data?: Record<string, any>
   created_at: string
 }
@@ -16,6 +16,9 @@ export interface Campaign {
   objective: string
   tone: string
   status: 'draft' | 'active' | 'paused' | 'completed'
+  personalization_mode?: 'per_lead' | 'segment'
+  segment_by?: string[]
+  max_segments?: number
   created_at: string
 }
 
@@ -34,7 +37,7 @@ export interface Email {
   campaign_id: string
   subject: string
   body: string
-  status: 'generated' | 'sent' | 'delivered' | 'opened' | 'replied' | 'failed'
+  status: 'generated' | 'scheduled' | 'sent' | 'delivered' | 'opened' | 'replied' | 'failed' | 'bounced' | 'cancelled'
   email_type: 'cold_email' | 'followup'
   sent_at?: string
   opened_at?: string
@@ -66,6 +69,20 @@ export interface BulkUploadResponse {
   }>
 }
 
+// Progress events of the streaming CSV upload (NDJSON)
+export type CsvUploadEvent =
+  | {
+      type: 'batch'
+      batch: number
+      rows: number
+      successful_uploads: number
+      failed_records: number
+      errors: BulkUploadResponse['errors']
+      total_uploaded: number
+    }
+  | ({ type: 'summary' } & Omit<BulkUploadResponse, 'errors'>)
+  | { type: 'error'; error: string }
+
 export interface EmailGenerationRequest {
   lead_id: string
   campaign_id: string
@@ -95,6 +112,70 @@ export interface BulkEmailRequest {
   campaign_id: string
   lead_ids: string[]
   custom_context?: Record<string, any>
+  template_id?: string
+  delay_seconds?: number
+  use_send_window?: boolean
+  followup_days?: number
+}
+
+export interface BulkSendResult {
+  lead_id: string
+  success: boolean
+  email_id?: string | number
+  subject?: string
+  error?: string
+  scheduled_at?: string
+  suppressed?: boolean
+}
+
+export interface BulkSendSummary {
+  type: 'summary'
+  success: boolean
+  message: string
+  processed: number
+  succeeded: number
+  failed: number
+  suppressed: number
+}
+
+// Progress events of the streaming bulk send (NDJSON)
+export type BulkSendEvent =
+  | ({ type: 'result'; processed: number; total: number } & BulkSendResult)
+  | BulkSendSummary
+  | { type: 'error'; error: string }
+
+export interface LeadSelector {
+  statuses?: string[]
+  tags?: string[]
+  include_contacted?: boolean
+  max_leads?: number
+}
+
+export interface CampaignLaunchRequest {
+  selector?: LeadSelector
+  custom_context?: Record<string, any>
+  template_id?: string
+  delay_seconds?: number
+  use_send_window?: boolean
+  followup_days?: number
+  page_size?: number
+  dry_run?: boolean
+}
+
+export interface CampaignLaunchStatus {
+  launch_id: string
+  campaign_id: number
+  status: 'running' | 'completed' | 'failed' | 'dry_run'
+  selected: number
+  skipped_contacted: number
+  skipped_suppressed: number
+  processed: number
+  succeeded: number
+  failed: number
+  errors: { lead_id?: string; error?: string }[]
+  sample_lead_ids?: string[]
+  started_at: string
+  finished_at?: string
 }
 
 export interface EmailResponse {